@@ -4,6 +4,9 @@ FastAPI application entry point.
 Run locally with:
     uvicorn app:app --host 0.0.0.0 --port 8000 --reload
 
+or, with several worker processes, with ``python app.py`` and APP_WORKERS
+set (see "Multi-worker mode" below).
+
 POST /run
 ---------
 Request body (JSON):
@@ -11,9 +14,16 @@ Request body (JSON):
         "report_template": "<string>",
         "transcript": "<string>",
         "segment_data": "<string>",
-        "segment_items": "<string>"
+        "segment_items": "<string>",
+        "sections": ["guidance", "qa"]          (optional)
     }
 
+``sections`` limits the report to some of its sections: "fa_highlights",
+"guidance", "key_messages", "briefing_key_messages" and "qa" (default: all).
+Only the branches those sections need are executed, and output_template is
+sent only their outputs (see "Report sections" in graph.py). The other
+endpoints taking a /run body accept it too.
+
 Response body (JSON):
     {
         "outputs": [
@@ -30,46 +40,447 @@ Response body (JSON):
             }
         ]
     }
+
+Query parameters:
+    timings=true – add a "timings" key with the per-node breakdown and the
+                   critical path through the graph.
+    run_id=<id>  – identify the run (default: a generated id). The id is
+                   returned in the X-Run-Id response header, also on errors.
+                   An earlier run stored under the same id is replaced (use
+                   /runs/{run_id}/resume to continue one).
+
+Requests without run_id whose payload is identical to a /run already in
+flight in this process join that run instead of starting another: they
+receive its result (or its error) and its run id. See singleflight.py.
+
+POST /runs/{run_id}/resume
+--------------------------
+Continue a failed /run from its last checkpoint (requires CHECKPOINTER, see
+graph.py). Only the nodes that had not completed are executed again.
+Response body: same as /run (timings=true is accepted too); 404 if the run
+has nothing to resume.
+
+POST /runs/{run_id}/rerun
+-------------------------
+Execute a finished run again with some inputs changed, re-running only the
+nodes that depend on them (requires CHECKPOINTER and
+CHECKPOINT_KEEP_COMPLETED=1, see graph.py).
+Request body (JSON): any subset of the /run fields, e.g.
+    {"segment_items": "<string>"}
+Query parameters: timings=true as for /run; run_id=<id> for the new run.
+Response body: same as /run, with the new run's id in X-Run-Id (the new run
+can be re-run in turn); 404 if ``run_id`` has no kept final state. The new
+run produces the same report sections as the stored one.
+
+POST /run/stream
+----------------
+Request body: same as /run.
+
+Response body (server-sent events), in the order they happen:
+    event: branch  data: {"node": "<branch tail>", "field": "<state key>", "value": "<text>"}
+    event: token   data: {"text": "<output_template token>"}
+    event: final   data: <same body as /run>
+    event: error   data: {"detail": "<message>", "run_id": "<id for /runs/{run_id}/resume>"}
+
+Streams are not coalesced at the run level, but their LLM calls are at the
+node level (see singleflight.py). When output_template's call is shared with
+another run, the tokens are streamed only to the run that sent it; this
+stream receives no token events and gets the summary with its final event.
+
+POST /run/batch
+---------------
+Request body (JSON): a list of /run request bodies.
+
+Response body (NDJSON): one line per input, emitted as each run completes:
+    {"index": <int>, "status": "ok", "final_response": {...}}
+    {"index": <int>, "status": "error", "detail": "<message>"}
+
+POST /jobs
+----------
+Request body: same as /run. Returns 202 with the job (see GET /jobs/{id})
+immediately; the workflow runs in a background worker pool. Submitting an
+identical payload again returns the existing job.
+
+GET /jobs/{id}
+--------------
+Response body (JSON):
+    {
+        "id": "<job id>",
+        "status": "queued" | "running" | "succeeded" | "failed",
+        "progress": {"completed_nodes": [...], "completed": <int>, "total": <int>},
+        "result": <same body as /run, once succeeded>,
+        "error": "<message, once failed>",
+        "created": <unix time>,
+        "updated": <unix time>
+    }
+
+GET /health/ready
+-----------------
+Readiness probe. Importing this module does not import LangChain or LangGraph
+or compile the workflow; at startup that work runs in a background thread
+(``graph.warm_up``) while the server already accepts connections. Returns
+200 {"status": "ready"} once warm-up has finished and 503 before, or if
+warm-up failed (with the error as "detail"). With APP_WARMUP=0 nothing is
+built ahead of time, the workflow is built on the first request, and the
+endpoint reports ready immediately.
+
+GET /metrics
+------------
+Prometheus text exposition of per-node latency, queueing, token, cost and
+response-cache metrics.
+
+Multi-worker mode
+-----------------
+``python app.py`` starts APP_WORKERS uvicorn worker processes (default 1).
+Before they are spawned, ``configure_workers`` prepares the environment they
+inherit so that the workers behave as one deployment:
+
+    SHARED_BACKEND           – "local" becomes "sqlite", so the response cache
+                               and the rate-limit buckets are shared (shared.py).
+    LLM_MAX_CONCURRENCY      – divided between the workers, so the total number
+                               of calls in flight stays at the configured value.
+    PROMETHEUS_MULTIPROC_DIR – a fresh directory, so GET /metrics reports the
+                               metrics of every worker.
+    CHECKPOINTER             – "memory" becomes "sqlite", as a resume request can
+                               reach a different worker than the failed run.
+
+The job store is shared through JOBS_DB_PATH as it is. Values set explicitly
+to a shared backend are left untouched.
+
+Configuration is read from the .env file:
+    APP_WORKERS – uvicorn worker processes started by ``python app.py`` (default 1).
+    APP_WARMUP  – "0" skips the startup warm-up (see GET /health/ready; default "1").
 """
 
-from fastapi import FastAPI, HTTPException
-from pydantic import BaseModel
+import asyncio
+import json
+import logging
+import math
+import os
+import tempfile
+import uuid
+from contextlib import asynccontextmanager
+from typing import AsyncIterator, Optional
+
+from fastapi import FastAPI, HTTPException, Query, Request
+from fastapi.responses import Response, StreamingResponse
+from prometheus_client import CONTENT_TYPE_LATEST
+from pydantic import BaseModel, field_validator
+
+from batch import arun_batch
+from graph import (
+    aclose_checkpointer,
+    aget_workflow,
+    arun,
+    finish_run,
+    graph_edges,
+    rerun,
+    resume_run,
+    run_config,
+    start_run,
+    warm_up,
+)
+from jobs import JobRunner, JobStore, payload_hash
+from llm import aclose_llm
+from metrics import exposition, run_breakdown
+from shared import _get_shared_store
+from singleflight import SingleFlight
+from state import requested_sections
+
+logger = logging.getLogger(__name__)
+
+# /run executions in flight, keyed by payload hash.
+_runs: SingleFlight[tuple[str, dict]] = SingleFlight("run")
+
+
+async def _warm_up(app: FastAPI) -> None:
+    try:
+        await asyncio.to_thread(warm_up)
+    except Exception as exc:
+        logger.exception("warm-up failed")
+        app.state.warmup_error = str(exc)
+        return
+    app.state.ready = True
+
+
+@asynccontextmanager
+async def lifespan(app: FastAPI):
+    store = JobStore(os.getenv("JOBS_DB_PATH", "jobs.db"))
+    app.state.jobs = JobRunner(store, int(os.getenv("JOBS_CONCURRENCY", "4")))
+    await app.state.jobs.start()
+    # The server accepts connections while the workflow is built in a thread;
+    # /health/ready turns 200 once it is done.
+    app.state.ready = os.getenv("APP_WARMUP", "1") == "0"
+    app.state.warmup_error = None
+    warming = None if app.state.ready else asyncio.create_task(_warm_up(app))
+    yield
+    if warming is not None:
+        await warming
+    await app.state.jobs.stop()
+    store.close()
+    await aclose_checkpointer()
+    await aclose_llm()
+    shared_store = _get_shared_store()
+    if shared_store is not None:
+        shared_store.close()
 
-from graph import workflow
 
 app = FastAPI(
     title="ECTS LangGraph API",
     description="Processes transcripts and segment data through a multi-branch LangGraph workflow.",
     version="1.0.0",
+    lifespan=lifespan,
 )
 
 
+# Branch-tail outputs pushed to /run/stream clients as soon as they are written.
+BRANCH_OUTPUTS: dict[str, tuple[str, ...]] = {
+    "fa_highlights": ("fa_highlights_out",),
+    "guid_validation": ("guid_validation_out",),
+    "key_messages": ("key_messages_out",),
+    "briefing_key_messages": ("briefing_key_messages_out",),
+    "key_messages_briefing": ("key_messages_out", "briefing_key_messages_out"),
+    "second_QA": ("second_QA_out",),
+}
+
+
 class RequestPayload(BaseModel):
     report_template: str
     transcript: str
     segment_data: str
     segment_items: str
+    sections: Optional[list[str]] = None
+
+    @field_validator("sections")
+    @classmethod
+    def _known_sections(cls, sections: Optional[list[str]]) -> Optional[list[str]]:
+        if sections is None:
+            return None
+        if not sections:
+            raise ValueError("request at least one report section")
+        return requested_sections(sections)
+
+
+class RerunPayload(BaseModel):
+    report_template: Optional[str] = None
+    transcript: Optional[str] = None
+    segment_data: Optional[str] = None
+    segment_items: Optional[str] = None
+
+
+def _initial_state(payload: RequestPayload) -> dict:
+    return {
+        "report_template": payload.report_template,
+        "transcript": payload.transcript,
+        "segment_data": payload.segment_data,
+        "segment_items": payload.segment_items,
+        # Always written, so a run never inherits another run's sections.
+        "sections": payload.sections,
+    }
+
+
+def _response_body(result: dict, timings: bool) -> dict:
+    if timings:
+        return {**result["final_response"], "timings": run_breakdown(result, graph_edges())}
+    return result["final_response"]
 
 
 @app.post("/run")
-async def run_workflow(payload: RequestPayload) -> dict:
+async def run_workflow(
+    payload: RequestPayload,
+    response: Response,
+    timings: bool = False,
+    run_id: Optional[str] = None,
+) -> dict:
     """
     Execute the full LangGraph workflow and return the wrapped AI summary.
+
+    With ``?timings=true`` the response also carries a ``timings`` breakdown:
+    per-node start/end, queueing time, tokens and cost, plus the critical path.
+    The run id is returned in the ``X-Run-Id`` header; with checkpointing
+    enabled a failed run can be continued via /runs/{run_id}/resume. Without
+    an explicit ``run_id``, a request identical to one in flight shares its run.
     """
+    state = _initial_state(payload)
+    if run_id is None:
+        # Identical concurrent payloads (duplicate webhooks, client retries)
+        # share one execution.
+        (run_id, result), _ = await _runs.do(
+            payload_hash(state), lambda: _execute(state, uuid.uuid4().hex)
+        )
+    else:
+        run_id, result = await _execute(state, run_id)
+    response.headers["X-Run-Id"] = run_id
+    return _response_body(result, timings)
+
+
+async def _execute(state: dict, run_id: str) -> tuple[str, dict]:
     try:
-        initial_state = {
-            "report_template": payload.report_template,
-            "transcript": payload.transcript,
-            "segment_data": payload.segment_data,
-            "segment_items": payload.segment_items,
-        }
-        result = await workflow.ainvoke(initial_state)
-        return result["final_response"]
+        return run_id, await arun(state, run_id)
     except Exception as exc:
-        raise HTTPException(status_code=500, detail=str(exc)) from exc
+        raise HTTPException(status_code=500, detail=str(exc), headers={"X-Run-Id": run_id}) from exc
+
+
+@app.post("/runs/{run_id}/resume")
+async def resume_workflow(run_id: str, response: Response, timings: bool = False) -> dict:
+    """
+    Continue a failed run from its last checkpoint, re-executing only the
+    failed node and its descendants.
+    """
+    response.headers["X-Run-Id"] = run_id
+    try:
+        result = await resume_run(run_id)
+    except LookupError as exc:
+        raise HTTPException(status_code=404, detail=str(exc)) from exc
+    except Exception as exc:
+        raise HTTPException(status_code=500, detail=str(exc), headers={"X-Run-Id": run_id}) from exc
+    return _response_body(result, timings)
+
+
+@app.post("/runs/{run_id}/rerun")
+async def rerun_workflow(
+    run_id: str,
+    payload: RerunPayload,
+    response: Response,
+    timings: bool = False,
+    new_run_id: Optional[str] = Query(None, alias="run_id"),
+) -> dict:
+    """
+    Re-execute a finished run with the given inputs replaced. Only the nodes
+    reading a changed input, and their descendants, are executed again; the
+    other outputs are taken from the stored run.
+    """
+    new_run_id = new_run_id or uuid.uuid4().hex
+    response.headers["X-Run-Id"] = new_run_id
+    try:
+        result = await rerun(run_id, payload.model_dump(exclude_none=True), new_run_id)
+    except LookupError as exc:
+        raise HTTPException(status_code=404, detail=str(exc)) from exc
+    except Exception as exc:
+        raise HTTPException(
+            status_code=500, detail=str(exc), headers={"X-Run-Id": new_run_id}
+        ) from exc
+    return _response_body(result, timings)
+
+
+def _sse(event: str, data: dict) -> str:
+    return f"event: {event}\ndata: {json.dumps(data)}\n\n"
+
+
+@app.post("/run/stream")
+async def run_workflow_stream(payload: RequestPayload) -> StreamingResponse:
+    """
+    Execute the workflow, pushing each branch output as soon as it is written
+    to GraphState and then the output_template tokens as they are generated.
+    """
+
+    config = run_config()
+    run_id = config["configurable"]["thread_id"]
+
+    async def events() -> AsyncIterator[str]:
+        try:
+            workflow = await aget_workflow()
+            await start_run(run_id)
+            async for mode, chunk in workflow.astream(
+                _initial_state(payload), config, stream_mode=["updates", "messages"]
+            ):
+                if mode == "messages":
+                    message, metadata = chunk
+                    if metadata.get("langgraph_node") == "output_template" and message.content:
+                        yield _sse("token", {"text": message.content})
+                    continue
+                for node, update in chunk.items():
+                    if node in BRANCH_OUTPUTS and update:
+                        for field in BRANCH_OUTPUTS[node]:
+                            value = update[field]
+                            yield _sse("branch", {"node": node, "field": field, "value": value})
+                    elif node == "wrapper":
+                        yield _sse("final", update["final_response"])
+            await finish_run(run_id)
+        except Exception as exc:
+            yield _sse("error", {"detail": str(exc), "run_id": run_id})
+
+    return StreamingResponse(
+        events(), media_type="text/event-stream", headers={"X-Run-Id": run_id}
+    )
+
+
+@app.post("/run/batch")
+async def run_workflow_batch(payloads: list[RequestPayload]) -> StreamingResponse:
+    """
+    Execute the workflow for every payload under the shared concurrency and
+    rate limits, streaming one NDJSON line per run as it completes.
+    """
+
+    async def results() -> AsyncIterator[str]:
+        async for index, result in arun_batch(_initial_state(p) for p in payloads):
+            if isinstance(result, Exception):
+                line = {"index": index, "status": "error", "detail": str(result)}
+            else:
+                line = {"index": index, "status": "ok", "final_response": result["final_response"]}
+            yield json.dumps(line) + "\n"
+
+    return StreamingResponse(results(), media_type="application/x-ndjson")
+
+
+@app.post("/jobs", status_code=202)
+async def submit_job(payload: RequestPayload, request: Request) -> dict:
+    """
+    Queue the workflow for ``payload`` and return the job id immediately.
+    Identical payloads map to the same job.
+    """
+    jobs = request.app.state.jobs
+    job_id = jobs.submit(_initial_state(payload))
+    # In a thread: the job's progress total needs the workflow's node list,
+    # which may still be being built by the warm-up.
+    return await asyncio.to_thread(jobs.store.get, job_id)
+
+
+@app.get("/jobs/{job_id}")
+async def get_job(job_id: str, request: Request) -> dict:
+    """Return a job's status, per-node progress and, once done, its result."""
+    job = await asyncio.to_thread(request.app.state.jobs.store.get, job_id)
+    if job is None:
+        raise HTTPException(status_code=404, detail=f"unknown job {job_id}")
+    return job
+
+
+@app.get("/health/ready")
+async def ready(request: Request) -> dict:
+    """200 once the workflow has been warmed up, 503 before (or if warm-up failed)."""
+    if not request.app.state.ready:
+        detail = request.app.state.warmup_error or "warming up"
+        raise HTTPException(status_code=503, detail=detail)
+    return {"status": "ready"}
+
+
+@app.get("/metrics")
+async def metrics() -> Response:
+    """Prometheus exposition of per-node latency, token, cost and cache metrics."""
+    return Response(exposition(), media_type=CONTENT_TYPE_LATEST)
+
+
+def configure_workers(workers: int) -> None:
+    """Prepare the environment inherited by ``workers`` worker processes."""
+    if workers <= 1:
+        return
+    if os.getenv("SHARED_BACKEND", "local").lower() == "local":
+        os.environ["SHARED_BACKEND"] = "sqlite"
+    concurrency = int(os.getenv("LLM_MAX_CONCURRENCY", "64"))
+    os.environ["LLM_MAX_CONCURRENCY"] = str(max(1, math.ceil(concurrency / workers)))
+    if not os.getenv("PROMETHEUS_MULTIPROC_DIR"):
+        os.environ["PROMETHEUS_MULTIPROC_DIR"] = tempfile.mkdtemp(prefix="ects-metrics-")
+    if os.getenv("CHECKPOINTER", "none").lower() == "memory":
+        logger.warning("CHECKPOINTER=memory is per process; using sqlite with %d workers", workers)
+        os.environ["CHECKPOINTER"] = "sqlite"
 
 
 if __name__ == "__main__":
     import uvicorn
 
-    uvicorn.run(app, host="0.0.0.0", port=8000)
+    workers = int(os.getenv("APP_WORKERS", "1"))
+    configure_workers(workers)
+    if workers > 1:
+        uvicorn.run("app:app", host="0.0.0.0", port=8000, workers=workers)
+    else:
+        uvicorn.run(app, host="0.0.0.0", port=8000)
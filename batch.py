@@ -0,0 +1,49 @@
+"""
+Batch execution of many transcripts through the compiled workflow.
+
+All runs share the process-wide LLM concurrency and rate limits (see
+ratelimit.py), so the number of upstream requests in flight stays bounded no
+matter how large the batch is. On top of that, ``max_concurrent_runs`` caps how
+many graph runs are admitted at once, so early submissions finish (and are
+yielded) while later ones are still queued.
+
+Configuration is read from the .env file:
+    BATCH_MAX_CONCURRENT_RUNS – runs admitted at once per batch (default 16).
+"""
+
+import asyncio
+import os
+from typing import AsyncIterator, Iterable, Optional, Union
+
+from graph import arun
+
+
+async def arun_batch(
+    inputs: Iterable[dict],
+    max_concurrent_runs: Optional[int] = None,
+) -> AsyncIterator[tuple[int, Union[dict, Exception]]]:
+    """
+    Run the workflow once per initial state and yield results as they complete.
+
+    Yields ``(index, result)`` pairs, where ``index`` is the position of the
+    input and ``result`` is either the final GraphState or the exception the
+    run raised. A failing run does not affect the rest of the batch.
+    """
+    if max_concurrent_runs is None:
+        max_concurrent_runs = int(os.getenv("BATCH_MAX_CONCURRENT_RUNS", "16"))
+    admission = asyncio.Semaphore(max_concurrent_runs)
+
+    async def run_one(index: int, state: dict) -> tuple[int, Union[dict, Exception]]:
+        async with admission:
+            try:
+                return index, await arun(state)
+            except Exception as exc:
+                return index, exc
+
+    tasks = [asyncio.create_task(run_one(i, state)) for i, state in enumerate(inputs)]
+    try:
+        for next_done in asyncio.as_completed(tasks):
+            yield await next_done
+    finally:
+        for task in tasks:
+            task.cancel()
@@ -0,0 +1,203 @@
+"""
+Local OpenAI-compatible chat-completions stub for offline benchmarking.
+
+Point the service at it with OPENAI_API_BASE=http://127.0.0.1:<port>/v1.
+
+Each request sleeps for a time-to-first-token drawn from a log-normal
+distribution, then "generates" its completion at a fixed token throughput.
+A configurable fraction of requests fail with HTTP 429 or 500. Streaming,
+tool calls (function-calling structured output) and json_schema response
+formats are supported, so every node in the graph can run against it.
+
+Run standalone with:
+    python -m bench.fake_llm --port 9000 --latency-ms 800 --tokens-per-second 80
+"""
+
+import argparse
+import asyncio
+import json
+import random
+import time
+import uuid
+from typing import Any, AsyncIterator
+
+from fastapi import FastAPI, Request
+from fastapi.responses import JSONResponse, StreamingResponse
+
+
+def _schema_instance(schema: dict, defs: dict) -> Any:
+    """Build a minimal value that validates against a JSON schema."""
+    if "$ref" in schema:
+        return _schema_instance(defs[schema["$ref"].rsplit("/", 1)[-1]], defs)
+    if "anyOf" in schema:
+        return _schema_instance(schema["anyOf"][0], defs)
+    kind = schema.get("type")
+    if kind == "object":
+        return {
+            name: _schema_instance(prop, defs)
+            for name, prop in schema.get("properties", {}).items()
+        }
+    if kind == "array":
+        return [_schema_instance(schema.get("items", {}), defs)]
+    if kind in ("integer", "number"):
+        return 1
+    if kind == "boolean":
+        return True
+    if kind == "null":
+        return None
+    return "lorem ipsum"
+
+
+def create_app(
+    latency_ms: float = 500.0,
+    latency_sigma: float = 0.25,
+    tokens_per_second: float = 100.0,
+    completion_tokens: int = 200,
+    error_rate: float = 0.0,
+    seed: int = 0,
+) -> FastAPI:
+    """Build the stub application with the given latency and failure profile."""
+    app = FastAPI(title="fake-llm")
+    rng = random.Random(seed)
+    stats = {"requests": 0, "errors": 0, "in_flight": 0, "peak_in_flight": 0}
+
+    def completion(body: dict) -> tuple[dict, int]:
+        prompt_chars = sum(len(str(m.get("content") or "")) for m in body.get("messages", []))
+        prompt_tokens = prompt_chars // 4 + 1
+        n_tokens = body.get("max_tokens") or body.get("max_completion_tokens") or completion_tokens
+        n_tokens = min(n_tokens, completion_tokens)
+        message: dict = {"role": "assistant", "content": " ".join(["lorem"] * n_tokens)}
+
+        tools = body.get("tools") or []
+        response_format = body.get("response_format") or {}
+        if tools:
+            function = tools[0]["function"]
+            params = function.get("parameters", {})
+            arguments = _schema_instance(params, params.get("$defs", {}))
+            message = {
+                "role": "assistant",
+                "content": None,
+                "tool_calls": [
+                    {
+                        "id": f"call_{uuid.uuid4().hex[:12]}",
+                        "type": "function",
+                        "function": {"name": function["name"], "arguments": json.dumps(arguments)},
+                    }
+                ],
+            }
+        elif response_format.get("type") == "json_schema":
+            schema = response_format["json_schema"].get("schema", {})
+            message["content"] = json.dumps(_schema_instance(schema, schema.get("$defs", {})))
+
+        usage = {
+            "prompt_tokens": prompt_tokens,
+            "completion_tokens": n_tokens,
+            "total_tokens": prompt_tokens + n_tokens,
+            "prompt_tokens_details": {"cached_tokens": 0},
+        }
+        return {"message": message, "usage": usage}, n_tokens
+
+    @app.post("/v1/chat/completions")
+    async def chat_completions(request: Request):
+        body = await request.json()
+        stats["requests"] += 1
+        stats["in_flight"] += 1
+        stats["peak_in_flight"] = max(stats["peak_in_flight"], stats["in_flight"])
+        streaming = False
+        try:
+            ttft = rng.lognormvariate(0, latency_sigma) * latency_ms / 1000.0
+            await asyncio.sleep(ttft)
+            if rng.random() < error_rate:
+                stats["errors"] += 1
+                status = rng.choice((429, 500))
+                return JSONResponse(
+                    {"error": {"message": "injected failure", "type": "fake_llm", "code": status}},
+                    status_code=status,
+                )
+
+            result, n_tokens = completion(body)
+            generation = n_tokens / tokens_per_second if tokens_per_second else 0.0
+            response_id = f"chatcmpl-{uuid.uuid4().hex}"
+            model = body.get("model", "fake")
+
+            if not body.get("stream"):
+                await asyncio.sleep(generation)
+                return {
+                    "id": response_id,
+                    "object": "chat.completion",
+                    "created": int(time.time()),
+                    "model": model,
+                    "choices": [{"index": 0, "message": result["message"], "finish_reason": "stop"}],
+                    "usage": result["usage"],
+                }
+            streaming = True
+        finally:
+            if not streaming:
+                stats["in_flight"] -= 1
+
+        async def chunks() -> AsyncIterator[str]:
+            def chunk(delta: dict, finish_reason=None, usage=None) -> str:
+                payload = {
+                    "id": response_id,
+                    "object": "chat.completion.chunk",
+                    "created": int(time.time()),
+                    "model": model,
+                    "choices": [{"index": 0, "delta": delta, "finish_reason": finish_reason}],
+                }
+                if usage is not None:
+                    payload["usage"] = usage
+                return f"data: {json.dumps(payload)}\n\n"
+
+            try:
+                message = result["message"]
+                if message.get("tool_calls"):
+                    await asyncio.sleep(generation)
+                    calls = [{"index": 0, **call} for call in message["tool_calls"]]
+                    yield chunk({"role": "assistant", "tool_calls": calls})
+                else:
+                    words = message["content"].split(" ")
+                    delay = generation / max(len(words), 1)
+                    for i, word in enumerate(words):
+                        await asyncio.sleep(delay)
+                        yield chunk({"role": "assistant", "content": word if i == 0 else f" {word}"})
+                yield chunk({}, finish_reason="stop", usage=result["usage"])
+                yield "data: [DONE]\n\n"
+            finally:
+                stats["in_flight"] -= 1
+
+        return StreamingResponse(chunks(), media_type="text/event-stream")
+
+    @app.get("/stats")
+    async def get_stats() -> dict:
+        return stats
+
+    return app
+
+
+def main() -> None:
+    parser = argparse.ArgumentParser(description=__doc__.strip().splitlines()[0])
+    parser.add_argument("--host", default="127.0.0.1")
+    parser.add_argument("--port", type=int, default=9000)
+    parser.add_argument("--latency-ms", type=float, default=500.0, help="median time to first token")
+    parser.add_argument("--latency-sigma", type=float, default=0.25, help="log-normal sigma of the latency")
+    parser.add_argument("--tokens-per-second", type=float, default=100.0)
+    parser.add_argument("--completion-tokens", type=int, default=200)
+    parser.add_argument("--error-rate", type=float, default=0.0)
+    parser.add_argument("--seed", type=int, default=0)
+    args = parser.parse_args()
+
+    import uvicorn
+
+    app = create_app(
+        latency_ms=args.latency_ms,
+        latency_sigma=args.latency_sigma,
+        tokens_per_second=args.tokens_per_second,
+        completion_tokens=args.completion_tokens,
+        error_rate=args.error_rate,
+        seed=args.seed,
+    )
+    uvicorn.run(app, host=args.host, port=args.port, log_level="warning")
+
+
+if __name__ == "__main__":
+    main()
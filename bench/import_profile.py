@@ -0,0 +1,125 @@
+"""
+Import-time and warm-up profile of the API process.
+
+Runs ``python -X importtime -c "import app"`` in a fresh interpreter and
+reports the total import time, the heaviest top-level imports (cumulative
+time, as imported by ``app`` and its own modules), and, in a second fresh
+interpreter, how long ``graph.warm_up()`` takes after the import. The two
+numbers are the cost a new replica pays before it accepts traffic and before
+/health/ready reports ready:
+
+    python -m bench.import_profile --top 15
+    python -m bench.import_profile --module graph --no-warm-up
+
+Results can be saved with ``--output`` to compare run-over-run.
+"""
+
+import argparse
+import json
+import os
+import subprocess
+import sys
+from typing import Optional
+
+# Modules of this repository; their own imports are attributed to them.
+_LOCAL_MODULES = (
+    "app", "batch", "cache", "chunking", "config", "graph", "jobs", "llm", "metrics",
+    "nodes", "prompts", "ratelimit", "replay", "resilience", "schemas", "shared",
+    "singleflight", "state", "tokens", "transcript",
+)
+
+_WARM_UP = """
+import json, time
+started = time.perf_counter()
+import {module}
+imported = time.perf_counter()
+from graph import warm_up
+warm_up()
+print(json.dumps({{"import_s": imported - started, "warm_up_s": time.perf_counter() - imported}}))
+"""
+
+
+def _env() -> dict:
+    # Importing the service needs no real endpoint; warm_up builds clients
+    # but sends no request.
+    return {**os.environ, "OPENAI_API_KEY": os.getenv("OPENAI_API_KEY", "bench")}
+
+
+def import_times(module: str) -> list[tuple[str, int, float]]:
+    """``(name, depth, cumulative seconds)`` of every import made by ``import module``."""
+    proc = subprocess.run(
+        [sys.executable, "-X", "importtime", "-c", f"import {module}"],
+        capture_output=True, text=True, env=_env(), check=True,
+    )
+    rows = []
+    for line in proc.stderr.splitlines():
+        if not line.startswith("import time:") or "|" not in line:
+            continue
+        _, cumulative, name = line.split("|")
+        if not cumulative.strip().isdigit():
+            continue  # the header line
+        depth = (len(name) - len(name.lstrip())) // 2
+        rows.append((name.strip(), depth, int(cumulative) / 1e6))
+    return rows
+
+
+def heaviest(rows: list[tuple[str, int, float]], top: int) -> list[tuple[str, float]]:
+    """
+    The ``top`` slowest third-party packages imported directly by the
+    repository's modules (or by the interpreter, for the root module).
+    """
+    imports: list[tuple[str, float]] = []
+    parents: list[str] = []
+    # -X importtime prints children before their parent; walk it backwards
+    # so that each entry's parent is known when it is reached.
+    for name, depth, seconds in reversed(rows):
+        del parents[depth:]
+        parent = parents[-1] if parents else None
+        if name.split(".")[0] not in _LOCAL_MODULES and (
+            parent is None or parent.split(".")[0] in _LOCAL_MODULES
+        ):
+            imports.append((name, seconds))
+        parents.append(name)
+    return sorted(imports, key=lambda item: item[1], reverse=True)[:top]
+
+
+def warm_up_times(module: str) -> dict:
+    proc = subprocess.run(
+        [sys.executable, "-c", _WARM_UP.format(module=module)],
+        capture_output=True, text=True, env=_env(), check=True,
+    )
+    return json.loads(proc.stdout.strip().splitlines()[-1])
+
+
+def main() -> None:
+    parser = argparse.ArgumentParser(description=__doc__.strip().splitlines()[0])
+    parser.add_argument("--module", default="app", help="module to import (default app)")
+    parser.add_argument("--top", type=int, default=15, help="heaviest imports to list")
+    parser.add_argument("--no-warm-up", action="store_true", help="skip the warm-up timing")
+    parser.add_argument("--output", help="write results as JSON")
+    args = parser.parse_args()
+
+    rows = import_times(args.module)
+    total = next(seconds for name, depth, seconds in reversed(rows) if name == args.module)
+    print(f"import {args.module}: {total:.3f} s")
+    print(f"\n{'cumulative s':>12}  import")
+    top = heaviest(rows, args.top)
+    for name, seconds in top:
+        print(f"{seconds:>12.3f}  {name}")
+
+    warm: Optional[dict] = None
+    if not args.no_warm_up:
+        warm = warm_up_times(args.module)
+        print(f"\nwarm_up() after import: {warm['warm_up_s']:.3f} s")
+
+    if args.output:
+        with open(args.output, "w") as f:
+            json.dump(
+                {"module": args.module, "import_s": total, "heaviest": top, "warm_up": warm},
+                f,
+                indent=2,
+            )
+
+
+if __name__ == "__main__":
+    main()
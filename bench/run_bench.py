@@ -0,0 +1,484 @@
+"""
+Offline throughput/latency benchmark for the workflow and the /run endpoint.
+
+Starts the local OpenAI-compatible stub from bench/fake_llm.py, points the
+service at it through OPENAI_API_BASE, and drives either the compiled
+workflow in-process through ``graph.arun`` (``--target graph``) or a uvicorn-served
+``app:app`` over HTTP (``--target api``) with synthetic transcripts. Every
+combination of ``--transcript-tokens`` and ``--concurrency`` is one scenario;
+for each it reports p50/p95/p99 latency, throughput, peak RSS and peak thread
+count of the process under test, the peak RSS growth per concurrent run
+(peak minus the RSS at the start of the scenario, divided by the
+concurrency), and upstream request counts. For per-run memory comparisons
+run one scenario per invocation, since memory freed by an earlier scenario is
+not always returned to the OS.
+
+Results can be saved with ``--output`` and compared run-over-run with
+``--compare``:
+
+    python -m bench.run_bench --target graph --concurrency 1,16,64 \\
+        --transcript-tokens 2000,16000 --requests 64 --output before.json
+    # ... change nodes.py / llm.py ...
+    python -m bench.run_bench --target graph --concurrency 1,16,64 \\
+        --transcript-tokens 2000,16000 --requests 64 --compare before.json
+
+The response cache is disabled for the service under test unless ``--cache``
+is given, so each request pays for its full set of LLM calls.
+
+``--record FILE`` records every upstream request/response pair of the
+benchmark to FILE (see replay.py); ``--replay FILE`` answers them from the
+recording instead of the stub, with the recorded latencies scaled by
+``--replay-latency-scale``. The synthetic payloads are seeded, so the same
+scenario arguments replay the same requests. Replaying at scale 0 removes
+upstream time altogether, which makes throughput a measure of the service's
+own overhead and suits regression runs; ``--node-times`` (graph target)
+adds each node's mean wall time and the part of it not spent queueing for
+or waiting on the LLM:
+
+    python -m bench.run_bench --concurrency 32 --transcript-tokens 8000 --record rec.jsonl
+    python -m bench.run_bench --concurrency 32 --transcript-tokens 8000 \\
+        --replay rec.jsonl --replay-latency-scale 0 --node-times --output base.json
+"""
+
+import argparse
+import asyncio
+import json
+import os
+import random
+import resource
+import socket
+import statistics
+import subprocess
+import sys
+import threading
+import time
+from collections import defaultdict
+from contextlib import contextmanager
+from typing import Iterator, Optional
+
+import httpx
+
+_SPEAKERS = [
+    ("Jane Doe", "Chief Executive Officer"),
+    ("John Roe", "Chief Financial Officer"),
+    ("Alex Poe", "Head of Investor Relations"),
+]
+_ANALYSTS = ["Sam Lee -- Big Bank -- Analyst", "Kim Park -- Broker Co -- Analyst"]
+_SENTENCES = [
+    "Revenue grew {n}% year over year to ${m} billion.",
+    "We expect operating margin of {n}% for the full year.",
+    "Free cash flow came in at ${m} million for the quarter.",
+    "Demand in our core segment remained resilient across regions.",
+    "We continue to invest in capacity and expect capex of ${m} billion.",
+    "Gross margin expanded by {n}0 basis points on favorable mix.",
+]
+
+
+def synthetic_transcript(tokens: int, seed: int) -> str:
+    """An earnings-call-shaped transcript of roughly ``tokens`` tokens."""
+    rng = random.Random(seed)
+    target_chars = tokens * 4
+    lines = ["Prepared Remarks", "Operator", "Good day and welcome to the earnings call."]
+    size = sum(len(line) for line in lines)
+
+    def paragraph() -> str:
+        return " ".join(
+            rng.choice(_SENTENCES).format(n=rng.randint(1, 40), m=rng.randint(1, 900))
+            for _ in range(rng.randint(3, 8))
+        )
+
+    while size < target_chars * 0.5:
+        name, title = rng.choice(_SPEAKERS)
+        turn = [f"{name} -- {title}", paragraph()]
+        lines += turn
+        size += sum(len(line) for line in turn)
+    lines.append("Question-and-Answer Session")
+    while size < target_chars:
+        name, title = rng.choice(_SPEAKERS)
+        turn = [
+            "Operator: Our next question comes from the line below.",
+            rng.choice(_ANALYSTS),
+            f"Can you talk about the outlook? {paragraph()}",
+            f"{name} -- {title}",
+            paragraph(),
+        ]
+        lines += turn
+        size += sum(len(line) for line in turn)
+    return "\n".join(lines)
+
+
+def payload(tokens: int, seed: int) -> dict:
+    return {
+        "report_template": "Summary\n- Highlights\n- Guidance\n- Key messages\n- Q&A",
+        "transcript": synthetic_transcript(tokens, seed),
+        "segment_data": "Segment A; Segment B; Segment C",
+        "segment_items": "Revenue, Margin, Outlook",
+    }
+
+
+def _free_port() -> int:
+    with socket.socket() as sock:
+        sock.bind(("127.0.0.1", 0))
+        return sock.getsockname()[1]
+
+
+def _wait_for(url: str, timeout: float = 30.0) -> None:
+    deadline = time.monotonic() + timeout
+    while time.monotonic() < deadline:
+        try:
+            httpx.get(url, timeout=1.0)
+            return
+        except httpx.TransportError:
+            time.sleep(0.1)
+    raise RuntimeError(f"{url} did not come up within {timeout}s")
+
+
+@contextmanager
+def _subprocess(args: list[str], env: dict, ready_url: str) -> Iterator[subprocess.Popen]:
+    process = subprocess.Popen(args, env=env)
+    try:
+        _wait_for(ready_url)
+        yield process
+    finally:
+        process.terminate()
+        process.wait(timeout=10)
+
+
+def _proc_status(pid: int) -> dict[str, int]:
+    """VmRSS (kB) and Threads of ``pid`` from /proc; empty where unavailable."""
+    try:
+        with open(f"/proc/{pid}/status") as status:
+            fields = dict(line.split(":", 1) for line in status if ":" in line)
+    except OSError:
+        return {}
+    return {
+        "rss_kb": int(fields["VmRSS"].split()[0]),
+        "threads": int(fields["Threads"]),
+    }
+
+
+class _Sampler:
+    """Samples RSS and thread count of a process while a scenario runs."""
+
+    def __init__(self, pid: int, interval: float = 0.05) -> None:
+        self.pid = pid
+        self.interval = interval
+        self.start_rss_kb = 0
+        self.peak_rss_kb = 0
+        self.peak_threads = 0
+        self._stop = threading.Event()
+        self._thread = threading.Thread(target=self._run, daemon=True)
+
+    def _sample(self) -> dict[str, int]:
+        status = _proc_status(self.pid)
+        if not status and self.pid == os.getpid():
+            status = {
+                "rss_kb": resource.getrusage(resource.RUSAGE_SELF).ru_maxrss,
+                "threads": threading.active_count(),
+            }
+        return status
+
+    def _run(self) -> None:
+        while not self._stop.is_set():
+            status = self._sample()
+            self.peak_rss_kb = max(self.peak_rss_kb, status.get("rss_kb", 0))
+            self.peak_threads = max(self.peak_threads, status.get("threads", 0))
+            self._stop.wait(self.interval)
+
+    def __enter__(self) -> "_Sampler":
+        self.start_rss_kb = self._sample().get("rss_kb", 0)
+        self._thread.start()
+        return self
+
+    def __exit__(self, *exc) -> None:
+        self._stop.set()
+        self._thread.join()
+
+
+async def _drive(run_one, payloads: list[dict], concurrency: int) -> tuple[list[float], int, float]:
+    gate = asyncio.Semaphore(concurrency)
+    latencies: list[float] = []
+    errors = 0
+
+    async def one(body: dict) -> None:
+        nonlocal errors
+        async with gate:
+            started = time.perf_counter()
+            try:
+                await run_one(body)
+            except Exception:
+                errors += 1
+                return
+            latencies.append(time.perf_counter() - started)
+
+    started = time.perf_counter()
+    await asyncio.gather(*(one(body) for body in payloads))
+    return latencies, errors, time.perf_counter() - started
+
+
+def _percentile(values: list[float], pct: float) -> Optional[float]:
+    if not values:
+        return None
+    if len(values) == 1:
+        return values[0]
+    return statistics.quantiles(values, n=100, method="inclusive")[int(pct) - 1]
+
+
+def _summarise(latencies, errors, elapsed, sampler, upstream_requests, **scenario) -> dict:
+    return {
+        **scenario,
+        "completed": len(latencies),
+        "errors": errors,
+        "p50_s": _percentile(latencies, 50),
+        "p95_s": _percentile(latencies, 95),
+        "p99_s": _percentile(latencies, 99),
+        "throughput_rps": len(latencies) / elapsed if elapsed else 0.0,
+        "peak_rss_mb": sampler.peak_rss_kb / 1024,
+        "rss_per_run_mb": (
+            max(sampler.peak_rss_kb - sampler.start_rss_kb, 0) / 1024 / scenario["concurrency"]
+        ),
+        "peak_threads": sampler.peak_threads,
+        "upstream_requests": upstream_requests,
+    }
+
+
+def _scenarios(args) -> Iterator[tuple[int, int]]:
+    for tokens in args.transcript_tokens:
+        for concurrency in args.concurrency:
+            yield tokens, concurrency
+
+
+def _upstream_requests(llm_base: Optional[str]) -> int:
+    if llm_base is None:
+        return 0  # replaying: nothing is sent upstream
+    try:
+        return httpx.get(f"{llm_base.removesuffix('/v1')}/stats").json()["requests"]
+    except (httpx.HTTPError, KeyError, ValueError):
+        return 0
+
+
+def _node_times(traces: list[dict]) -> dict[str, dict[str, float]]:
+    """
+    Mean wall time per node over the runs' traces, and the part of it spent
+    neither queueing for nor waiting on LLM calls (the service's overhead).
+    """
+    samples: dict[str, list[tuple[float, float]]] = defaultdict(list)
+    for trace in traces:
+        llm_seconds: dict[str, float] = defaultdict(float)
+        for call in trace["llm_usage"]:
+            llm_seconds[call["node"]] += call["llm_seconds"]
+        for timing in trace["node_timings"]:
+            waited = timing["queue_seconds"] + llm_seconds[timing["node"]]
+            samples[timing["node"]].append(
+                (timing["duration"], max(timing["duration"] - waited, 0.0))
+            )
+    return {
+        node: {
+            "duration_s": statistics.fmean(duration for duration, _ in values),
+            "overhead_s": statistics.fmean(overhead for _, overhead in values),
+        }
+        for node, values in samples.items()
+    }
+
+
+async def bench_graph(args, llm_base: Optional[str]) -> list[dict]:
+    """Drive the compiled workflow in this process."""
+    # Imported here so the service modules see the stub's OPENAI_API_BASE.
+    from graph import arun
+
+    traces: list[dict] = []
+
+    async def run_one(body: dict) -> None:
+        result = await arun(body)
+        traces.append({key: result[key] for key in ("node_timings", "llm_usage")})
+
+    results = []
+    seed = 0
+    for tokens, concurrency in _scenarios(args):
+        payloads = [payload(tokens, seed := seed + 1) for _ in range(args.requests)]
+        traces.clear()
+        before = _upstream_requests(llm_base)
+        with _Sampler(os.getpid()) as sampler:
+            latencies, errors, elapsed = await _drive(run_one, payloads, concurrency)
+        results.append(
+            _summarise(
+                latencies, errors, elapsed, sampler, _upstream_requests(llm_base) - before,
+                target="graph", transcript_tokens=tokens, concurrency=concurrency,
+            )
+        )
+        print(_format_row(results[-1]), flush=True)
+        if args.node_times:
+            results[-1]["nodes"] = _node_times(traces)
+            for node, times in results[-1]["nodes"].items():
+                print(
+                    f"    {node:<32} {1000 * times['duration_s']:>10.1f} ms wall"
+                    f" {1000 * times['overhead_s']:>10.1f} ms overhead",
+                    flush=True,
+                )
+    return results
+
+
+def bench_api(args, llm_base: Optional[str], env: dict) -> list[dict]:
+    """Drive POST /run on a uvicorn-served app in a child process."""
+    port = _free_port()
+    server = [
+        sys.executable, "-m", "uvicorn", "app:app",
+        "--host", "127.0.0.1", "--port", str(port), "--log-level", "warning",
+    ]
+    base = f"http://127.0.0.1:{port}"
+    results = []
+    seed = 0
+    with _subprocess(server, env, f"{base}/docs") as process:
+        for tokens, concurrency in _scenarios(args):
+            payloads = [payload(tokens, seed := seed + 1) for _ in range(args.requests)]
+
+            async def drive() -> tuple[list[float], int, float]:
+                limits = httpx.Limits(max_connections=concurrency)
+                async with httpx.AsyncClient(base_url=base, timeout=None, limits=limits) as client:
+
+                    async def run_one(body: dict) -> None:
+                        response = await client.post("/run", json=body)
+                        response.raise_for_status()
+
+                    return await _drive(run_one, payloads, concurrency)
+
+            before = _upstream_requests(llm_base)
+            with _Sampler(process.pid) as sampler:
+                latencies, errors, elapsed = asyncio.run(drive())
+            results.append(
+                _summarise(
+                    latencies, errors, elapsed, sampler, _upstream_requests(llm_base) - before,
+                    target="api", transcript_tokens=tokens, concurrency=concurrency,
+                )
+            )
+            print(_format_row(results[-1]), flush=True)
+    return results
+
+
+_HEADER = (
+    f"{'target':<6} {'tokens':>7} {'conc':>5} {'ok':>5} {'err':>4} "
+    f"{'p50 s':>7} {'p95 s':>7} {'p99 s':>7} {'req/s':>7} {'rss MB':>7} {'MB/run':>7} "
+    f"{'thr':>4} {'llm req':>8}"
+)
+
+
+def _fmt(value: Optional[float], spec: str = ".3f") -> str:
+    return "-" if value is None else format(value, spec)
+
+
+def _format_row(row: dict) -> str:
+    return (
+        f"{row['target']:<6} {row['transcript_tokens']:>7} {row['concurrency']:>5} "
+        f"{row['completed']:>5} {row['errors']:>4} {_fmt(row['p50_s']):>7} "
+        f"{_fmt(row['p95_s']):>7} {_fmt(row['p99_s']):>7} {row['throughput_rps']:>7.2f} "
+        f"{row['peak_rss_mb']:>7.1f} {row['rss_per_run_mb']:>7.2f} {row['peak_threads']:>4} "
+        f"{row['upstream_requests']:>8}"
+    )
+
+
+def _compare(results: list[dict], baseline_path: str) -> None:
+    with open(baseline_path) as f:
+        baseline = {
+            (r["target"], r["transcript_tokens"], r["concurrency"]): r
+            for r in json.load(f)["results"]
+        }
+    print(f"\nChange vs {baseline_path} (negative is better for latency/RSS):")
+    for row in results:
+        old = baseline.get((row["target"], row["transcript_tokens"], row["concurrency"]))
+        if old is None:
+            continue
+        deltas = []
+        for key in (
+            "p50_s", "p95_s", "p99_s", "throughput_rps", "peak_rss_mb", "rss_per_run_mb",
+            "peak_threads",
+        ):
+            if old.get(key) and row.get(key) is not None:
+                deltas.append(f"{key} {100 * (row[key] - old[key]) / old[key]:+.1f}%")
+        print(
+            f"{row['target']:<6} {row['transcript_tokens']:>7} {row['concurrency']:>5}  "
+            + ", ".join(deltas)
+        )
+
+
+def _int_list(value: str) -> list[int]:
+    return [int(part) for part in value.split(",") if part]
+
+
+def main() -> None:
+    parser = argparse.ArgumentParser(description=__doc__.strip().splitlines()[0])
+    parser.add_argument("--target", choices=("graph", "api"), default="graph")
+    parser.add_argument("--concurrency", type=_int_list, default=[1, 8, 32])
+    parser.add_argument("--transcript-tokens", type=_int_list, default=[2000, 8000])
+    parser.add_argument("--requests", type=int, default=32, help="requests per scenario")
+    parser.add_argument("--llm-base", help="use an already running stub instead of starting one")
+    parser.add_argument("--latency-ms", type=float, default=300.0)
+    parser.add_argument("--latency-sigma", type=float, default=0.25)
+    parser.add_argument("--tokens-per-second", type=float, default=200.0)
+    parser.add_argument("--completion-tokens", type=int, default=150)
+    parser.add_argument("--error-rate", type=float, default=0.0)
+    parser.add_argument("--cache", action="store_true", help="keep the response cache enabled")
+    parser.add_argument("--output", help="write results as JSON")
+    parser.add_argument("--compare", help="baseline JSON from a previous --output")
+    recording = parser.add_mutually_exclusive_group()
+    recording.add_argument("--record", help="record upstream LLM traffic to this file")
+    recording.add_argument("--replay", help="answer LLM calls from this recording, no stub")
+    parser.add_argument(
+        "--replay-latency-scale", type=float, default=1.0,
+        help="multiplier for recorded latencies with --replay (0: none)",
+    )
+    parser.add_argument(
+        "--node-times", action="store_true", help="report per-node wall time and overhead (graph)"
+    )
+    args = parser.parse_args()
+
+    stub_port = _free_port()
+    llm_base = args.llm_base or f"http://127.0.0.1:{stub_port}/v1"
+    env = {
+        **os.environ,
+        "OPENAI_API_BASE": llm_base,
+        "OPENAI_API_KEY": os.getenv("OPENAI_API_KEY", "bench"),
+    }
+    if not args.cache:
+        env["LLM_CACHE_ENABLED"] = "0"
+    if args.record:
+        open(args.record, "w").close()
+        env.update(LLM_RECORD_MODE="record", LLM_RECORD_PATH=args.record)
+    if args.replay:
+        env.update(
+            LLM_RECORD_MODE="replay",
+            LLM_RECORD_PATH=args.replay,
+            LLM_REPLAY_LATENCY_SCALE=str(args.replay_latency_scale),
+        )
+    os.environ.update(env)
+    upstream = None if args.replay else llm_base
+
+    stub = [
+        sys.executable, "-m", "bench.fake_llm", "--port", str(stub_port),
+        "--latency-ms", str(args.latency_ms), "--latency-sigma", str(args.latency_sigma),
+        "--tokens-per-second", str(args.tokens_per_second),
+        "--completion-tokens", str(args.completion_tokens), "--error-rate", str(args.error_rate),
+    ]
+
+    def run() -> list[dict]:
+        if args.target == "graph":
+            # One event loop for every scenario: the shared LLM client's
+            # connection pool is bound to the loop it first ran on.
+            return asyncio.run(bench_graph(args, upstream))
+        return bench_api(args, upstream, env)
+
+    print(_HEADER, flush=True)
+    if args.llm_base or args.replay:
+        results = run()
+    else:
+        with _subprocess(stub, env, f"http://127.0.0.1:{stub_port}/stats"):
+            results = run()
+
+    if args.output:
+        with open(args.output, "w") as f:
+            json.dump({"args": vars(args), "results": results}, f, indent=2)
+    if args.compare:
+        _compare(results, args.compare)
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,302 @@
+"""
+Content-addressed response cache for node LLM calls.
+
+A cache key is derived from everything that determines a node's output:
+the node name, a hash of its PROMPTS entry, the model configuration of the
+client, and a hash of each GraphState field the node reads. Re-running a
+transcript with only some inputs changed therefore recomputes only the nodes
+that actually read those inputs (and their descendants).
+
+Two tiers are used:
+    memory – an LRU dict bounded by entry count, always on.
+    disk   – an optional SQLite table shared across restarts (and across the
+             worker processes of one host), bounded by entry count and
+             evicted least-recently-used first. The row count is kept in
+             the database itself (maintained by triggers), so every worker
+             sharing the file enforces the one capacity; once it is passed
+             the table is trimmed to 90% of it. Hit times are buffered and
+             written in batches, so a hit needs no write.
+  or
+    shared – with SHARED_BACKEND=redis, a Redis-compatible server shared by
+             every worker (see shared.py); eviction is left to the server.
+
+All tiers honour the same TTL. Hit/miss counters are kept per tier. The
+nodes use ``aget``/``aset``, which answer from memory on the event loop and
+run the blocking disk or shared lookups in a worker thread, so a busy SQLite
+lock or a slow Redis round trip never stalls other runs.
+
+Configuration is read from the .env file:
+    LLM_CACHE_ENABLED          – "0" disables the cache (default "1").
+    LLM_CACHE_MAX_ENTRIES      – in-memory LRU capacity (default 1024).
+    LLM_CACHE_TTL              – entry lifetime in seconds, 0 = never (default 86400).
+    LLM_CACHE_PATH             – SQLite file for the disk tier (unset = memory only,
+                                 or SHARED_SQLITE_PATH with SHARED_BACKEND=sqlite).
+    LLM_CACHE_MAX_DISK_ENTRIES – disk tier capacity (default 100000).
+"""
+
+import asyncio
+import hashlib
+import json
+import os
+import sqlite3
+import threading
+import time
+from collections import OrderedDict
+from functools import lru_cache
+from typing import Any, Optional
+
+from pydantic import BaseModel
+
+from shared import RedisStore, _get_shared_store, shared_backend
+from state import Blob
+
+
+def _digest(value: Any) -> str:
+    if isinstance(value, Blob):
+        # Equal to the digest of its text, computed once per handle.
+        return value.digest
+    if isinstance(value, BaseModel):
+        value = value.model_dump_json()
+    if not isinstance(value, str):
+        value = json.dumps(value, sort_keys=True, default=str)
+    return hashlib.sha256(value.encode("utf-8")).hexdigest()
+
+
+def make_key(
+    node: str,
+    prompt: dict[str, str],
+    model_config: dict[str, Any],
+    inputs: dict[str, Any],
+) -> str:
+    """Build the cache key for one node call."""
+    material = {
+        "node": node,
+        "prompt": _digest(prompt),
+        "model": model_config,
+        "inputs": {field: _digest(value) for field, value in sorted(inputs.items())},
+    }
+    return _digest(material)
+
+
+class ResponseCache:
+    """Two-tier (memory LRU + optional SQLite or shared) cache of LLM response texts."""
+
+    # Disk hits whose access times are buffered before one batched UPDATE.
+    TOUCH_BATCH = 256
+    # Share of max_disk_entries kept after an eviction pass.
+    EVICT_TO = 0.9
+
+    def __init__(
+        self,
+        max_entries: int = 1024,
+        ttl: float = 0,
+        path: Optional[str] = None,
+        max_disk_entries: int = 100_000,
+        shared: Optional[RedisStore] = None,
+    ) -> None:
+        self.max_entries = max_entries
+        self.ttl = ttl
+        self.max_disk_entries = max_disk_entries
+        self._shared = shared
+        self._memory: OrderedDict[str, tuple[float, str]] = OrderedDict()
+        # _lock guards the memory tier and the counters; _db_lock the SQLite
+        # connection, so memory hits never wait behind disk I/O.
+        self._lock = threading.Lock()
+        self._db_lock = threading.Lock()
+        self._stats = {
+            "memory_hits": 0,
+            "disk_hits": 0,
+            "shared_hits": 0,
+            "misses": 0,
+            "evictions": 0,
+        }
+        self._db: Optional[sqlite3.Connection] = None
+        self._touched: dict[str, float] = {}
+        if path:
+            self._db = sqlite3.connect(path, timeout=30, check_same_thread=False)
+            self._db.execute("PRAGMA journal_mode=WAL")
+            # One transaction, so the count row is seeded exactly once, by
+            # whichever process first creates the triggers that maintain it.
+            self._db.execute("BEGIN IMMEDIATE")
+            self._db.execute(
+                "CREATE TABLE IF NOT EXISTS responses ("
+                " key TEXT PRIMARY KEY,"
+                " value TEXT NOT NULL,"
+                " created REAL NOT NULL,"
+                " accessed REAL NOT NULL)"
+            )
+            self._db.execute(
+                "CREATE TABLE IF NOT EXISTS responses_count ("
+                " id INTEGER PRIMARY KEY CHECK (id = 0),"
+                " entries INTEGER NOT NULL)"
+            )
+            self._db.execute(
+                "INSERT OR IGNORE INTO responses_count (id, entries)"
+                " SELECT 0, COUNT(*) FROM responses"
+            )
+            self._db.execute(
+                "CREATE TRIGGER IF NOT EXISTS responses_inserted AFTER INSERT ON responses"
+                " BEGIN UPDATE responses_count SET entries = entries + 1; END"
+            )
+            self._db.execute(
+                "CREATE TRIGGER IF NOT EXISTS responses_deleted AFTER DELETE ON responses"
+                " BEGIN UPDATE responses_count SET entries = entries - 1; END"
+            )
+            self._db.commit()
+
+    def _expired(self, created: float, now: float) -> bool:
+        return bool(self.ttl) and now - created > self.ttl
+
+    @property
+    def _backed(self) -> bool:
+        return self._db is not None or self._shared is not None
+
+    def get(self, key: str) -> Optional[str]:
+        """Return the cached response for ``key``, or None on a miss."""
+        now = time.time()
+        value = self._get_memory(key, now)
+        return value if value is not None else self._get_backing(key, now)
+
+    async def aget(self, key: str) -> Optional[str]:
+        """``get`` with the disk or shared lookup run in a worker thread."""
+        now = time.time()
+        value = self._get_memory(key, now)
+        if value is not None or not self._backed:
+            return value if value is not None else self._get_backing(key, now)
+        return await asyncio.to_thread(self._get_backing, key, now)
+
+    def set(self, key: str, value: str) -> None:
+        """Store ``value`` under ``key`` in every enabled tier."""
+        now = time.time()
+        with self._lock:
+            self._store_memory(key, now, value)
+        self._set_backing(key, value, now)
+
+    async def aset(self, key: str, value: str) -> None:
+        """``set`` with the disk or shared write run in a worker thread."""
+        now = time.time()
+        with self._lock:
+            self._store_memory(key, now, value)
+        if self._backed:
+            await asyncio.to_thread(self._set_backing, key, value, now)
+
+    def _get_memory(self, key: str, now: float) -> Optional[str]:
+        with self._lock:
+            entry = self._memory.get(key)
+            if entry is None:
+                return None
+            created, value = entry
+            if self._expired(created, now):
+                del self._memory[key]
+                return None
+            self._memory.move_to_end(key)
+            self._stats["memory_hits"] += 1
+            return value
+
+    def _get_backing(self, key: str, now: float) -> Optional[str]:
+        """Look ``key`` up in the disk or shared tier (blocking) and count the outcome."""
+        value, created, tier = None, now, None
+        if self._db is not None:
+            with self._db_lock:
+                row = self._db.execute(
+                    "SELECT value, created FROM responses WHERE key = ?", (key,)
+                ).fetchone()
+                if row is not None:
+                    if not self._expired(row[1], now):
+                        value, created, tier = row[0], row[1], "disk_hits"
+                        self._touched[key] = now
+                        if len(self._touched) >= self.TOUCH_BATCH:
+                            self._flush_touched()
+                            self._db.commit()
+                    else:
+                        self._db.execute("DELETE FROM responses WHERE key = ?", (key,))
+                        self._db.commit()
+        elif self._shared is not None:
+            value = self._shared.get(key)
+            tier = "shared_hits"
+        with self._lock:
+            if value is None:
+                self._stats["misses"] += 1
+                return None
+            self._store_memory(key, created, value)
+            self._stats[tier] += 1
+        return value
+
+    def _set_backing(self, key: str, value: str, now: float) -> None:
+        """Write ``key`` to the disk or shared tier; blocking."""
+        if self._db is not None:
+            with self._db_lock:
+                # An upsert, not INSERT OR REPLACE: a replace would delete the
+                # old row without firing the count trigger.
+                self._db.execute(
+                    "INSERT INTO responses (key, value, created, accessed)"
+                    " VALUES (?, ?, ?, ?)"
+                    " ON CONFLICT (key) DO UPDATE SET"
+                    " value = excluded.value, created = excluded.created,"
+                    " accessed = excluded.accessed",
+                    (key, value, now, now),
+                )
+                self._touched.pop(key, None)
+                # Read in the insert's transaction: the count every worker shares.
+                (count,) = self._db.execute("SELECT entries FROM responses_count").fetchone()
+                if count > self.max_disk_entries:
+                    self._evict_disk(count)
+                self._db.commit()
+        elif self._shared is not None:
+            self._shared.set(key, value, self.ttl)
+
+    def _flush_touched(self) -> None:
+        """Write the buffered hit times; the caller holds _db_lock and commits."""
+        if self._touched:
+            self._db.executemany(
+                "UPDATE responses SET accessed = ? WHERE key = ?",
+                [(accessed, key) for key, accessed in self._touched.items()],
+            )
+            self._touched.clear()
+
+    def _evict_disk(self, count: int) -> None:
+        """Trim the disk tier from ``count`` rows to EVICT_TO of its capacity, LRU first."""
+        self._flush_touched()
+        excess = count - int(self.max_disk_entries * self.EVICT_TO)
+        self._db.execute(
+            "DELETE FROM responses WHERE key IN ("
+            " SELECT key FROM responses ORDER BY accessed LIMIT ?)",
+            (excess,),
+        )
+        with self._lock:
+            self._stats["evictions"] += excess
+
+    def _store_memory(self, key: str, created: float, value: str) -> None:
+        self._memory[key] = (created, value)
+        self._memory.move_to_end(key)
+        while len(self._memory) > self.max_entries:
+            self._memory.popitem(last=False)
+            self._stats["evictions"] += 1
+
+    def stats(self) -> dict[str, int]:
+        """Return a snapshot of the hit/miss/eviction counters."""
+        with self._lock:
+            stats = dict(self._stats)
+        stats["hits"] = stats["memory_hits"] + stats["disk_hits"] + stats["shared_hits"]
+        stats["memory_entries"] = len(self._memory)
+        return stats
+
+
+@lru_cache(maxsize=1)
+def _get_cache() -> Optional[ResponseCache]:
+    """
+    Return the process-wide response cache, or None when caching is disabled.
+    """
+    if os.getenv("LLM_CACHE_ENABLED", "1") == "0":
+        return None
+    backend = shared_backend()
+    path = os.getenv("LLM_CACHE_PATH") or None
+    if path is None and backend == "sqlite":
+        path = os.getenv("SHARED_SQLITE_PATH", "shared.db")
+    return ResponseCache(
+        max_entries=int(os.getenv("LLM_CACHE_MAX_ENTRIES", "1024")),
+        ttl=float(os.getenv("LLM_CACHE_TTL", "86400")),
+        path=path,
+        max_disk_entries=int(os.getenv("LLM_CACHE_MAX_DISK_ENTRIES", "100000")),
+        shared=_get_shared_store() if backend == "redis" and path is None else None,
+    )
@@ -0,0 +1,127 @@
+"""
+Transcript chunking for the map-reduce extraction mode.
+
+A transcript is first cut into blocks at speaker-turn and section boundaries
+(a line that opens a new speaker turn or section, or a blank line), so a chunk
+never starts in the middle of someone's answer. Blocks are then packed
+greedily into chunks of at most ``chunk_tokens``; each chunk after the first
+repeats up to ``overlap_tokens`` of trailing blocks from its predecessor so
+statements that straddle a boundary are seen whole at least once.
+
+``merge_outputs`` reduces the per-chunk text outputs. A statement in the
+overlap is seen by two neighbouring chunks and may be extracted by both, so a
+line that repeats one of the previous chunk's output lines (ignoring bullet
+markers, case and spacing) is dropped.
+
+Token counts come from tokens.count_tokens with the tokenizer of the model
+the node is routed to (tiktoken, or four characters per token when it is
+unavailable).
+"""
+
+import re
+from typing import Optional, Sequence
+
+from tokens import count_tokens
+from transcript import is_boundary
+
+_BULLET = re.compile(r"^\s*(?:[-*•]|\d+[.)])\s+")
+
+
+def _blocks(transcript: str) -> list[str]:
+    blocks: list[list[str]] = [[]]
+    for line in transcript.splitlines():
+        starts_block = not line.strip() or is_boundary(line)
+        if starts_block and blocks[-1]:
+            blocks.append([])
+        if line.strip():
+            blocks[-1].append(line)
+    return ["\n".join(block) for block in blocks if block]
+
+
+def _split_oversized(block: str, chunk_tokens: int, model: Optional[str]) -> list[str]:
+    # A single turn longer than a whole chunk falls back to line, then
+    # character, boundaries.
+    pieces: list[str] = []
+    current: list[str] = []
+    size = 0
+    for line in block.splitlines():
+        line_size = count_tokens(line, model)
+        while line_size > chunk_tokens:
+            cut = chunk_tokens * 4
+            while cut > 1 and count_tokens(line[:cut], model) > chunk_tokens:
+                cut = cut * 9 // 10
+            pieces.append(line[:cut])
+            line = line[cut:]
+            line_size = count_tokens(line, model)
+        if not line:
+            continue
+        # Adding a line costs its tokens plus at most one for the newline.
+        if current and size + line_size + 1 > chunk_tokens:
+            pieces.append("\n".join(current))
+            current, size = [], 0
+        current.append(line)
+        size += line_size + (1 if len(current) > 1 else 0)
+    if current:
+        pieces.append("\n".join(current))
+    return pieces
+
+
+def split_transcript(
+    transcript: str, chunk_tokens: int, overlap_tokens: int = 0, model: Optional[str] = None
+) -> list[str]:
+    """
+    Split ``transcript`` into token-budgeted chunks on speaker/section
+    boundaries, counting tokens with ``model``'s tokenizer.
+    """
+    if count_tokens(transcript, model) <= chunk_tokens:
+        return [transcript]
+
+    blocks: list[str] = []
+    for block in _blocks(transcript):
+        if count_tokens(block, model) > chunk_tokens:
+            blocks.extend(_split_oversized(block, chunk_tokens, model))
+        else:
+            blocks.append(block)
+
+    chunks: list[str] = []
+    current: list[str] = []
+    size = 0
+    for block in blocks:
+        block_size = count_tokens(block, model)
+        if current and size + block_size > chunk_tokens:
+            chunks.append("\n\n".join(current))
+            overlap: list[str] = []
+            overlap_size = 0
+            for previous in reversed(current):
+                previous_size = count_tokens(previous, model)
+                if overlap_size + previous_size > overlap_tokens:
+                    break
+                overlap.insert(0, previous)
+                overlap_size += previous_size
+            # Never let the overlap alone crowd out the incoming block.
+            while overlap and overlap_size + block_size > chunk_tokens:
+                overlap_size -= count_tokens(overlap.pop(0), model)
+            current, size = overlap, overlap_size
+        current.append(block)
+        size += block_size
+    if current:
+        chunks.append("\n\n".join(current))
+    return chunks
+
+
+def _line_key(line: str) -> str:
+    return " ".join(_BULLET.sub("", line).split()).casefold()
+
+
+def merge_outputs(parts: Sequence[str]) -> str:
+    """Join per-chunk outputs in transcript order, minus lines repeated from the overlap."""
+    merged: list[str] = []
+    previous: set[str] = set()
+    for part in parts:
+        lines = part.splitlines()
+        kept = [line for line in lines if not line.strip() or _line_key(line) not in previous]
+        previous = {_line_key(line) for line in lines if line.strip()}
+        text = "\n".join(kept).strip()
+        if text:
+            merged.append(text)
+    return "\n\n".join(merged)
@@ -0,0 +1,146 @@
+"""
+Per-node execution settings.
+
+Prompts live in prompts.py; this module holds the knobs that control how each
+node's LLM calls are executed.
+"""
+
+# Part of the transcript each transcript-reading node is sent, taken from the
+# sections json_parser precomputes (see transcript.py): "full",
+# "prepared_remarks" or "qa". A node whose slice comes out empty (for example
+# no Q&A marker was found) falls back to the full transcript.
+TRANSCRIPT_SLICES: dict[str, str] = {
+    "transcript_fa_extraction": "full",
+    "transcript_guidance_extraction": "full",
+    "guid_validation": "full",
+    "segment_extraction": "full",
+    "context_retrieval": "full",
+    "transcript_QA_extraction": "qa",
+}
+
+# Map-reduce mode for the nodes that read the raw transcript. When a node is
+# enabled and its transcript exceeds ``chunk_tokens``, the transcript is split
+# on speaker/section boundaries (see chunking.py), the node's prompt is run on
+# every chunk in parallel, and the partial outputs are concatenated in
+# transcript order (structured outputs merged per segment). ``overlap_tokens``
+# of trailing context are repeated at the start of each following chunk;
+# items extracted twice from the overlap are dropped in the reduce.
+CHUNKING: dict[str, dict] = {
+    "transcript_fa_extraction": {"enabled": False, "chunk_tokens": 8000, "overlap_tokens": 400},
+    "transcript_guidance_extraction": {"enabled": False, "chunk_tokens": 8000, "overlap_tokens": 400},
+    "transcript_QA_extraction": {"enabled": False, "chunk_tokens": 8000, "overlap_tokens": 400},
+    "segment_extraction": {"enabled": False, "chunk_tokens": 8000, "overlap_tokens": 400},
+    "context_retrieval": {"enabled": False, "chunk_tokens": 8000, "overlap_tokens": 400},
+}
+
+# Fields of the structured segment outputs (see schemas.py) rendered into
+# each consumer's prompt. The segment name is always included; fields not
+# listed are left out of the prompt entirely.
+RENDER_FIELDS: dict[str, dict[str, tuple[str, ...]]] = {
+    "context_retrieval": {
+        "segment_extraction_out": ("segment", "metrics"),
+    },
+    "integrator": {
+        "segment_extraction_out": ("segment", "metrics", "commentary"),
+        "context_retrieval_out": ("segment", "drivers", "outlook", "quotes"),
+    },
+    "summarizer": {
+        "segment_extraction_out": ("segment", "metrics", "commentary"),
+        "context_retrieval_out": ("segment", "drivers", "outlook"),
+    },
+    "integrator_summarizer": {
+        "segment_extraction_out": ("segment", "metrics", "commentary"),
+        "context_retrieval_out": ("segment", "drivers", "outlook", "quotes"),
+    },
+}
+
+# Prompt token budget of each node's LLM calls, enforced by tokens.py before a
+# call is sent. When the counted prompt exceeds ``max_input_tokens``, the
+# sections named in ``trim`` (labels as passed to nodes._build_messages) are
+# cut down in the order listed until it fits; a prompt that still does not
+# fit is rejected instead of sent. Entries override DEFAULT_TOKEN_BUDGET.
+DEFAULT_TOKEN_BUDGET: dict = {"max_input_tokens": 120_000, "trim": ()}
+TOKEN_BUDGETS: dict[str, dict] = {
+    "transcript_fa_extraction": {"trim": ("Transcript",)},
+    "fa_highlights": {"trim": ("Extracted FA Transcript",)},
+    "transcript_guidance_extraction": {"trim": ("Transcript",)},
+    "guid_validation": {"trim": ("Transcript", "Extracted Guidance")},
+    "segment_extraction": {"trim": ("Transcript",)},
+    "context_retrieval": {"trim": ("Transcript", "Segment Extraction Output")},
+    "integrator": {"trim": ("Context Retrieval Output",)},
+    "key_messages": {"trim": ("Integrator Output",)},
+    "summarizer": {"trim": ("Context Retrieval Output",)},
+    "briefing_key_messages": {"trim": ("Summarizer Output",)},
+    "integrator_summarizer": {"trim": ("Context Retrieval Output",)},
+    "key_messages_briefing": {"trim": ("Integrator Output", "Summarizer Output")},
+    "transcript_QA_extraction": {"trim": ("Transcript",)},
+    "second_QA": {"trim": ("Extracted QA",)},
+    "output_template": {"trim": ("QA", "Briefing Key Messages")},
+}
+
+# Timeout, retry and hedging policy for each node's LLM calls, applied by
+# resilience.py. Entries override DEFAULT_CALL_POLICY key by key; see the
+# resilience module docstring for the meaning of each key. Hedging sends a
+# duplicate request, so it costs extra tokens and is off by default; leave it
+# off for output_template, whose tokens are streamed to /run/stream clients.
+DEFAULT_CALL_POLICY: dict = {
+    "timeout": 120.0,
+    "max_retries": 2,
+    "backoff_base": 1.0,
+    "backoff_max": 20.0,
+    "hedge": False,
+    "hedge_quantile": 0.95,
+}
+CALL_POLICIES: dict[str, dict] = {
+    "transcript_fa_extraction": {},
+    "fa_highlights": {},
+    "transcript_guidance_extraction": {},
+    "guid_validation": {},
+    "segment_extraction": {},
+    "context_retrieval": {},
+    "integrator": {},
+    "key_messages": {},
+    "summarizer": {},
+    "briefing_key_messages": {},
+    "integrator_summarizer": {},
+    "key_messages_briefing": {},
+    "transcript_QA_extraction": {},
+    "second_QA": {},
+    "output_template": {"timeout": 180.0},
+}
+
+# Model used by each node, applied by llm._get_llm on top of the default
+# client (OPENAI_API_BASE and the provider's default model). Each entry may
+# set "model", "max_tokens", "temperature" and "base_url"; one client is built
+# per distinct combination. Route the extraction steps to a small, fast model
+# and keep the large model for synthesis, for example:
+#     "transcript_QA_extraction": {"model": "gpt-4.1-mini", "max_tokens": 2048},
+#     "output_template": {"model": "gpt-4.1", "temperature": 0.2},
+MODEL_ROUTES: dict[str, dict] = {
+    "transcript_fa_extraction": {},
+    "fa_highlights": {},
+    "transcript_guidance_extraction": {},
+    "guid_validation": {},
+    "segment_extraction": {},
+    "context_retrieval": {},
+    "integrator": {},
+    "key_messages": {},
+    "summarizer": {},
+    "briefing_key_messages": {},
+    "integrator_summarizer": {},
+    "key_messages_briefing": {},
+    "transcript_QA_extraction": {},
+    "second_QA": {},
+    "output_template": {},
+}
+
+# USD list prices per million tokens, used for the cost estimates in
+# metrics.py. Models missing here are reported with a cost of 0. Adjust to
+# your provider contract.
+MODEL_PRICES: dict[str, dict[str, float]] = {
+    "gpt-4.1": {"input": 2.00, "cached_input": 0.50, "output": 8.00},
+    "gpt-4.1-mini": {"input": 0.40, "cached_input": 0.10, "output": 1.60},
+    "gpt-4o": {"input": 2.50, "cached_input": 1.25, "output": 10.00},
+    "gpt-4o-mini": {"input": 0.15, "cached_input": 0.075, "output": 0.60},
+    "gpt-3.5-turbo": {"input": 0.50, "output": 1.50},
+}
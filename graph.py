@@ -12,61 +12,264 @@ START
         └─► transcript_QA_extraction ─► second_QA ──────────────────────────────────────┤
                                                                                output_template
                                                                                      └─► wrapper ─► END
+
+Branch 3 modes
+--------------
+BRANCH3_MODE selects how branch 3 runs after context_retrieval:
+    "separate" (default) – integrator/summarizer and key_messages/
+                           briefing_key_messages as four calls, as drawn above.
+    "fused"              – context_retrieval ─► integrator_summarizer ─►
+                           key_messages_briefing ─► output_template: each pair
+                           shares its inputs, so one structured-output call
+                           produces both of its outputs. This halves branch 3's
+                           input tokens for those steps and shortens the branch
+                           by one sequential call.
+
+Report sections
+---------------
+A run can ask for a subset of the report's sections (``sections`` in the
+input state, see state.REPORT_SECTIONS); by default it produces all of them.
+json_parser and context_retrieval route with conditional edges to the branch
+nodes the requested sections need, so a run asking for "guidance" and "qa"
+executes branches 2 and 4 only. output_template is a deferred node fed by an
+edge from every branch tail: it runs once, after whichever branches ran, and
+is sent only the requested sections' outputs.
+
+Checkpointing
+-------------
+With a checkpointer configured, LangGraph saves the state after every
+superstep, keyed by the run's thread id (see ``run_config``). The writes of
+nodes that succeeded in a superstep are saved even when a sibling node fails,
+so ``resume_run`` re-executes only the failed node and its descendants:
+a transient failure at output_template costs one LLM call on retry, not
+thirteen.
+
+Every run is recorded as open from ``start_run`` until ``finish_run``. A run
+still open CHECKPOINT_INCOMPLETE_TTL seconds after it last started or resumed
+is abandoned: the next run to start deletes its checkpoints.
+
+Incremental re-runs
+-------------------
+``rerun`` executes a finished run again with some inputs changed. A node is
+dirty if it reads a changed input (NODE_INPUTS in nodes.py) or descends from
+a dirty node along the graph's edges; only the dirty subgraph is executed,
+starting from the previous run's final state, which is read from its kept
+checkpoint (CHECKPOINT_KEEP_COMPLETED=1). Editing segment_items, for example,
+re-executes integrator, summarizer, their key-message nodes, output_template
+and wrapper, and reuses everything else.
+
+Startup
+-------
+Importing this module is cheap: LangGraph, LangChain and the node functions
+are imported, and the workflow compiled, on the first call to
+``_get_workflow`` (every helper below goes through it). ``warm_up`` does that
+work, plus building every node's LLM client, ahead of the first run; the API
+calls it at startup and reports readiness once it has finished. Async code
+gets the workflow with ``aget_workflow``, which waits for a build in progress
+in a worker thread rather than on the event loop.
+
+Configuration is read from the .env file:
+    BRANCH3_MODE             – "separate" (default) or "fused", see above.
+    CHECKPOINTER             – "none" (default), "memory" or "sqlite".
+    CHECKPOINT_DB_PATH       – SQLite file for CHECKPOINTER=sqlite
+                               (default "checkpoints.db"; requires the
+                               langgraph-checkpoint-sqlite package).
+    CHECKPOINT_KEEP_COMPLETED – 1 keeps the checkpoints of runs that finished
+                               successfully; by default they are deleted.
+    CHECKPOINT_KEEP_MAX_RUNS – with CHECKPOINT_KEEP_COMPLETED=1, the number of
+                               completed runs kept; finishing another deletes
+                               the oldest (default 1000, 0 = no limit).
+    CHECKPOINT_INCOMPLETE_TTL – seconds the checkpoints of a run that did not
+                               finish (it failed, or its /run/stream client
+                               disconnected) are kept for resuming; starting
+                               a run deletes those older than this
+                               (default 86400, 0 = keep them).
 """
 
-from langgraph.graph import END, START, StateGraph
-
-from nodes import (
-    briefing_key_messages_node,
-    context_retrieval_node,
-    fa_highlights_node,
-    guid_validation_node,
-    integrator_node,
-    json_parser_node,
-    key_messages_node,
-    output_template_node,
-    second_QA_node,
-    segment_extraction_node,
-    summarizer_node,
-    transcript_QA_extraction_node,
-    transcript_fa_extraction_node,
-    transcript_guidance_extraction_node,
-    wrapper_node,
-)
-from state import GraphState
+import asyncio
+import logging
+import os
+import threading
+import time
+import uuid
+from collections import OrderedDict
+from functools import lru_cache
+from typing import TYPE_CHECKING, Iterable, Optional
+
+from schemas import ContextRetrieval, SegmentExtraction
+from state import Blob, requested_sections, text
+
+if TYPE_CHECKING:
+    from langgraph.checkpoint.base import BaseCheckpointSaver
+    from langgraph.graph.state import CompiledStateGraph
+
+logger = logging.getLogger(__name__)
+
+# The sentinels of langgraph.graph, kept here so that importing this module
+# does not import LangGraph (see "Startup" above).
+START = "__start__"
+END = "__end__"
+
+# Request fields a run can be re-executed with (see ``rerun``).
+INPUT_FIELDS: tuple[str, ...] = ("report_template", "transcript", "segment_data", "segment_items")
+
+# Nodes every run executes, whatever sections it requests.
+_COMMON_NODES: tuple[str, ...] = ("json_parser", "output_template", "wrapper")
+
+# Pydantic types stored in GraphState, allowed to be restored from checkpoints.
+_CHECKPOINT_TYPES = [
+    (cls.__module__, cls.__name__) for cls in (SegmentExtraction, ContextRetrieval, Blob)
+]
+
+
+def _sqlite_checkpointer(path: str) -> "BaseCheckpointSaver":
+    from langgraph.checkpoint.serde.jsonplus import JsonPlusSerializer
+
+    try:
+        import aiosqlite
+        from langgraph.checkpoint.sqlite.aio import AsyncSqliteSaver
+    except ImportError as exc:
+        raise RuntimeError(
+            "CHECKPOINTER=sqlite requires the langgraph-checkpoint-sqlite package"
+        ) from exc
+
+    serde = JsonPlusSerializer(allowed_msgpack_modules=_CHECKPOINT_TYPES)
+
+    async def open_saver() -> AsyncSqliteSaver:
+        return AsyncSqliteSaver(aiosqlite.connect(path), serde=serde)
+
+    # AsyncSqliteSaver binds the running loop at construction, but only its
+    # sync methods use it; the graph is driven exclusively through the async
+    # API, so a short-lived loop is enough when built outside one (as in
+    # warm_up's thread).
+    try:
+        asyncio.get_running_loop()
+    except RuntimeError:
+        return asyncio.run(open_saver())
+    return AsyncSqliteSaver(aiosqlite.connect(path), serde=serde)
+
+
+def _get_checkpointer() -> Optional["BaseCheckpointSaver"]:
+    kind = os.getenv("CHECKPOINTER", "none").lower()
+    if kind == "none":
+        return None
+    if kind == "memory":
+        from langgraph.checkpoint.memory import InMemorySaver
+        from langgraph.checkpoint.serde.jsonplus import JsonPlusSerializer
 
+        return InMemorySaver(
+            serde=JsonPlusSerializer(allowed_msgpack_modules=_CHECKPOINT_TYPES)
+        )
+    if kind == "sqlite":
+        return _sqlite_checkpointer(os.getenv("CHECKPOINT_DB_PATH", "checkpoints.db"))
+    raise ValueError(f"unknown CHECKPOINTER {kind!r}; expected none, memory or sqlite")
 
-def build_graph() -> StateGraph:
+
+def _section_nodes(branch3_mode: str) -> dict[str, tuple[str, ...]]:
+    """The branch nodes each report section needs, from branch head to tail."""
+    if branch3_mode == "fused":
+        key_messages = briefing = ("integrator_summarizer", "key_messages_briefing")
+    else:
+        key_messages = ("integrator", "key_messages")
+        briefing = ("summarizer", "briefing_key_messages")
+    return {
+        "fa_highlights": ("transcript_fa_extraction", "fa_highlights"),
+        "guidance": ("transcript_guidance_extraction", "guid_validation"),
+        "briefing_key_messages": ("segment_extraction", "context_retrieval", *briefing),
+        "key_messages": ("segment_extraction", "context_retrieval", *key_messages),
+        "qa": ("transcript_QA_extraction", "second_QA"),
+    }
+
+
+def _required_nodes(sections: Optional[Iterable[str]], branch3_mode: str) -> set[str]:
+    by_section = _section_nodes(branch3_mode)
+    return {
+        *_COMMON_NODES,
+        *(node for section in requested_sections(sections) for node in by_section[section]),
+    }
+
+
+def build_graph(
+    checkpointer: Optional["BaseCheckpointSaver"] = None,
+    branch3_mode: Optional[str] = None,
+) -> "CompiledStateGraph":
+    from langgraph.graph import StateGraph
+
+    from metrics import instrument
+    from nodes import (
+        briefing_key_messages_node,
+        context_retrieval_node,
+        fa_highlights_node,
+        guid_validation_node,
+        integrator_node,
+        integrator_summarizer_node,
+        json_parser_node,
+        key_messages_briefing_node,
+        key_messages_node,
+        output_template_node,
+        second_QA_node,
+        segment_extraction_node,
+        summarizer_node,
+        transcript_QA_extraction_node,
+        transcript_fa_extraction_node,
+        transcript_guidance_extraction_node,
+        wrapper_node,
+    )
+    from state import GraphState
+
+    branch3_mode = branch3_mode or os.getenv("BRANCH3_MODE", "separate")
+    if branch3_mode not in ("separate", "fused"):
+        raise ValueError(f"unknown BRANCH3_MODE {branch3_mode!r}; expected separate or fused")
     builder = StateGraph(GraphState)
 
+    def add_node(name: str, node_fn, **kwargs) -> None:
+        # Every node is wrapped by metrics.instrument, which records its wall
+        # time, queueing time, tokens and cost in the run trace and in the
+        # Prometheus metrics.
+        builder.add_node(name, instrument(name, node_fn), **kwargs)
+
+    def add_fan_out(source: str, targets: list[str]) -> None:
+        # Route only to the targets the run's requested sections need.
+        def route(state: GraphState) -> list[str]:
+            required = _required_nodes(state.get("sections"), branch3_mode)
+            return [target for target in targets if target in required]
+
+        builder.add_conditional_edges(source, route, targets)
+
     # ------------------------------------------------------------------
     # Register all nodes
     # ------------------------------------------------------------------
-    builder.add_node("json_parser", json_parser_node)
+    add_node("json_parser", json_parser_node)
 
     # Branch 1
-    builder.add_node("transcript_fa_extraction", transcript_fa_extraction_node)
-    builder.add_node("fa_highlights", fa_highlights_node)
+    add_node("transcript_fa_extraction", transcript_fa_extraction_node)
+    add_node("fa_highlights", fa_highlights_node)
 
     # Branch 2
-    builder.add_node("transcript_guidance_extraction", transcript_guidance_extraction_node)
-    builder.add_node("guid_validation", guid_validation_node)
+    add_node("transcript_guidance_extraction", transcript_guidance_extraction_node)
+    add_node("guid_validation", guid_validation_node)
 
     # Branch 3
-    builder.add_node("segment_extraction", segment_extraction_node)
-    builder.add_node("context_retrieval", context_retrieval_node)
-    builder.add_node("integrator", integrator_node)
-    builder.add_node("key_messages", key_messages_node)
-    builder.add_node("summarizer", summarizer_node)
-    builder.add_node("briefing_key_messages", briefing_key_messages_node)
+    add_node("segment_extraction", segment_extraction_node)
+    add_node("context_retrieval", context_retrieval_node)
+    if branch3_mode == "fused":
+        add_node("integrator_summarizer", integrator_summarizer_node)
+        add_node("key_messages_briefing", key_messages_briefing_node)
+        branch3_tails = ["key_messages_briefing"]
+    else:
+        add_node("integrator", integrator_node)
+        add_node("key_messages", key_messages_node)
+        add_node("summarizer", summarizer_node)
+        add_node("briefing_key_messages", briefing_key_messages_node)
+        branch3_tails = ["key_messages", "briefing_key_messages"]
 
     # Branch 4
-    builder.add_node("transcript_QA_extraction", transcript_QA_extraction_node)
-    builder.add_node("second_QA", second_QA_node)
+    add_node("transcript_QA_extraction", transcript_QA_extraction_node)
+    add_node("second_QA", second_QA_node)
 
     # Aggregation & wrapping
-    builder.add_node("output_template", output_template_node)
-    builder.add_node("wrapper", wrapper_node)
+    add_node("output_template", output_template_node, defer=True)
+    add_node("wrapper", wrapper_node)
 
     # ------------------------------------------------------------------
     # Define edges
@@ -75,41 +278,432 @@ def build_graph() -> StateGraph:
     # Entry point
     builder.add_edge(START, "json_parser")
 
-    # Fan-out: json_parser → all four branch heads (executed in parallel)
-    builder.add_edge("json_parser", "transcript_fa_extraction")
-    builder.add_edge("json_parser", "transcript_guidance_extraction")
-    builder.add_edge("json_parser", "segment_extraction")
-    builder.add_edge("json_parser", "transcript_QA_extraction")
+    # Fan-out: json_parser → the heads of the requested branches (executed in
+    # parallel; all four by default)
+    add_fan_out(
+        "json_parser",
+        [
+            "transcript_fa_extraction",
+            "transcript_guidance_extraction",
+            "segment_extraction",
+            "transcript_QA_extraction",
+        ],
+    )
 
     # Branch 1: Financial Highlights
     builder.add_edge("transcript_fa_extraction", "fa_highlights")
-    builder.add_edge("fa_highlights", "output_template")
 
     # Branch 2: Guidance
     builder.add_edge("transcript_guidance_extraction", "guid_validation")
-    builder.add_edge("guid_validation", "output_template")
 
     # Branch 3: Key Message
     #   segment_extraction → context_retrieval
-    #   context_retrieval fans out to integrator and summarizer (parallel)
+    #   context_retrieval fans out to integrator and/or summarizer (parallel),
+    #   as the requested sections need, or feeds the fused pair in sequence
     builder.add_edge("segment_extraction", "context_retrieval")
-    builder.add_edge("context_retrieval", "integrator")
-    builder.add_edge("context_retrieval", "summarizer")
-    builder.add_edge("integrator", "key_messages")
-    builder.add_edge("key_messages", "output_template")
-    builder.add_edge("summarizer", "briefing_key_messages")
-    builder.add_edge("briefing_key_messages", "output_template")
+    if branch3_mode == "fused":
+        builder.add_edge("context_retrieval", "integrator_summarizer")
+        builder.add_edge("integrator_summarizer", "key_messages_briefing")
+    else:
+        add_fan_out("context_retrieval", ["integrator", "summarizer"])
+        builder.add_edge("integrator", "key_messages")
+        builder.add_edge("summarizer", "briefing_key_messages")
 
     # Branch 4: QA
     builder.add_edge("transcript_QA_extraction", "second_QA")
-    builder.add_edge("second_QA", "output_template")
 
     # Fan-in at output_template; then wrapper; then END
+    #   output_template is deferred: however many tails ran, and in however
+    #   many supersteps they finished, it runs once, when no other node is
+    #   left to run. (A multi-source edge would wait forever for the tails of
+    #   branches that were not requested.)
+    for tail in ["fa_highlights", "guid_validation", *branch3_tails, "second_QA"]:
+        builder.add_edge(tail, "output_template")
     builder.add_edge("output_template", "wrapper")
     builder.add_edge("wrapper", END)
 
+    return builder.compile(checkpointer=checkpointer)
+
+
+_workflow_lock = threading.Lock()
+
+
+@lru_cache(maxsize=1)
+def _build_workflow() -> "CompiledStateGraph":
+    return build_graph(_get_checkpointer())
+
+
+def _get_workflow() -> "CompiledStateGraph":
+    """
+    Return the process-wide compiled workflow, building it on first use (or
+    in ``warm_up``). The lock keeps a warm-up thread and an early request
+    from building two workflows with two checkpointers. Blocking: async code
+    uses ``aget_workflow``.
+    """
+    with _workflow_lock:
+        return _build_workflow()
+
+
+async def aget_workflow() -> "CompiledStateGraph":
+    """
+    ``_get_workflow`` for async code. Once the workflow is built it is
+    returned directly; before that, building it (or waiting for the warm-up
+    thread that is building it) happens in a worker thread, so the event loop
+    keeps serving /health/ready and other requests meanwhile.
+    """
+    if _build_workflow.cache_info().currsize:
+        return _build_workflow()
+    return await asyncio.to_thread(_get_workflow)
+
+
+@lru_cache(maxsize=1)
+def node_names() -> list[str]:
+    """Node names of the compiled workflow, used for job progress."""
+    return [node for node in _get_workflow().get_graph().nodes if node not in (START, END)]
+
+
+@lru_cache(maxsize=1)
+def graph_edges() -> list[tuple[str, str]]:
+    """(source, target) pairs of the compiled workflow, for critical-path analysis."""
+    return [(edge.source, edge.target) for edge in _get_workflow().get_graph().edges]
+
+
+def run_nodes(sections: Optional[Iterable[str]] = None) -> list[str]:
+    """Nodes a run requesting ``sections`` (default: all) executes, in graph order."""
+    required = _required_nodes(sections, os.getenv("BRANCH3_MODE", "separate"))
+    return [node for node in node_names() if node in required]
+
+
+def warm_up() -> None:
+    """
+    Do the work a cold process would otherwise do during its first run:
+    import LangChain/LangGraph, compile the workflow, open the checkpointer,
+    build every node's LLM client and load their tokenizers. Blocking; the
+    API runs it in a thread at startup.
+    """
+    from llm import _get_llm
+    from tokens import _get_encoding
+
+    started = time.perf_counter()
+    _get_workflow()
+    graph_edges()
+    for node in node_names():
+        _get_encoding(_get_llm(node).model_name)
+    logger.info("workflow warmed up in %.2fs", time.perf_counter() - started)
+
+
+def run_config(run_id: Optional[str] = None) -> dict:
+    """
+    Invocation config identifying one run. The run id is the checkpointer's
+    thread id; a fresh one is generated when ``run_id`` is not given.
+    """
+    return {"configurable": {"thread_id": run_id or uuid.uuid4().hex}}
+
+
+async def reset_run(run_id: str) -> None:
+    """
+    Drop any checkpoints stored under ``run_id``, so that a new run with that
+    id starts from its own input instead of continuing the earlier thread.
+    """
+    workflow = await aget_workflow()
+    if workflow.checkpointer is None:
+        return
+    # Reading the state first also opens the SQLite saver's connection, which
+    # adelete_thread does not do by itself.
+    snapshot = await workflow.aget_state(run_config(run_id))
+    if snapshot.created_at is not None:
+        await workflow.checkpointer.adelete_thread(run_id)
+
+
+async def arun(state: dict, run_id: Optional[str] = None) -> dict:
+    """
+    Run the workflow on ``state`` as run ``run_id`` and return the final state.
+    An earlier run with the same id is replaced, not continued (see
+    ``resume_run`` for that).
+    """
+    workflow = await aget_workflow()
+    config = run_config(run_id)
+    if run_id is not None:
+        await reset_run(run_id)
+    await start_run(config["configurable"]["thread_id"])
+    result = await workflow.ainvoke(state, config)
+    await finish_run(config["configurable"]["thread_id"])
+    return result
+
+
+async def pending_nodes(run_id: str) -> tuple[str, ...]:
+    """
+    Nodes a checkpointed run still has to execute; empty when the run is
+    unknown, finished, or checkpointing is disabled.
+    """
+    workflow = await aget_workflow()
+    if workflow.checkpointer is None:
+        return ()
+    snapshot = await workflow.aget_state(run_config(run_id))
+    return snapshot.next
+
+
+async def resume_run(run_id: str) -> dict:
+    """
+    Continue an interrupted run from its last checkpoint, re-executing only
+    the nodes that had not completed. Raises LookupError if there is nothing
+    to resume.
+    """
+    if not await pending_nodes(run_id):
+        raise LookupError(f"no resumable run {run_id}")
+    workflow = await aget_workflow()
+    await start_run(run_id)
+    result = await workflow.ainvoke(None, run_config(run_id))
+    await finish_run(run_id)
+    return result
+
+
+# Completed runs kept by the in-memory checkpointer, oldest first. The SQLite
+# checkpointer records them in its own database instead (_KEPT_RUNS_TABLE),
+# so the limit holds across restarts and worker processes.
+_kept_runs: "OrderedDict[str, None]" = OrderedDict()
+_KEPT_RUNS_TABLE = "ects_completed_runs"
+
+
+async def _keep_run(checkpointer: "BaseCheckpointSaver", run_id: str, limit: int) -> list[str]:
+    """Record ``run_id`` as kept; returns the runs beyond the newest ``limit``."""
+    conn = getattr(checkpointer, "conn", None)
+    if conn is None:
+        _kept_runs.pop(run_id, None)
+        _kept_runs[run_id] = None
+        expired = list(_kept_runs)[: max(len(_kept_runs) - limit, 0)] if limit else []
+        for expired_id in expired:
+            del _kept_runs[expired_id]
+        return expired
+
+    async with checkpointer.lock:
+        await conn.execute(
+            f"CREATE TABLE IF NOT EXISTS {_KEPT_RUNS_TABLE} ("
+            " thread_id TEXT PRIMARY KEY,"
+            " finished REAL NOT NULL)"
+        )
+        await conn.execute(
+            f"INSERT OR REPLACE INTO {_KEPT_RUNS_TABLE} (thread_id, finished) VALUES (?, ?)",
+            (run_id, time.time()),
+        )
+        expired = []
+        if limit:
+            async with conn.execute(
+                f"SELECT thread_id FROM {_KEPT_RUNS_TABLE}"
+                " ORDER BY finished DESC LIMIT -1 OFFSET ?",
+                (limit,),
+            ) as cursor:
+                expired = [row[0] for row in await cursor.fetchall()]
+            await conn.executemany(
+                f"DELETE FROM {_KEPT_RUNS_TABLE} WHERE thread_id = ?",
+                [(expired_id,) for expired_id in expired],
+            )
+        await conn.commit()
+    return expired
+
+
+# Runs started but not finished, with the time each last started or resumed,
+# oldest first. As with kept runs, the SQLite checkpointer records them in its
+# own database instead (_OPEN_RUNS_TABLE).
+_open_runs: "OrderedDict[str, float]" = OrderedDict()
+_OPEN_RUNS_TABLE = "ects_open_runs"
+_CREATE_OPEN_RUNS = (
+    f"CREATE TABLE IF NOT EXISTS {_OPEN_RUNS_TABLE} ("
+    " thread_id TEXT PRIMARY KEY,"
+    " started REAL NOT NULL)"
+)
+
+
+async def _open_run(checkpointer: "BaseCheckpointSaver", run_id: str, ttl: float) -> list[str]:
+    """Record ``run_id`` as open; returns the open runs started over ``ttl`` seconds ago."""
+    now = time.time()
+    conn = getattr(checkpointer, "conn", None)
+    if conn is None:
+        _open_runs.pop(run_id, None)
+        _open_runs[run_id] = now
+        expired = []
+        for open_id, started in _open_runs.items():
+            if started >= now - ttl:
+                break
+            expired.append(open_id)
+        for expired_id in expired:
+            del _open_runs[expired_id]
+        return expired
+
+    # The run may be the first use of the saver in this process.
+    await checkpointer.setup()
+    async with checkpointer.lock:
+        await conn.execute(_CREATE_OPEN_RUNS)
+        await conn.execute(
+            f"CREATE INDEX IF NOT EXISTS {_OPEN_RUNS_TABLE}_started"
+            f" ON {_OPEN_RUNS_TABLE} (started)"
+        )
+        await conn.execute(
+            f"INSERT OR REPLACE INTO {_OPEN_RUNS_TABLE} (thread_id, started) VALUES (?, ?)",
+            (run_id, now),
+        )
+        async with conn.execute(
+            f"SELECT thread_id FROM {_OPEN_RUNS_TABLE} WHERE started < ?", (now - ttl,)
+        ) as cursor:
+            expired = [row[0] for row in await cursor.fetchall()]
+        await conn.execute(f"DELETE FROM {_OPEN_RUNS_TABLE} WHERE started < ?", (now - ttl,))
+        await conn.commit()
+    return expired
+
+
+async def _close_run(checkpointer: "BaseCheckpointSaver", run_id: str) -> None:
+    conn = getattr(checkpointer, "conn", None)
+    if conn is None:
+        _open_runs.pop(run_id, None)
+        return
+    async with checkpointer.lock:
+        await conn.execute(_CREATE_OPEN_RUNS)
+        await conn.execute(f"DELETE FROM {_OPEN_RUNS_TABLE} WHERE thread_id = ?", (run_id,))
+        await conn.commit()
+
+
+async def start_run(run_id: str) -> None:
+    """
+    Record ``run_id`` as started (or resumed) now, and delete the checkpoints
+    of open runs that started more than CHECKPOINT_INCOMPLETE_TTL seconds ago.
+    Called before the workflow is invoked; ``finish_run`` closes the run.
+    """
+    workflow = await aget_workflow()
+    checkpointer = workflow.checkpointer
+    ttl = float(os.getenv("CHECKPOINT_INCOMPLETE_TTL", "86400"))
+    if checkpointer is None or not ttl:
+        return
+    for expired_id in await _open_run(checkpointer, run_id, ttl):
+        await checkpointer.adelete_thread(expired_id)
+
+
+async def finish_run(run_id: str) -> None:
+    """
+    Close a successful run (see ``start_run``) and drop its checkpoints unless
+    CHECKPOINT_KEEP_COMPLETED=1, in which case the oldest kept runs beyond
+    CHECKPOINT_KEEP_MAX_RUNS are dropped.
+    """
+    workflow = await aget_workflow()
+    checkpointer = workflow.checkpointer
+    if checkpointer is None:
+        return
+    await _close_run(checkpointer, run_id)
+    if os.getenv("CHECKPOINT_KEEP_COMPLETED", "0") != "1":
+        await checkpointer.adelete_thread(run_id)
+        return
+    limit = int(os.getenv("CHECKPOINT_KEEP_MAX_RUNS", "1000"))
+    for expired_id in await _keep_run(checkpointer, run_id, limit):
+        await checkpointer.adelete_thread(expired_id)
+
+
+def dirty_nodes(changed: Iterable[str]) -> list[str]:
+    """
+    Nodes to re-execute when the state fields in ``changed`` have new values:
+    the nodes reading them and all of their descendants, in graph order.
+    """
+    from nodes import NODE_INPUTS
+
+    # json_parser is not in NODE_INPUTS: it derives transcript_sections from
+    # the transcript.
+    reads = {**NODE_INPUTS, "json_parser": ("transcript",)}
+    changed = set(changed)
+    dirty = {node for node in node_names() if changed.intersection(reads.get(node, ()))}
+    children: dict[str, list[str]] = {}
+    for source, target in graph_edges():
+        children.setdefault(source, []).append(target)
+    stack = list(dirty)
+    while stack:
+        for child in children.get(stack.pop(), ()):
+            if child != END and child not in dirty:
+                dirty.add(child)
+                stack.append(child)
+    return [node for node in node_names() if node in dirty]
+
+
+@lru_cache(maxsize=None)
+def _subgraph(nodes: frozenset[str]) -> "CompiledStateGraph":
+    """
+    The compiled workflow restricted to ``nodes``. A node whose predecessors
+    are all outside the subgraph starts it; their outputs are already in the
+    input state. Conditional edges become plain edges to the targets in
+    ``nodes``, which the caller has already limited to the run's sections.
+    """
+    from langgraph.graph import StateGraph
+
+    from state import GraphState
+
+    workflow = _get_workflow()
+    builder = StateGraph(GraphState)
+    for node in nodes:
+        spec = workflow.builder.nodes[node]
+        builder.add_node(node, spec.runnable, defer=spec.defer)
+    predecessors: dict[str, list[str]] = {}
+    edges = set(workflow.builder.edges) | {
+        (source, target)
+        for source, branches in workflow.builder.branches.items()
+        for branch in branches.values()
+        for target in branch.ends.values()
+    }
+    for source, target in edges:
+        if target == END and source in nodes:
+            builder.add_edge(source, END)
+        elif target in nodes:
+            predecessors.setdefault(target, []).append(source)
+    for target, sources in predecessors.items():
+        for source in [source for source in sources if source in nodes] or [START]:
+            builder.add_edge(source, target)
+    for sources, target in workflow.builder.waiting_edges:
+        if target in nodes:
+            inside = [source for source in sources if source in nodes]
+            builder.add_edge(inside or START, target)
     return builder.compile()
 
 
-# Module-level compiled workflow, ready for import by app.py
-workflow = build_graph()
+async def rerun(run_id: str, changes: dict, new_run_id: Optional[str] = None) -> dict:
+    """
+    Re-execute finished run ``run_id`` with the input fields in ``changes``
+    replaced, running only the nodes that depend on them. Returns the new
+    run's final state, whose trace covers the re-executed nodes only and
+    whose report sections are those of ``run_id``; it is
+    stored as run ``new_run_id`` (subject to CHECKPOINT_KEEP_COMPLETED), so it
+    can be re-run in turn. Raises LookupError if ``run_id`` has no kept final
+    state.
+    """
+    unknown = set(changes) - set(INPUT_FIELDS)
+    if unknown:
+        raise ValueError(f"only input fields can be changed, got {sorted(unknown)}")
+    workflow = await aget_workflow()
+    snapshot = None
+    if workflow.checkpointer is not None:
+        snapshot = await workflow.aget_state(run_config(run_id))
+    if snapshot is None or "final_response" not in snapshot.values or snapshot.next:
+        raise LookupError(
+            f"no completed run {run_id} (requires CHECKPOINTER and CHECKPOINT_KEEP_COMPLETED=1;"
+            " runs beyond CHECKPOINT_KEEP_MAX_RUNS are deleted)"
+        )
+
+    previous = snapshot.values
+    changed = [field for field, value in changes.items() if text(previous.get(field)) != value]
+    state = {**previous, **changes, "node_timings": [], "llm_usage": []}
+    required = set(run_nodes(previous.get("sections")))
+    nodes = [node for node in dirty_nodes(changed) if node in required]
+    if nodes:
+        state = await _subgraph(frozenset(nodes)).ainvoke(state)
+
+    config = run_config(new_run_id)
+    # Store the result as a finished run of the full workflow, replacing any
+    # earlier run with the same id.
+    await reset_run(config["configurable"]["thread_id"])
+    await workflow.aupdate_state(config, state, as_node="wrapper")
+    await finish_run(config["configurable"]["thread_id"])
+    return state
+
+
+async def aclose_checkpointer() -> None:
+    """Close the SQLite checkpointer's connection, if one is in use."""
+    if not _build_workflow.cache_info().currsize:
+        return
+    workflow = await aget_workflow()
+    conn = getattr(workflow.checkpointer, "conn", None)
+    if conn is not None:
+        await conn.close()
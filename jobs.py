@@ -0,0 +1,317 @@
+"""
+Asynchronous job mode for the workflow, backed by a local SQLite store.
+
+``POST /jobs`` stores the payload and returns a job id straight away; a pool
+of worker tasks executes the workflow for queued jobs and records per-node
+progress and the final ``wrapper`` output in the store. Jobs are keyed by a
+hash of their payload, so submitting an identical payload returns the existing
+job instead of running the workflow again (a failed job is re-queued). Jobs
+that were queued or running when the process stopped are picked up again at
+the next start.
+
+Several worker processes can share one store: submission is an atomic
+insert, a worker claims a queued job before executing it, and at startup only
+jobs left running by processes that no longer exist are re-queued. A claim
+records the claiming process as "<pid>:<boot id>", with a boot id drawn once
+per process, so a restarted server that gets its predecessor's PID (PID 1 in
+a container, say) still recognises that predecessor's jobs as orphaned. A
+runner that is stopped re-queues the jobs it was executing.
+
+The job id doubles as the run id, so with a checkpointer configured (see
+graph.py) a re-queued or interrupted job resumes from its last checkpoint and
+only re-executes the nodes that had not completed.
+
+Configuration is read from the .env file:
+    JOBS_DB_PATH     – SQLite file holding jobs (default "jobs.db").
+    JOBS_CONCURRENCY – jobs executed at once by the worker pool (default 4).
+"""
+
+import asyncio
+import hashlib
+import json
+import logging
+import os
+import sqlite3
+import threading
+import time
+import uuid
+from typing import Optional
+
+from graph import (
+    aget_workflow,
+    finish_run,
+    pending_nodes,
+    reset_run,
+    run_config,
+    run_nodes,
+    start_run,
+)
+
+logger = logging.getLogger(__name__)
+
+QUEUED = "queued"
+RUNNING = "running"
+SUCCEEDED = "succeeded"
+FAILED = "failed"
+
+
+def payload_hash(payload: dict) -> str:
+    return hashlib.sha256(json.dumps(payload, sort_keys=True).encode("utf-8")).hexdigest()
+
+
+_boot: tuple[int, str] = (0, "")
+
+
+def owner_token() -> str:
+    """This process's owner id for claimed jobs: its PID and a per-process boot id."""
+    global _boot
+    # Drawn per PID, so a forked child does not inherit its parent's token.
+    if _boot[0] != os.getpid():
+        _boot = (os.getpid(), uuid.uuid4().hex)
+    return f"{_boot[0]}:{_boot[1]}"
+
+
+def _owner_alive(owner: str) -> bool:
+    """Whether the process that wrote ``owner`` (a token, or a bare PID) still runs."""
+    pid = int(str(owner).partition(":")[0])
+    if pid == os.getpid():
+        # Our own PID: either this process, or a predecessor that had it.
+        return str(owner) == owner_token()
+    return _process_alive(pid)
+
+
+def _process_alive(pid: int) -> bool:
+    try:
+        os.kill(pid, 0)
+    except ProcessLookupError:
+        return False
+    except PermissionError:
+        return True
+    return True
+
+
+class JobStore:
+    """SQLite persistence for jobs, their progress and results."""
+
+    def __init__(self, path: str) -> None:
+        self._db = sqlite3.connect(path, timeout=30, check_same_thread=False)
+        self._db.row_factory = sqlite3.Row
+        self._lock = threading.Lock()
+        with self._lock:
+            self._db.execute("PRAGMA journal_mode=WAL")
+            self._db.execute(
+                "CREATE TABLE IF NOT EXISTS jobs ("
+                " id TEXT PRIMARY KEY,"
+                " payload_hash TEXT UNIQUE NOT NULL,"
+                " payload TEXT NOT NULL,"
+                " status TEXT NOT NULL,"
+                " completed_nodes TEXT NOT NULL DEFAULT '[]',"
+                " result TEXT,"
+                " error TEXT,"
+                " created REAL NOT NULL,"
+                " updated REAL NOT NULL,"
+                " owner TEXT)"
+            )
+            columns = {row["name"] for row in self._db.execute("PRAGMA table_info(jobs)")}
+            if "owner" not in columns:
+                self._db.execute("ALTER TABLE jobs ADD COLUMN owner TEXT")
+            self._db.commit()
+
+    def _update(self, job_id: str, only_if_status: Optional[str] = None, **fields) -> bool:
+        """Update ``job_id``'s fields; with ``only_if_status``, only from that status."""
+        fields["updated"] = time.time()
+        assignments = ", ".join(f"{name} = ?" for name in fields)
+        query = f"UPDATE jobs SET {assignments} WHERE id = ?"
+        params = (*fields.values(), job_id)
+        if only_if_status is not None:
+            query += " AND status = ?"
+            params += (only_if_status,)
+        with self._lock:
+            updated = self._db.execute(query, params).rowcount
+            self._db.commit()
+        return updated == 1
+
+    def submit(self, payload: dict) -> tuple[str, bool]:
+        """
+        Store ``payload`` as a queued job. Returns ``(job_id, enqueue)``, where
+        ``enqueue`` is False when an identical payload is already queued,
+        running or done.
+        """
+        digest = payload_hash(payload)
+        now = time.time()
+        job_id = uuid.uuid4().hex
+        with self._lock:
+            # INSERT OR IGNORE keeps concurrent submissions from several
+            # processes down to one job per payload.
+            inserted = self._db.execute(
+                "INSERT OR IGNORE INTO jobs (id, payload_hash, payload, status, created, updated)"
+                " VALUES (?, ?, ?, ?, ?, ?)",
+                (job_id, digest, json.dumps(payload), QUEUED, now, now),
+            ).rowcount
+            self._db.commit()
+            if inserted:
+                return job_id, True
+            row = self._db.execute(
+                "SELECT id, status FROM jobs WHERE payload_hash = ?", (digest,)
+            ).fetchone()
+        if row["status"] != FAILED:
+            return row["id"], False
+        requeued = self._update(
+            row["id"], only_if_status=FAILED, status=QUEUED, result=None, error=None
+        )
+        return row["id"], requeued
+
+    def get(self, job_id: str) -> Optional[dict]:
+        """Return the job's public view, or None if it does not exist."""
+        with self._lock:
+            row = self._db.execute("SELECT * FROM jobs WHERE id = ?", (job_id,)).fetchone()
+        if row is None:
+            return None
+        completed = json.loads(row["completed_nodes"])
+        sections = json.loads(row["payload"]).get("sections")
+        return {
+            "id": row["id"],
+            "status": row["status"],
+            "progress": {
+                "completed_nodes": completed,
+                "completed": len(completed),
+                "total": len(run_nodes(sections)),
+            },
+            "result": json.loads(row["result"]) if row["result"] else None,
+            "error": row["error"],
+            "created": row["created"],
+            "updated": row["updated"],
+        }
+
+    def payload(self, job_id: str) -> dict:
+        with self._lock:
+            row = self._db.execute("SELECT payload FROM jobs WHERE id = ?", (job_id,)).fetchone()
+        return json.loads(row["payload"])
+
+    def requeue_orphans(self) -> list[str]:
+        """Re-queue running jobs whose owning process no longer exists; returns their ids."""
+        with self._lock:
+            rows = self._db.execute(
+                "SELECT id, owner FROM jobs WHERE status = ?", (RUNNING,)
+            ).fetchall()
+        return [
+            row["id"]
+            for row in rows
+            if (row["owner"] is None or not _owner_alive(row["owner"]))
+            and self._update(row["id"], only_if_status=RUNNING, status=QUEUED, owner=None)
+        ]
+
+    def release(self) -> list[str]:
+        """Re-queue the running jobs claimed by this process; returns their ids."""
+        with self._lock:
+            rows = self._db.execute(
+                "SELECT id FROM jobs WHERE status = ? AND owner = ?", (RUNNING, owner_token())
+            ).fetchall()
+        return [
+            row["id"]
+            for row in rows
+            if self._update(row["id"], only_if_status=RUNNING, status=QUEUED, owner=None)
+        ]
+
+    def queued(self) -> list[str]:
+        """Ids of queued jobs, oldest first."""
+        with self._lock:
+            rows = self._db.execute(
+                "SELECT id FROM jobs WHERE status = ? ORDER BY created", (QUEUED,)
+            ).fetchall()
+        return [row["id"] for row in rows]
+
+    def claim(self, job_id: str, completed_nodes: list[str]) -> bool:
+        """
+        Mark a queued job as running in this process. Returns False if it is
+        not queued, e.g. because another worker claimed it first.
+        """
+        return self._update(
+            job_id,
+            only_if_status=QUEUED,
+            status=RUNNING,
+            owner=owner_token(),
+            completed_nodes=json.dumps(completed_nodes),
+        )
+
+    def set_progress(self, job_id: str, completed_nodes: list[str]) -> None:
+        self._update(job_id, completed_nodes=json.dumps(completed_nodes))
+
+    def mark_succeeded(self, job_id: str, result: dict) -> None:
+        self._update(job_id, status=SUCCEEDED, result=json.dumps(result))
+
+    def mark_failed(self, job_id: str, error: str) -> None:
+        self._update(job_id, status=FAILED, error=error)
+
+    def close(self) -> None:
+        with self._lock:
+            self._db.close()
+
+
+class JobRunner:
+    """A fixed pool of asyncio workers draining the job queue."""
+
+    def __init__(self, store: JobStore, concurrency: int) -> None:
+        self.store = store
+        self.concurrency = concurrency
+        self._queue: asyncio.Queue[str] = asyncio.Queue()
+        self._workers: list[asyncio.Task] = []
+
+    async def start(self) -> None:
+        self.store.requeue_orphans()
+        for job_id in self.store.queued():
+            self._queue.put_nowait(job_id)
+        self._workers = [asyncio.create_task(self._work()) for _ in range(self.concurrency)]
+
+    async def stop(self) -> None:
+        """Cancel the workers and re-queue the jobs they were executing."""
+        for worker in self._workers:
+            worker.cancel()
+        await asyncio.gather(*self._workers, return_exceptions=True)
+        self._workers = []
+        # Their checkpoints are kept, so the next start resumes them.
+        self.store.release()
+
+    def submit(self, payload: dict) -> str:
+        """Store ``payload`` and queue it unless an identical job exists."""
+        job_id, enqueue = self.store.submit(payload)
+        if enqueue:
+            self._queue.put_nowait(job_id)
+        return job_id
+
+    async def _work(self) -> None:
+        while True:
+            job_id = await self._queue.get()
+            try:
+                await self._run(job_id)
+            finally:
+                self._queue.task_done()
+
+    async def _run(self, job_id: str) -> None:
+        try:
+            if await pending_nodes(job_id):
+                # Resume from the checkpoint: completed nodes are not re-executed.
+                state = None
+                completed = self.store.get(job_id)["progress"]["completed_nodes"]
+            else:
+                state = self.store.payload(job_id)
+                completed = []
+            if not self.store.claim(job_id, completed):
+                return
+            if state is not None:
+                # Nothing to resume: start clean rather than on top of an
+                # earlier attempt's checkpoints.
+                await reset_run(job_id)
+            await start_run(job_id)
+            workflow = await aget_workflow()
+            updates = workflow.astream(state, run_config(job_id), stream_mode="updates")
+            async for update in updates:
+                for node, values in update.items():
+                    completed.append(node)
+                    if node == "wrapper":
+                        self.store.mark_succeeded(job_id, values["final_response"])
+                self.store.set_progress(job_id, completed)
+            await finish_run(job_id)
+        except Exception as exc:
+            logger.exception("job %s failed", job_id)
+            self.store.mark_failed(job_id, str(exc))
@@ -1,20 +1,123 @@
 import os
+from functools import lru_cache
+from typing import TYPE_CHECKING, Optional
 
+import httpx
 from dotenv import load_dotenv
-from langchain_openai import ChatOpenAI
+
+from config import MODEL_ROUTES
+from replay import wrap_transport
+
+if TYPE_CHECKING:
+    # langchain_openai is imported on first use, not at import time, to keep
+    # API startup fast (see graph.warm_up).
+    from langchain_openai import ChatOpenAI
 
 load_dotenv()
 
 
-def _get_llm() -> ChatOpenAI:
+def _http_limits() -> httpx.Limits:
     """
-    Instantiate and return the shared LLM client.
+    Connection-pool limits of the shared HTTP client.
 
     Configuration is read from the .env file:
-        OPENAI_API_KEY  – API key for the LLM provider.
-        OPENAI_API_BASE – Base URL for the LLM provider endpoint.
+        LLM_MAX_CONNECTIONS           – maximum concurrent connections (default 200).
+        LLM_MAX_KEEPALIVE_CONNECTIONS – idle connections kept open (default 50).
+        LLM_KEEPALIVE_EXPIRY          – seconds an idle connection is kept (default 30).
+    """
+    return httpx.Limits(
+        max_connections=int(os.getenv("LLM_MAX_CONNECTIONS", "200")),
+        max_keepalive_connections=int(os.getenv("LLM_MAX_KEEPALIVE_CONNECTIONS", "50")),
+        keepalive_expiry=float(os.getenv("LLM_KEEPALIVE_EXPIRY", "30")),
+    )
+
+
+@lru_cache(maxsize=1)
+def _get_http_client() -> httpx.AsyncClient:
     """
+    The pooled async HTTP client shared by every LLM client. Its transport
+    records or replays upstream traffic when LLM_RECORD_MODE is set (see
+    replay.py). Nodes call the LLM through the async API only, so no sync
+    client is configured.
+    """
+    transport = wrap_transport(httpx.AsyncHTTPTransport(limits=_http_limits()))
+    return httpx.AsyncClient(transport=transport)
+
+
+# Settings a MODEL_ROUTES entry may override, in _build_llm argument order.
+_ROUTE_KEYS: tuple[str, ...] = ("model", "max_tokens", "temperature", "base_url")
+
+
+@lru_cache(maxsize=None)
+def _build_llm(
+    model: Optional[str],
+    max_tokens: Optional[int],
+    temperature: Optional[float],
+    base_url: Optional[str],
+) -> "ChatOpenAI":
+    """Build the client for one distinct model configuration; memoized."""
+    from langchain_openai import ChatOpenAI
+
+    overrides: dict = {}
+    if model is not None:
+        overrides["model"] = model
+    if max_tokens is not None:
+        overrides["max_tokens"] = max_tokens
+    if temperature is not None:
+        overrides["temperature"] = temperature
     return ChatOpenAI(
         api_key=os.getenv("OPENAI_API_KEY"),
-        base_url=os.getenv("OPENAI_API_BASE"),
+        base_url=base_url or os.getenv("OPENAI_API_BASE"),
+        stream_usage=True,
+        max_retries=0,
+        http_async_client=_get_http_client(),
+        **overrides,
     )
+
+
+def _get_llm(node: Optional[str] = None) -> "ChatOpenAI":
+    """
+    Return the LLM client for ``node``, building it on first use.
+
+    The node's entry in config.MODEL_ROUTES (model, max_tokens, temperature,
+    base_url) is applied on top of the defaults; nodes without an entry, and
+    calls without a node, get the default client. One client is built per
+    distinct configuration and reused, and all of them share one pooled HTTP
+    connection set, so concurrent runs reuse keep-alive connections instead
+    of opening a new client per call. The client's own retries are disabled;
+    retries follow each node's call policy (see resilience.py).
+
+    Configuration is read from the .env file:
+        OPENAI_API_KEY  – API key for the LLM provider.
+        OPENAI_API_BASE – Base URL for the LLM provider endpoint.
+    """
+    route = MODEL_ROUTES.get(node, {}) if node else {}
+    unknown = set(route) - set(_ROUTE_KEYS)
+    if unknown:
+        raise ValueError(f"unknown MODEL_ROUTES settings for {node}: {sorted(unknown)}")
+    return _build_llm(*(route.get(key) for key in _ROUTE_KEYS))
+
+
+async def aclose_llm() -> None:
+    """Close the shared connection pool, if any client was built."""
+    if _get_http_client.cache_info().currsize:
+        await _get_http_client().aclose()
+        _get_http_client.cache_clear()
+        _build_llm.cache_clear()
+
+
+def _model_config(llm: "ChatOpenAI") -> dict:
+    """
+    Return the generation-relevant settings of ``llm``.
+
+    Used as part of response-cache keys, so two clients that would produce
+    different outputs for the same messages never share cache entries.
+    """
+    return {
+        "model": llm.model_name,
+        "base_url": llm.openai_api_base,
+        "temperature": llm.temperature,
+        "max_tokens": llm.max_tokens,
+        "top_p": llm.top_p,
+        "model_kwargs": llm.model_kwargs,
+    }
@@ -0,0 +1,328 @@
+"""
+Per-node latency, token and cost instrumentation.
+
+Every graph node is registered through ``instrument()``, which times the
+node, collects the records of the LLM calls it makes (see
+``record_llm_call``), and appends both to the run trace in GraphState:
+
+    node_timings – one record per node execution (start/end/duration plus
+                   the summed queueing time, tokens and cost of its calls, and
+                   the prompt tokens removed to fit its token budget).
+    llm_usage    – one record per LLM call, including the prompt size counted
+                   locally before sending (see tokens.py).
+
+The same observations feed the Prometheus metrics served at GET /metrics
+(aggregated over every worker process when PROMETHEUS_MULTIPROC_DIR is set,
+see app.py),
+and ``run_breakdown()`` turns a finished run's trace into the per-run timing
+breakdown (including the critical path) that /run can attach to its response.
+"""
+
+import functools
+import os
+import time
+from contextvars import ContextVar
+from typing import Any, Awaitable, Callable, Iterable, Optional
+
+from prometheus_client import REGISTRY, CollectorRegistry, Counter, Histogram, generate_latest
+from prometheus_client.core import CounterMetricFamily, GaugeMetricFamily
+
+from cache import _get_cache
+from config import MODEL_PRICES
+
+_LATENCY_BUCKETS = (0.05, 0.1, 0.25, 0.5, 1, 2.5, 5, 10, 20, 30, 60, 120, 300)
+
+NODE_DURATION = Histogram(
+    "ects_node_duration_seconds",
+    "Wall time of one graph node execution.",
+    ["node"],
+    buckets=_LATENCY_BUCKETS,
+)
+NODE_QUEUE = Histogram(
+    "ects_node_queue_seconds",
+    "Time a node's LLM calls spent waiting for the rate limiter and concurrency slots.",
+    ["node"],
+    buckets=_LATENCY_BUCKETS,
+)
+LLM_CALL_DURATION = Histogram(
+    "ects_llm_call_duration_seconds",
+    "Upstream latency of one LLM call, excluding queueing.",
+    ["node", "model"],
+    buckets=_LATENCY_BUCKETS,
+)
+LLM_CALLS = Counter(
+    "ects_llm_calls_total",
+    "LLM calls made by nodes, by response-cache outcome (or coalesced).",
+    ["node", "response_cache"],
+)
+LLM_TOKENS = Counter(
+    "ects_llm_tokens_total",
+    "Tokens sent to and received from the LLM provider.",
+    ["node", "model", "kind"],
+)
+LLM_COST = Counter(
+    "ects_llm_cost_usd_total",
+    "Estimated LLM spend in USD, from config.MODEL_PRICES.",
+    ["node", "model"],
+)
+LLM_RETRIES = Counter(
+    "ects_llm_retries_total",
+    "LLM call attempts retried under the node's call policy, by failure kind.",
+    ["node", "reason"],
+)
+LLM_HEDGES = Counter(
+    "ects_llm_hedges_total",
+    "Duplicate (hedged) LLM requests fired after a slow response.",
+    ["node"],
+)
+LLM_HEDGE_WINS = Counter(
+    "ects_llm_hedge_wins_total",
+    "Hedged LLM requests that answered before the original request.",
+    ["node"],
+)
+PROMPT_TRIMMED_TOKENS = Counter(
+    "ects_prompt_trimmed_tokens_total",
+    "Prompt tokens cut from node inputs to fit the node's token budget.",
+    ["node", "section"],
+)
+COALESCED = Counter(
+    "ects_coalesced_total",
+    "Runs and LLM calls that joined an identical one already in flight (singleflight.py).",
+    ["scope"],
+)
+NODE_ERRORS = Counter(
+    "ects_node_errors_total",
+    "Graph node executions that raised.",
+    ["node"],
+)
+
+# LLM call and prompt-trim records of the node currently executing; set by
+# instrument().
+_call_records: ContextVar[Optional[list[dict]]] = ContextVar("_call_records", default=None)
+_trim_records: ContextVar[Optional[list[dict]]] = ContextVar("_trim_records", default=None)
+
+
+class _ResponseCacheCollector:
+    """Exports the response cache's own counters at scrape time."""
+
+    def collect(self):
+        cache = _get_cache()
+        if cache is None:
+            return
+        stats = cache.stats()
+        hits = CounterMetricFamily(
+            "ects_response_cache_hits", "Response cache hits by tier.", labels=["tier"]
+        )
+        hits.add_metric(["memory"], stats["memory_hits"])
+        hits.add_metric(["disk"], stats["disk_hits"])
+        hits.add_metric(["shared"], stats["shared_hits"])
+        yield hits
+        yield CounterMetricFamily(
+            "ects_response_cache_misses", "Response cache misses.", value=stats["misses"]
+        )
+        yield CounterMetricFamily(
+            "ects_response_cache_evictions", "Response cache evictions.", value=stats["evictions"]
+        )
+        yield GaugeMetricFamily(
+            "ects_response_cache_memory_entries",
+            "Entries held in the in-memory cache tier.",
+            value=stats["memory_entries"],
+        )
+
+
+REGISTRY.register(_ResponseCacheCollector())
+
+
+def exposition() -> bytes:
+    """
+    Prometheus text exposition for GET /metrics. In multi-worker mode the
+    counters and histograms are summed over every worker's files in
+    PROMETHEUS_MULTIPROC_DIR. The ects_response_cache_* families are left out
+    there: they read one process's in-memory counters, so whichever worker
+    answered the scrape would report only its own share. Cache outcomes summed
+    over workers remain available as ects_llm_calls_total{response_cache}.
+    """
+    if not os.getenv("PROMETHEUS_MULTIPROC_DIR"):
+        return generate_latest()
+    from prometheus_client import multiprocess
+
+    registry = CollectorRegistry()
+    multiprocess.MultiProcessCollector(registry)
+    return generate_latest(registry)
+
+
+def estimate_cost(model: str, input_tokens: int, cached_input_tokens: int, output_tokens: int) -> float:
+    """Estimated USD cost of one call; 0.0 for models missing from MODEL_PRICES."""
+    prices = MODEL_PRICES.get(model)
+    if prices is None:
+        return 0.0
+    uncached = max(input_tokens - cached_input_tokens, 0)
+    return (
+        uncached * prices["input"]
+        + cached_input_tokens * prices.get("cached_input", prices["input"])
+        + output_tokens * prices["output"]
+    ) / 1_000_000
+
+
+def record_llm_call(
+    node: str,
+    model: str,
+    response: Any = None,
+    queue_seconds: float = 0.0,
+    llm_seconds: float = 0.0,
+    prompt_tokens: int = 0,
+    coalesced: bool = False,
+) -> dict:
+    """
+    Record one LLM call made by ``node``; ``response`` is None for a response
+    cache hit, or with ``coalesced`` for a call that shared an identical call
+    made by another run; ``prompt_tokens`` is the locally counted prompt size.
+    The record is added to the executing node's ``llm_usage`` trace and to the
+    Prometheus metrics, and returned.
+    """
+    usage = getattr(response, "usage_metadata", None) or {}
+    input_tokens = usage.get("input_tokens", 0)
+    cached_input_tokens = usage.get("input_token_details", {}).get("cache_read", 0)
+    output_tokens = usage.get("output_tokens", 0)
+    record = {
+        "node": node,
+        "model": model,
+        "response_cache_hit": response is None and not coalesced,
+        "coalesced": coalesced,
+        "queue_seconds": queue_seconds,
+        "llm_seconds": llm_seconds,
+        "prompt_tokens": prompt_tokens,
+        "input_tokens": input_tokens,
+        "cached_input_tokens": cached_input_tokens,
+        "output_tokens": output_tokens,
+        "cost_usd": estimate_cost(model, input_tokens, cached_input_tokens, output_tokens),
+    }
+
+    outcome = "coalesced" if coalesced else "hit" if response is None else "miss"
+    LLM_CALLS.labels(node, outcome).inc()
+    if response is not None:
+        LLM_CALL_DURATION.labels(node, model).observe(llm_seconds)
+        LLM_TOKENS.labels(node, model, "input").inc(input_tokens)
+        LLM_TOKENS.labels(node, model, "cached_input").inc(cached_input_tokens)
+        LLM_TOKENS.labels(node, model, "output").inc(output_tokens)
+        LLM_COST.labels(node, model).inc(record["cost_usd"])
+
+    records = _call_records.get()
+    if records is not None:
+        records.append(record)
+    return record
+
+
+def record_trim(node: str, section: str, tokens: int) -> None:
+    """Record ``tokens`` cut from ``node``'s ``section`` to fit its token budget."""
+    PROMPT_TRIMMED_TOKENS.labels(node, section).inc(tokens)
+    records = _trim_records.get()
+    if records is not None:
+        records.append({"section": section, "tokens": tokens})
+
+
+def instrument(node: str, node_fn: Callable[[dict], Awaitable[dict]]):
+    """
+    Wrap a graph node so each execution is timed and its update carries the
+    ``node_timings`` and ``llm_usage`` trace records.
+    """
+
+    @functools.wraps(node_fn)
+    async def wrapper(state: dict) -> dict:
+        calls: list[dict] = []
+        trims: list[dict] = []
+        token = _call_records.set(calls)
+        trim_token = _trim_records.set(trims)
+        started = time.time()
+        try:
+            update = await node_fn(state)
+        except Exception:
+            NODE_ERRORS.labels(node).inc()
+            raise
+        finally:
+            _call_records.reset(token)
+            _trim_records.reset(trim_token)
+        finished = time.time()
+
+        queue_seconds = sum(call["queue_seconds"] for call in calls)
+        NODE_DURATION.labels(node).observe(finished - started)
+        if any(not (call["response_cache_hit"] or call["coalesced"]) for call in calls):
+            NODE_QUEUE.labels(node).observe(queue_seconds)
+        timing = {
+            "node": node,
+            "started": started,
+            "finished": finished,
+            "duration": finished - started,
+            "queue_seconds": queue_seconds,
+            "llm_calls": len(calls),
+            "prompt_tokens": sum(call["prompt_tokens"] for call in calls),
+            "trimmed_tokens": sum(trim["tokens"] for trim in trims),
+            "input_tokens": sum(call["input_tokens"] for call in calls),
+            "cached_input_tokens": sum(call["cached_input_tokens"] for call in calls),
+            "output_tokens": sum(call["output_tokens"] for call in calls),
+            "cost_usd": sum(call["cost_usd"] for call in calls),
+        }
+        return {**update, "node_timings": [timing], "llm_usage": calls}
+
+    return wrapper
+
+
+def critical_path(timings: list[dict], edges: Iterable[tuple[str, str]]) -> list[str]:
+    """
+    Return the chain of nodes that determined the run's wall time.
+
+    Starting from the node that finished last, repeatedly step to the
+    predecessor (per ``edges``) that finished last, i.e. the one it was
+    actually waiting on.
+    """
+    by_node = {timing["node"]: timing for timing in timings}
+    if not by_node:
+        return []
+    predecessors: dict[str, list[str]] = {}
+    for source, target in edges:
+        predecessors.setdefault(target, []).append(source)
+
+    node = max(by_node.values(), key=lambda t: t["finished"])["node"]
+    path = [node]
+    while True:
+        ran = [p for p in predecessors.get(node, []) if p in by_node]
+        if not ran:
+            break
+        node = max(ran, key=lambda p: by_node[p]["finished"])
+        path.append(node)
+    return path[::-1]
+
+
+def run_breakdown(state: dict, edges: Iterable[tuple[str, str]]) -> dict:
+    """Summarise a finished run's trace into a per-node timing breakdown."""
+    timings = state.get("node_timings", [])
+    if not timings:
+        return {"wall_seconds": 0.0, "nodes": [], "critical_path": [], "totals": {}}
+    run_started = min(t["started"] for t in timings)
+    run_finished = max(t["finished"] for t in timings)
+    nodes = [
+        {
+            **{k: v for k, v in t.items() if k not in ("started", "finished")},
+            "start": t["started"] - run_started,
+            "end": t["finished"] - run_started,
+        }
+        for t in sorted(timings, key=lambda t: t["started"])
+    ]
+    totals = {
+        key: sum(t[key] for t in timings)
+        for key in (
+            "llm_calls",
+            "prompt_tokens",
+            "trimmed_tokens",
+            "input_tokens",
+            "cached_input_tokens",
+            "output_tokens",
+            "cost_usd",
+        )
+    }
+    return {
+        "wall_seconds": run_finished - run_started,
+        "nodes": nodes,
+        "critical_path": critical_path(timings, edges),
+        "totals": totals,
+    }
@@ -1,302 +1,553 @@
 """
 LangGraph node implementations.
 
-Every node that performs LLM processing must obtain its model via _get_llm().
+Every node that performs LLM processing must obtain its model via _get_llm(node),
+which applies the node's model route from config.MODEL_ROUTES.
 The two exceptions – json_parser and wrapper – perform pure data transformation
 and must NOT call the LLM.
 
+All nodes are coroutines and LLM calls go through ``ainvoke`` on the shared
+client, so a single event loop can hold every branch call of every in-flight
+run without borrowing threads from the executor.
+
 Each node receives the full GraphState and returns a dict containing only the
 keys it produces; LangGraph merges the returned dict back into the shared state.
+Per-node timings and per-call token usage are added to the run trace by the
+instrumentation wrapper in metrics.py, applied when the graph is built.
 """
 
-import json
+import asyncio
+from typing import Any, NamedTuple, Optional, Sequence, Union
 
-from langchain_core.messages import HumanMessage, SystemMessage
+from langchain_core.messages import AIMessage, BaseMessage, HumanMessage, SystemMessage
+from pydantic import BaseModel
 
-from llm import _get_llm
+from cache import _get_cache, make_key
+from chunking import merge_outputs, split_transcript
+from config import CHUNKING, RENDER_FIELDS, TRANSCRIPT_SLICES
+from llm import _get_llm, _model_config
+from metrics import record_llm_call
 from prompts import PROMPTS
-from state import GraphState
+from resilience import call_with_policy
+from schemas import (
+    ContextRetrieval,
+    IntegratorSummarizerOutput,
+    KeyMessagesBriefingOutput,
+    SegmentExtraction,
+    merge,
+    render,
+)
+from singleflight import SingleFlight
+from state import REPORT_SECTIONS, Blob, GraphState, TextInput, requested_sections, text
+from tokens import (
+    MESSAGE_OVERHEAD_TOKENS,
+    count_messages,
+    count_tokens,
+    fit_sections,
+    token_budget,
+)
+from transcript import split_sections
+
+# GraphState fields each LLM node reads. A node's output depends only on its
+# prompt, the model configuration and these fields, so they make up its
+# response-cache key.
+NODE_INPUTS: dict[str, tuple[str, ...]] = {
+    "transcript_fa_extraction": ("transcript",),
+    "fa_highlights": ("report_template", "transcript_fa_extracted"),
+    "transcript_guidance_extraction": ("transcript",),
+    "guid_validation": ("transcript", "transcript_guidance_extracted"),
+    "segment_extraction": ("transcript", "segment_data"),
+    "context_retrieval": ("transcript", "segment_data", "segment_extraction_out"),
+    "integrator": ("context_retrieval_out", "segment_extraction_out", "segment_items"),
+    "key_messages": ("integrator_out", "segment_data"),
+    "summarizer": ("context_retrieval_out", "segment_extraction_out", "segment_items"),
+    "briefing_key_messages": ("summarizer_out", "segment_data"),
+    "integrator_summarizer": ("context_retrieval_out", "segment_extraction_out", "segment_items"),
+    "key_messages_briefing": ("integrator_out", "summarizer_out", "segment_data"),
+    "transcript_QA_extraction": ("transcript",),
+    "second_QA": ("transcript_QA_extracted",),
+    "output_template": (
+        "fa_highlights_out",
+        "guid_validation_out",
+        "briefing_key_messages_out",
+        "key_messages_out",
+        "second_QA_out",
+    ),
+}
+
+
+# LLM calls in flight, keyed like the response cache.
+_in_flight: SingleFlight[str] = SingleFlight("node")
+
+# Large inputs shared by several nodes. _build_messages places them in one
+# leading message, always in this order and ahead of the node-specific system
+# prompt, so every call that sends the same transcript starts with a
+# byte-identical prefix and the provider's prompt-prefix cache can serve it.
+PREFIX_SECTIONS: tuple[str, ...] = ("Transcript", "Segment Data")
+
+# A labelled prompt input; large inputs are passed as Blob handles.
+Section = tuple[str, TextInput]
+
+
+def _render(sections: Sequence[Section]) -> str:
+    return "\n\n".join(f"{label}:\n{text(value)}" for label, value in sections)
+
+
+def _prefix_key(prefix: Sequence[Section]) -> Optional[tuple[tuple[str, str], ...]]:
+    """Content key of a prefix led by a Blob, from the Blobs' digests; else None."""
+    if not isinstance(prefix[0][1], Blob):
+        return None
+    return tuple((label, Blob.of(value).digest) for label, value in prefix)
+
+
+def _render_prefix(prefix: Sequence[Section]) -> str:
+    """
+    The leading system message. Rendered once per distinct prefix and kept
+    on the transcript's Blob, so concurrent calls and runs sending the same
+    prefix share one string instead of each building a multi-megabyte copy.
+    """
+    key = _prefix_key(prefix)
+    if key is None:
+        return _render(prefix)
+    return prefix[0][1].memo(key, lambda: _render(prefix))
+
+
+class Prompt(NamedTuple):
+    """The chat messages of one call, with their token count under the node's model."""
+
+    messages: list[BaseMessage]
+    tokens: int
+
+
+def _assemble(node: str, sections: Sequence[Section], model: Optional[str]) -> Prompt:
+    prefix = [
+        section for label in PREFIX_SECTIONS for section in sections if section[0] == label
+    ]
+    rest = [section for section in sections if section[0] not in PREFIX_SECTIONS]
+    messages: list[BaseMessage] = []
+    tokens = 0
+    if prefix:
+        content = _render_prefix(prefix)
+        messages.append(SystemMessage(content=content))
+        # A Blob-led prefix is counted under its Blobs' digests, not re-hashed.
+        key = _prefix_key(prefix)
+        digest = None
+        if key is not None:
+            digest = "prefix:" + "|".join(f"{label}={blob}" for label, blob in key)
+        tokens += count_tokens(content, model, digest=digest) + MESSAGE_OVERHEAD_TOKENS
+    messages.append(SystemMessage(content=PROMPTS[node]["system"]))
+    user_content = PROMPTS[node]["user"]
+    if rest:
+        user_content = f"{user_content}\n\n{_render(rest)}"
+    messages.append(HumanMessage(content=user_content))
+    tokens += count_messages(messages[-2:], model)
+    return Prompt(messages, tokens)
+
+
+def _build_messages(node: str, *sections: Section) -> Prompt:
+    """
+    Build the chat messages for ``node`` from labelled input sections, and
+    count their tokens once for the budget check, the rate limiter and the
+    usage records.
+
+    Sections whose label is in PREFIX_SECTIONS go into a leading system message
+    (in PREFIX_SECTIONS order); the node's system prompt follows, and the user
+    prompt plus the remaining sections form the final human message. A prompt
+    over the node's token budget has its lower-priority sections trimmed to
+    fit (see tokens.py and config.TOKEN_BUDGETS).
+    """
+    model = _get_llm(node).model_name
+    prompt = _assemble(node, sections, model)
+    excess = prompt.tokens - token_budget(node)["max_input_tokens"]
+    if excess > 0:
+        resolved = [(label, text(value)) for label, value in sections]
+        prompt = _assemble(node, fit_sections(node, model, resolved, excess), model)
+    return prompt
+
+
+async def _ainvoke(
+    node: str,
+    state: GraphState,
+    prompt: Prompt,
+    inputs: Optional[dict[str, Any]] = None,
+    schema: Optional[type[BaseModel]] = None,
+) -> str:
+    """
+    Call the shared LLM for ``node`` with ``prompt`` (from _build_messages)
+    and return the response text.
+
+    With ``schema`` the call uses the provider's structured output and the text
+    returned is the schema-validated JSON document.
+
+    Responses are served from the response cache when the node's prompt, the
+    model configuration and every field in NODE_INPUTS[node] are unchanged,
+    and a call identical to one already in flight for another run waits for
+    that call instead of being sent (see singleflight.py).
+    ``inputs`` overrides individual fields of that key, for calls whose
+    messages were built from something other than the state value itself.
+    Calls that do reach the provider are subject to the process-wide
+    concurrency and rate limits in ratelimit.py, and to the node's timeout,
+    retry and hedging policy in resilience.py.
+    """
+    llm = _get_llm(node)
+    model_config = _model_config(llm)
+    runnable = llm
+    if schema is not None:
+        runnable = llm.with_structured_output(schema, include_raw=True)
+        model_config["schema"] = schema.model_json_schema()
+    model_config["token_budget"] = token_budget(node)
+    prompt_tokens = prompt.tokens
+
+    async def send() -> AIMessage:
+        result = await runnable.ainvoke(prompt.messages)
+        if schema is None:
+            return result
+        if result["parsing_error"] is not None:
+            raise result["parsing_error"]
+        # Whether the answer came as JSON content or as tool-call arguments,
+        # carry the validated document as the message content.
+        return result["raw"].model_copy(update={"content": result["parsed"].model_dump_json()})
+
+    async def call() -> str:
+        response, queue_seconds, llm_seconds = await call_with_policy(
+            node, llm.model_name, prompt_tokens + (llm.max_tokens or 0), send
+        )
+        record_llm_call(
+            node,
+            llm.model_name,
+            response,
+            queue_seconds=queue_seconds,
+            llm_seconds=llm_seconds,
+            prompt_tokens=prompt_tokens,
+        )
+        return response.content
+
+    key = make_key(
+        node,
+        PROMPTS[node],
+        model_config,
+        {field: state.get(field) for field in NODE_INPUTS[node]} | (inputs or {}),
+    )
+    cache = _get_cache()
+    if cache is not None:
+        content = await cache.aget(key)
+        if content is not None:
+            record_llm_call(node, llm.model_name, prompt_tokens=prompt_tokens)
+            return content
+
+    async def call_and_store() -> str:
+        content = await call()
+        if cache is not None:
+            await cache.aset(key, content)
+        return content
+
+    # An identical call already in flight for another run is awaited rather
+    # than sent again.
+    content, shared = await _in_flight.do(key, call_and_store)
+    if shared:
+        record_llm_call(node, llm.model_name, prompt_tokens=prompt_tokens, coalesced=True)
+    return content
+
+
+def _transcript_slice(node: str, state: GraphState) -> Blob:
+    """Return the part of the transcript ``node`` is configured to receive."""
+    name = TRANSCRIPT_SLICES.get(node, "full")
+    sections = state.get("transcript_sections")
+    if name == "full" or not sections or not sections[name].strip():
+        return Blob.of(state["transcript"])
+    return Blob.of(sections[name])
+
+
+async def _ainvoke_transcript(
+    node: str,
+    state: GraphState,
+    *sections: Section,
+    inputs: Optional[dict[str, Any]] = None,
+    schema: Optional[type[BaseModel]] = None,
+) -> Union[str, BaseModel]:
+    """
+    Call the LLM for a node whose prompt leads with the transcript.
+
+    The node's configured transcript slice is sent as the "Transcript" section
+    ahead of ``sections``. With chunking disabled for ``node`` (see
+    config.CHUNKING) this is a single call. Otherwise the node's prompt is
+    mapped over the transcript chunks in parallel and the partial outputs are
+    reduced with chunking.merge_outputs, which concatenates them in transcript
+    order without the lines repeated from the overlap. With ``schema`` the
+    parsed object is returned, and chunk results are reduced with
+    schemas.merge, one entry per segment.
+    """
+    settings = CHUNKING.get(node, {})
+    transcript = _transcript_slice(node, state)
+    chunks: list[TextInput] = [transcript]
+    if settings.get("enabled"):
+        chunks = split_transcript(
+            transcript.text,
+            settings["chunk_tokens"],
+            settings["overlap_tokens"],
+            model=_get_llm(node).model_name,
+        )
+
+    parts = await asyncio.gather(
+        *(
+            _ainvoke(
+                node,
+                state,
+                _build_messages(node, ("Transcript", chunk), *sections),
+                inputs={**(inputs or {}), "transcript": chunk},
+                schema=schema,
+            )
+            for chunk in chunks
+        )
+    )
+    if schema is not None:
+        parsed = [schema.model_validate_json(part) for part in parts]
+        return parsed[0] if len(parsed) == 1 else merge(schema, parsed)
+    if len(parts) == 1:
+        return parts[0]
+    return merge_outputs(parts)
+
+
+def _rendered_inputs(node: str, state: GraphState) -> dict[str, str]:
+    """
+    Compact text of the structured state fields ``node`` reads, restricted to
+    the fields listed for it in config.RENDER_FIELDS.
+    """
+    return {
+        field: render(state[field], fields) if field in state else ""
+        for field, fields in RENDER_FIELDS[node].items()
+    }
 
 
 # ---------------------------------------------------------------------------
 # Initialization node (no LLM)
 # ---------------------------------------------------------------------------
 
-def json_parser_node(state: GraphState) -> dict:
+async def json_parser_node(state: GraphState) -> dict:
     """
     Entry node. The API layer pre-populates GraphState with the four base
-    inputs before graph invocation, so no additional transformation is needed.
+    inputs; this node splits the transcript once into prepared remarks and
+    Q&A so each branch can be sent only the slice it needs (see
+    config.TRANSCRIPT_SLICES). The transcript and segment data are replaced
+    by Blob handles (see state.py).
     """
-    return {}
+    return {
+        "transcript": Blob.of(state["transcript"]),
+        "segment_data": Blob.of(state["segment_data"]),
+        "transcript_sections": split_sections(text(state["transcript"])),
+    }
 
 
 # ---------------------------------------------------------------------------
 # Branch 1: Financial Highlights
 # ---------------------------------------------------------------------------
 
-def transcript_fa_extraction_node(state: GraphState) -> dict:
+async def transcript_fa_extraction_node(state: GraphState) -> dict:
     """Node 1.1 – extract financial-analyst relevant content from the transcript."""
-    llm = _get_llm()
-    system_prompt = PROMPTS["transcript_fa_extraction"]["system"]
-    user_prompt = PROMPTS["transcript_fa_extraction"]["user"]
-    messages = [
-        SystemMessage(content=system_prompt),
-        HumanMessage(
-            content=f"{user_prompt}\n\nTranscript:\n{state['transcript']}"
-        ),
-    ]
-    response = llm.invoke(messages)
-    return {"transcript_fa_extracted": response.content}
+    content = await _ainvoke_transcript("transcript_fa_extraction", state)
+    return {"transcript_fa_extracted": content}
 
 
-def fa_highlights_node(state: GraphState) -> dict:
+async def fa_highlights_node(state: GraphState) -> dict:
     """Node 1.2 – produce financial-analysis highlights using the report template."""
-    llm = _get_llm()
-    system_prompt = PROMPTS["fa_highlights"]["system"]
-    user_prompt = PROMPTS["fa_highlights"]["user"]
-    messages = [
-        SystemMessage(content=system_prompt),
-        HumanMessage(
-            content=(
-                f"{user_prompt}\n\n"
-                f"Report Template:\n{state['report_template']}\n\n"
-                f"Extracted FA Transcript:\n{state['transcript_fa_extracted']}"
-            )
-        ),
-    ]
-    response = llm.invoke(messages)
-    return {"fa_highlights_out": response.content}
+    prompt = _build_messages(
+        "fa_highlights",
+        ("Report Template", state["report_template"]),
+        ("Extracted FA Transcript", state["transcript_fa_extracted"]),
+    )
+    content = await _ainvoke("fa_highlights", state, prompt)
+    return {"fa_highlights_out": content}
 
 
 # ---------------------------------------------------------------------------
 # Branch 2: Guidance
 # ---------------------------------------------------------------------------
 
-def transcript_guidance_extraction_node(state: GraphState) -> dict:
+async def transcript_guidance_extraction_node(state: GraphState) -> dict:
     """Node 2.1 – extract guidance-related content from the transcript."""
-    llm = _get_llm()
-    system_prompt = PROMPTS["transcript_guidance_extraction"]["system"]
-    user_prompt = PROMPTS["transcript_guidance_extraction"]["user"]
-    messages = [
-        SystemMessage(content=system_prompt),
-        HumanMessage(
-            content=f"{user_prompt}\n\nTranscript:\n{state['transcript']}"
-        ),
-    ]
-    response = llm.invoke(messages)
-    return {"transcript_guidance_extracted": response.content}
+    content = await _ainvoke_transcript("transcript_guidance_extraction", state)
+    return {"transcript_guidance_extracted": content}
 
 
-def guid_validation_node(state: GraphState) -> dict:
+async def guid_validation_node(state: GraphState) -> dict:
     """Node 2.2 – validate extracted guidance against the full transcript."""
-    llm = _get_llm()
-    system_prompt = PROMPTS["guid_validation"]["system"]
-    user_prompt = PROMPTS["guid_validation"]["user"]
-    messages = [
-        SystemMessage(content=system_prompt),
-        HumanMessage(
-            content=(
-                f"{user_prompt}\n\n"
-                f"Transcript:\n{state['transcript']}\n\n"
-                f"Extracted Guidance:\n{state['transcript_guidance_extracted']}"
-            )
-        ),
-    ]
-    response = llm.invoke(messages)
-    return {"guid_validation_out": response.content}
+    transcript = _transcript_slice("guid_validation", state)
+    prompt = _build_messages(
+        "guid_validation",
+        ("Transcript", transcript),
+        ("Extracted Guidance", state["transcript_guidance_extracted"]),
+    )
+    content = await _ainvoke("guid_validation", state, prompt, inputs={"transcript": transcript})
+    return {"guid_validation_out": content}
 
 
 # ---------------------------------------------------------------------------
 # Branch 3: Key Message
 # ---------------------------------------------------------------------------
 
-def segment_extraction_node(state: GraphState) -> dict:
+async def segment_extraction_node(state: GraphState) -> dict:
     """Node 3.1 – extract structured segment data from the transcript. (Structured Output)"""
-    llm = _get_llm()
-    system_prompt = PROMPTS["segment_extraction"]["system"]
-    user_prompt = PROMPTS["segment_extraction"]["user"]
-    messages = [
-        SystemMessage(content=system_prompt),
-        HumanMessage(
-            content=(
-                f"{user_prompt}\n\n"
-                f"Transcript:\n{state['transcript']}\n\n"
-                f"Segment Data:\n{state['segment_data']}"
-            )
-        ),
-    ]
-    response = llm.invoke(messages)
-    return {"segment_extraction_out": {"content": response.content}}
+    result = await _ainvoke_transcript(
+        "segment_extraction",
+        state,
+        ("Segment Data", state["segment_data"]),
+        schema=SegmentExtraction,
+    )
+    return {"segment_extraction_out": result}
 
 
-def context_retrieval_node(state: GraphState) -> dict:
+async def context_retrieval_node(state: GraphState) -> dict:
     """Node 3.2 – retrieve contextual information using segment extraction output. (Structured Output)"""
-    llm = _get_llm()
-    system_prompt = PROMPTS["context_retrieval"]["system"]
-    user_prompt = PROMPTS["context_retrieval"]["user"]
-    segment_extraction_str = json.dumps(state.get("segment_extraction_out", {}))
-    messages = [
-        SystemMessage(content=system_prompt),
-        HumanMessage(
-            content=(
-                f"{user_prompt}\n\n"
-                f"Transcript:\n{state['transcript']}\n\n"
-                f"Segment Data:\n{state['segment_data']}\n\n"
-                f"Segment Extraction Output:\n{segment_extraction_str}"
-            )
-        ),
-    ]
-    response = llm.invoke(messages)
-    return {"context_retrieval_out": {"content": response.content}}
+    rendered = _rendered_inputs("context_retrieval", state)
+    result = await _ainvoke_transcript(
+        "context_retrieval",
+        state,
+        ("Segment Data", state["segment_data"]),
+        ("Segment Extraction Output", rendered["segment_extraction_out"]),
+        inputs=rendered,
+        schema=ContextRetrieval,
+    )
+    return {"context_retrieval_out": result}
 
 
-def integrator_node(state: GraphState) -> dict:
+async def integrator_node(state: GraphState) -> dict:
     """Node 3.3a – integrate context retrieval and segment extraction results."""
-    llm = _get_llm()
-    system_prompt = PROMPTS["integrator"]["system"]
-    user_prompt = PROMPTS["integrator"]["user"]
-    context_retrieval_str = json.dumps(state.get("context_retrieval_out", {}))
-    segment_extraction_str = json.dumps(state.get("segment_extraction_out", {}))
-    messages = [
-        SystemMessage(content=system_prompt),
-        HumanMessage(
-            content=(
-                f"{user_prompt}\n\n"
-                f"Context Retrieval Output:\n{context_retrieval_str}\n\n"
-                f"Segment Extraction Output:\n{segment_extraction_str}\n\n"
-                f"Segment Items:\n{state['segment_items']}"
-            )
-        ),
-    ]
-    response = llm.invoke(messages)
-    return {"integrator_out": response.content}
+    rendered = _rendered_inputs("integrator", state)
+    prompt = _build_messages(
+        "integrator",
+        ("Context Retrieval Output", rendered["context_retrieval_out"]),
+        ("Segment Extraction Output", rendered["segment_extraction_out"]),
+        ("Segment Items", state["segment_items"]),
+    )
+    content = await _ainvoke("integrator", state, prompt, inputs=rendered)
+    return {"integrator_out": content}
 
 
-def key_messages_node(state: GraphState) -> dict:
+async def key_messages_node(state: GraphState) -> dict:
     """Node 3.4a – produce key messages from the integrator output."""
-    llm = _get_llm()
-    system_prompt = PROMPTS["key_messages"]["system"]
-    user_prompt = PROMPTS["key_messages"]["user"]
-    messages = [
-        SystemMessage(content=system_prompt),
-        HumanMessage(
-            content=(
-                f"{user_prompt}\n\n"
-                f"Integrator Output:\n{state['integrator_out']}\n\n"
-                f"Segment Data:\n{state['segment_data']}"
-            )
-        ),
-    ]
-    response = llm.invoke(messages)
-    return {"key_messages_out": response.content}
+    prompt = _build_messages(
+        "key_messages",
+        ("Integrator Output", state["integrator_out"]),
+        ("Segment Data", state["segment_data"]),
+    )
+    content = await _ainvoke("key_messages", state, prompt)
+    return {"key_messages_out": content}
 
 
-def summarizer_node(state: GraphState) -> dict:
+async def summarizer_node(state: GraphState) -> dict:
     """Node 3.3b – summarize context retrieval and segment extraction results."""
-    llm = _get_llm()
-    system_prompt = PROMPTS["summarizer"]["system"]
-    user_prompt = PROMPTS["summarizer"]["user"]
-    context_retrieval_str = json.dumps(state.get("context_retrieval_out", {}))
-    segment_extraction_str = json.dumps(state.get("segment_extraction_out", {}))
-    messages = [
-        SystemMessage(content=system_prompt),
-        HumanMessage(
-            content=(
-                f"{user_prompt}\n\n"
-                f"Context Retrieval Output:\n{context_retrieval_str}\n\n"
-                f"Segment Extraction Output:\n{segment_extraction_str}\n\n"
-                f"Segment Items:\n{state['segment_items']}"
-            )
-        ),
-    ]
-    response = llm.invoke(messages)
-    return {"summarizer_out": response.content}
+    rendered = _rendered_inputs("summarizer", state)
+    prompt = _build_messages(
+        "summarizer",
+        ("Context Retrieval Output", rendered["context_retrieval_out"]),
+        ("Segment Extraction Output", rendered["segment_extraction_out"]),
+        ("Segment Items", state["segment_items"]),
+    )
+    content = await _ainvoke("summarizer", state, prompt, inputs=rendered)
+    return {"summarizer_out": content}
 
 
-def briefing_key_messages_node(state: GraphState) -> dict:
+async def briefing_key_messages_node(state: GraphState) -> dict:
     """Node 3.4b – produce briefing key messages from the summarizer output."""
-    llm = _get_llm()
-    system_prompt = PROMPTS["briefing_key_messages"]["system"]
-    user_prompt = PROMPTS["briefing_key_messages"]["user"]
-    messages = [
-        SystemMessage(content=system_prompt),
-        HumanMessage(
-            content=(
-                f"{user_prompt}\n\n"
-                f"Summarizer Output:\n{state['summarizer_out']}\n\n"
-                f"Segment Data:\n{state['segment_data']}"
-            )
-        ),
-    ]
-    response = llm.invoke(messages)
-    return {"briefing_key_messages_out": response.content}
+    prompt = _build_messages(
+        "briefing_key_messages",
+        ("Summarizer Output", state["summarizer_out"]),
+        ("Segment Data", state["segment_data"]),
+    )
+    content = await _ainvoke("briefing_key_messages", state, prompt)
+    return {"briefing_key_messages_out": content}
+
+
+# Fused mode (graph.BRANCH3_MODE = "fused"): integrator and summarizer read the
+# same inputs, as do the two key-message nodes once both are done, so each
+# pair is answered by a single structured-output call that fills both fields.
+
+async def integrator_summarizer_node(state: GraphState) -> dict:
+    """Node 3.3 (fused) – integrator and summarizer in one structured-output call."""
+    rendered = _rendered_inputs("integrator_summarizer", state)
+    prompt = _build_messages(
+        "integrator_summarizer",
+        ("Context Retrieval Output", rendered["context_retrieval_out"]),
+        ("Segment Extraction Output", rendered["segment_extraction_out"]),
+        ("Segment Items", state["segment_items"]),
+    )
+    content = await _ainvoke(
+        "integrator_summarizer", state, prompt, inputs=rendered, schema=IntegratorSummarizerOutput
+    )
+    return IntegratorSummarizerOutput.model_validate_json(content).model_dump()
+
+
+async def key_messages_briefing_node(state: GraphState) -> dict:
+    """Node 3.4 (fused) – key messages and briefing key messages in one call."""
+    prompt = _build_messages(
+        "key_messages_briefing",
+        ("Integrator Output", state["integrator_out"]),
+        ("Summarizer Output", state["summarizer_out"]),
+        ("Segment Data", state["segment_data"]),
+    )
+    content = await _ainvoke(
+        "key_messages_briefing", state, prompt, schema=KeyMessagesBriefingOutput
+    )
+    return KeyMessagesBriefingOutput.model_validate_json(content).model_dump()
 
 
 # ---------------------------------------------------------------------------
 # Branch 4: QA
 # ---------------------------------------------------------------------------
 
-def transcript_QA_extraction_node(state: GraphState) -> dict:
+async def transcript_QA_extraction_node(state: GraphState) -> dict:
     """Node 4.1 – extract Q&A content from the transcript."""
-    llm = _get_llm()
-    system_prompt = PROMPTS["transcript_QA_extraction"]["system"]
-    user_prompt = PROMPTS["transcript_QA_extraction"]["user"]
-    messages = [
-        SystemMessage(content=system_prompt),
-        HumanMessage(
-            content=f"{user_prompt}\n\nTranscript:\n{state['transcript']}"
-        ),
-    ]
-    response = llm.invoke(messages)
-    return {"transcript_QA_extracted": response.content}
+    content = await _ainvoke_transcript("transcript_QA_extraction", state)
+    return {"transcript_QA_extracted": content}
 
 
-def second_QA_node(state: GraphState) -> dict:
+async def second_QA_node(state: GraphState) -> dict:
     """Node 4.2 – perform a second-pass QA over the extracted QA content."""
-    llm = _get_llm()
-    system_prompt = PROMPTS["second_QA"]["system"]
-    user_prompt = PROMPTS["second_QA"]["user"]
-    messages = [
-        SystemMessage(content=system_prompt),
-        HumanMessage(
-            content=(
-                f"{user_prompt}\n\n"
-                f"Extracted QA:\n{state['transcript_QA_extracted']}"
-            )
-        ),
-    ]
-    response = llm.invoke(messages)
-    return {"second_QA_out": response.content}
+    prompt = _build_messages(
+        "second_QA",
+        ("Extracted QA", state["transcript_QA_extracted"]),
+    )
+    content = await _ainvoke("second_QA", state, prompt)
+    return {"second_QA_out": content}
 
 
 # ---------------------------------------------------------------------------
 # Aggregation & wrapping nodes
 # ---------------------------------------------------------------------------
 
-def output_template_node(state: GraphState) -> dict:
+# Prompt label of each report section's output (see state.REPORT_SECTIONS).
+SECTION_LABELS: dict[str, str] = {
+    "fa_highlights": "FA Highlights",
+    "guidance": "Guidance Validation",
+    "briefing_key_messages": "Briefing Key Messages",
+    "key_messages": "Key Messages",
+    "qa": "QA",
+}
+
+
+async def output_template_node(state: GraphState) -> dict:
     """
-    Merge node – waits for all four branches to complete, then generates the
-    final AI summary using outputs from every branch.
+    Merge node – waits for the branches of the requested report sections to
+    complete, then generates the final AI summary from their outputs only.
     """
-    llm = _get_llm()
-    system_prompt = PROMPTS["output_template"]["system"]
-    user_prompt = PROMPTS["output_template"]["user"]
-    context = (
-        f"FA Highlights:\n{state.get('fa_highlights_out', '')}\n\n"
-        f"Guidance Validation:\n{state.get('guid_validation_out', '')}\n\n"
-        f"Briefing Key Messages:\n{state.get('briefing_key_messages_out', '')}\n\n"
-        f"Key Messages:\n{state.get('key_messages_out', '')}\n\n"
-        f"QA:\n{state.get('second_QA_out', '')}"
+    requested = requested_sections(state.get("sections"))
+    prompt = _build_messages(
+        "output_template",
+        *(
+            (SECTION_LABELS[section], state.get(REPORT_SECTIONS[section], ""))
+            for section in requested
+        ),
     )
-    messages = [
-        SystemMessage(content=system_prompt),
-        HumanMessage(content=f"{user_prompt}\n\n{context}"),
-    ]
-    response = llm.invoke(messages)
-    return {"ai_summary": response.content}
+    # Outputs that were not sent stay out of the cache key, even when a
+    # fused branch produced them anyway.
+    skipped = {
+        field: None for section, field in REPORT_SECTIONS.items() if section not in requested
+    }
+    content = await _ainvoke("output_template", state, prompt, inputs=skipped)
+    return {"ai_summary": content}
 
 
-def wrapper_node(state: GraphState) -> dict:
+async def wrapper_node(state: GraphState) -> dict:
     """
     Final node (no LLM). Wraps the ai_summary string into the required
     deeply nested JSON response structure.
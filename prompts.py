@@ -24,6 +24,11 @@ PROMPTS: dict[str, dict[str, str]] = {
     "summarizer": {"system": "", "user": ""},
     "briefing_key_messages": {"system": "", "user": ""},
 
+    # Branch 3, fused mode (graph.BRANCH3_MODE = "fused"): each call returns
+    # both outputs of the pair it replaces as one JSON object.
+    "integrator_summarizer": {"system": "", "user": ""},
+    "key_messages_briefing": {"system": "", "user": ""},
+
     # Branch 4: QA
     "transcript_QA_extraction": {"system": "", "user": ""},
     "second_QA": {"system": "", "user": ""},
@@ -0,0 +1,172 @@
+"""
+Global concurrency limit and per-model rate limiting for upstream LLM calls.
+
+Every node call, from every run in the process, passes through
+``throttled_call``. It waits for the model's request and token budgets, then
+for a slot in the process-wide concurrency semaphore, before it sends the
+request. Large batches therefore queue inside the process instead of
+triggering 429 storms upstream.
+
+With SHARED_BACKEND set (see shared.py) the request and token buckets live
+in the shared backend, so every worker process of a multi-worker deployment
+draws from the same per-model budget; the concurrency limit stays per process.
+The backend's blocking calls (SQLite transactions that may wait on another
+worker's lock, Redis round trips) run in a worker thread, never on the event
+loop.
+
+Token budgets are charged up front with the prompt size counted by tokens.py
+plus the completion limit, and settled however the call ends: against the
+response's usage metadata when it returns, and in full when it is cancelled
+or fails before it is sent. A request that was sent but produced no response
+(an error, a timeout, a hedge that lost) keeps its estimate, as the provider
+counted it.
+
+Configuration is read from the .env file:
+    LLM_MAX_CONCURRENCY      – upstream calls in flight at once in this process (default 64).
+    LLM_REQUESTS_PER_MINUTE  – per-model request budget, 0 = unlimited (default 0).
+    LLM_TOKENS_PER_MINUTE    – per-model token budget, 0 = unlimited (default 0).
+"""
+
+import asyncio
+import os
+import random
+import time
+from functools import lru_cache
+from typing import Awaitable, Callable, Optional
+
+from langchain_core.messages import AIMessage
+
+from shared import SharedStore, _get_shared_store
+
+
+class TokenBucket:
+    """A token bucket that refills continuously at ``per_minute`` units per minute."""
+
+    def __init__(self, per_minute: float) -> None:
+        self.capacity = per_minute
+        self.rate = per_minute / 60.0
+        self.tokens = per_minute
+        self.updated = time.monotonic()
+        self._lock = asyncio.Lock()
+
+    def _refill(self) -> None:
+        now = time.monotonic()
+        self.tokens = min(self.capacity, self.tokens + (now - self.updated) * self.rate)
+        self.updated = now
+
+    async def acquire(self, amount: float) -> None:
+        """Wait until ``amount`` units are available, then take them."""
+        # Requests larger than the whole bucket would never fit; let them
+        # through once the bucket is full and drive the balance negative.
+        needed = min(amount, self.capacity)
+        async with self._lock:
+            while True:
+                self._refill()
+                if self.tokens >= needed:
+                    self.tokens -= amount
+                    return
+                await asyncio.sleep((needed - self.tokens) / self.rate)
+
+    async def adjust(self, amount: float) -> None:
+        """Charge (positive) or refund (negative) ``amount`` units without waiting."""
+        self._refill()
+        self.tokens = min(self.capacity, self.tokens - amount)
+
+
+class SharedTokenBucket:
+    """A TokenBucket whose balance lives in a shared backend (see shared.py)."""
+
+    # Upper bound on one sleep, so a waiter re-checks a bucket that other
+    # processes have refunded in the meantime.
+    MAX_WAIT = 1.0
+
+    def __init__(self, store: SharedStore, name: str, per_minute: float) -> None:
+        self.store = store
+        self.name = name
+        self.capacity = per_minute
+        self.rate = per_minute / 60.0
+
+    async def acquire(self, amount: float) -> None:
+        """Wait until ``amount`` units are available, then take them."""
+        while True:
+            wait = await asyncio.to_thread(
+                self.store.take, self.name, amount, self.capacity, self.rate
+            )
+            if wait <= 0:
+                return
+            await asyncio.sleep(min(wait, self.MAX_WAIT) * random.uniform(1.0, 1.1))
+
+    async def adjust(self, amount: float) -> None:
+        """Charge (positive) or refund (negative) ``amount`` units without waiting."""
+        await asyncio.to_thread(self.store.adjust, self.name, amount, self.capacity, self.rate)
+
+
+class RateLimiter:
+    """Requests-per-minute and tokens-per-minute budgets for one model."""
+
+    def __init__(
+        self,
+        requests_per_minute: float = 0,
+        tokens_per_minute: float = 0,
+        store: Optional[SharedStore] = None,
+        name: str = "",
+    ) -> None:
+        def bucket(kind: str, per_minute: float):
+            if not per_minute:
+                return None
+            if store is None:
+                return TokenBucket(per_minute)
+            return SharedTokenBucket(store, f"ratelimit:{name}:{kind}", per_minute)
+
+        self.requests = bucket("requests", requests_per_minute)
+        self.tokens = bucket("tokens", tokens_per_minute)
+
+    async def acquire(self, estimated_tokens: int) -> None:
+        if self.requests is not None:
+            await self.requests.acquire(1)
+        if self.tokens is not None:
+            await self.tokens.acquire(estimated_tokens)
+
+    async def settle(self, estimated_tokens: int, actual_tokens: Optional[int]) -> None:
+        """Correct the token budget once the real usage is known."""
+        if self.tokens is not None and actual_tokens is not None:
+            await self.tokens.adjust(actual_tokens - estimated_tokens)
+
+
+@lru_cache(maxsize=None)
+def _get_rate_limiter(model: str) -> RateLimiter:
+    """Return the shared rate limiter for ``model``."""
+    return RateLimiter(
+        requests_per_minute=float(os.getenv("LLM_REQUESTS_PER_MINUTE", "0")),
+        tokens_per_minute=float(os.getenv("LLM_TOKENS_PER_MINUTE", "0")),
+        store=_get_shared_store(),
+        name=model,
+    )
+
+
+@lru_cache(maxsize=1)
+def _get_semaphore() -> asyncio.Semaphore:
+    """Return the process-wide semaphore bounding in-flight upstream calls."""
+    return asyncio.Semaphore(int(os.getenv("LLM_MAX_CONCURRENCY", "64")))
+
+
+async def throttled_call(
+    model: str,
+    estimated_tokens: int,
+    call: Callable[[], Awaitable[AIMessage]],
+) -> AIMessage:
+    """Run ``call`` once the rate limiter and the concurrency limit allow it."""
+    limiter = _get_rate_limiter(model)
+    await limiter.acquire(estimated_tokens)
+    # Settled however the call ends: a call that never got a slot (cancelled
+    # while queued, e.g. a hedge whose primary answered) used nothing.
+    actual_tokens: Optional[int] = 0
+    try:
+        async with _get_semaphore():
+            actual_tokens = None
+            response = await call()
+        usage = getattr(response, "usage_metadata", None) or {}
+        actual_tokens = usage.get("total_tokens")
+    finally:
+        await limiter.settle(estimated_tokens, actual_tokens)
+    return response
@@ -0,0 +1,156 @@
+"""
+Record/replay of upstream LLM traffic, for offline load and regression runs.
+
+The layer sits in the HTTP transport under the shared async client (see
+llm._get_http_client), so every request a node makes — plain, structured
+output, streamed, retried or hedged — goes through it unchanged.
+
+    record – requests go upstream as usual; every request/response pair is
+             appended to LLM_RECORD_PATH as one JSON line, with the time the
+             response took.
+    replay – nothing is sent. Each request is answered from the recording,
+             after its recorded latency times LLM_REPLAY_LATENCY_SCALE (0
+             answers at once, which leaves only the service's own overhead in
+             node timings). A request missing from the recording gets a 404
+             error response, which fails the node without retries.
+
+Requests are matched on method, URL path and JSON body (keys sorted), not on
+host or headers, so a recording made against one endpoint replays under any
+OPENAI_API_BASE. Identical requests recorded several times (retries, hedges,
+or the same inputs in several runs) are replayed in recorded order, cycling
+when the recording runs out. Replaying reproduces a run only if its inputs
+are the same as when it was recorded, e.g. the seeded synthetic payloads of
+bench/run_bench.py (see its --record/--replay options).
+
+Streamed responses are recorded in full before they are handed to the
+client, and replayed as one body after the latency has passed, so token
+pacing is not reproduced.
+
+Configuration is read from the .env file:
+    LLM_RECORD_MODE          – "off" (default), "record" or "replay".
+    LLM_RECORD_PATH          – JSON-lines recording file (default "llm_recording.jsonl").
+    LLM_REPLAY_LATENCY_SCALE – multiplier for recorded latencies in replay (default 1).
+"""
+
+import asyncio
+import hashlib
+import json
+import logging
+import os
+import threading
+import time
+
+import httpx
+
+logger = logging.getLogger(__name__)
+
+# Response headers kept in the recording; the body is stored decoded, so
+# transfer and content encodings do not apply on replay.
+_KEPT_HEADERS: tuple[str, ...] = ("content-type",)
+
+
+def request_key(method: str, path: str, body: bytes) -> str:
+    """Key identifying a request in the recording."""
+    try:
+        canonical = json.dumps(json.loads(body), sort_keys=True)
+    except ValueError:
+        canonical = body.decode("utf-8", "replace")
+    return hashlib.sha256(f"{method} {path}\n{canonical}".encode("utf-8")).hexdigest()
+
+
+class RecordingTransport(httpx.AsyncBaseTransport):
+    """Send requests through ``transport`` and append each exchange to ``path``."""
+
+    def __init__(self, path: str, transport: httpx.AsyncBaseTransport) -> None:
+        self._path = path
+        self._transport = transport
+        self._lock = threading.Lock()
+
+    async def handle_async_request(self, request: httpx.Request) -> httpx.Response:
+        body = await request.aread()
+        started = time.time()
+        response = await self._transport.handle_async_request(request)
+        try:
+            content = await response.aread()
+        finally:
+            await response.aclose()
+        elapsed = time.time() - started
+        headers = {
+            name: response.headers[name] for name in _KEPT_HEADERS if name in response.headers
+        }
+        entry = {
+            "key": request_key(request.method, request.url.path, body),
+            "method": request.method,
+            "path": request.url.path,
+            "request": body.decode("utf-8", "replace"),
+            "status": response.status_code,
+            "headers": headers,
+            "body": content.decode("utf-8", "replace"),
+            "started": started,
+            "elapsed_s": elapsed,
+        }
+        line = json.dumps(entry) + "\n"
+        with self._lock:
+            with open(self._path, "a", encoding="utf-8") as f:
+                f.write(line)
+        return httpx.Response(response.status_code, headers=headers, content=content)
+
+    async def aclose(self) -> None:
+        await self._transport.aclose()
+
+
+class ReplayTransport(httpx.AsyncBaseTransport):
+    """Answer requests from a recording made by RecordingTransport."""
+
+    def __init__(self, path: str, latency_scale: float = 1.0) -> None:
+        self._latency_scale = latency_scale
+        self._entries: dict[str, list[dict]] = {}
+        self._next: dict[str, int] = {}
+        with open(path, encoding="utf-8") as f:
+            for line in f:
+                if line.strip():
+                    entry = json.loads(line)
+                    self._entries.setdefault(entry["key"], []).append(entry)
+        logger.info(
+            "replaying %d recorded LLM responses from %s",
+            sum(len(entries) for entries in self._entries.values()),
+            path,
+        )
+
+    async def handle_async_request(self, request: httpx.Request) -> httpx.Response:
+        key = request_key(request.method, request.url.path, await request.aread())
+        entries = self._entries.get(key)
+        if not entries:
+            logger.warning("no recorded response for %s %s", request.method, request.url.path)
+            error = {
+                "error": {
+                    "message": f"no recorded response for this request (key {key})",
+                    "type": "replay_miss",
+                }
+            }
+            return httpx.Response(404, json=error)
+        index = self._next.get(key, 0)
+        self._next[key] = (index + 1) % len(entries)
+        entry = entries[index]
+        await asyncio.sleep(entry["elapsed_s"] * self._latency_scale)
+        return httpx.Response(
+            entry["status"], headers=entry["headers"], content=entry["body"].encode("utf-8")
+        )
+
+
+def record_mode() -> str:
+    mode = os.getenv("LLM_RECORD_MODE", "off").lower()
+    if mode not in ("off", "record", "replay"):
+        raise ValueError(f"unknown LLM_RECORD_MODE {mode!r}; expected off, record or replay")
+    return mode
+
+
+def wrap_transport(transport: httpx.AsyncBaseTransport) -> httpx.AsyncBaseTransport:
+    """``transport``, recorded or replaced by the recording as LLM_RECORD_MODE says."""
+    mode = record_mode()
+    path = os.getenv("LLM_RECORD_PATH", "llm_recording.jsonl")
+    if mode == "record":
+        return RecordingTransport(path, transport)
+    if mode == "replay":
+        return ReplayTransport(path, float(os.getenv("LLM_REPLAY_LATENCY_SCALE", "1")))
+    return transport
@@ -0,0 +1,184 @@
+"""
+Per-node timeouts, retries with backoff, and hedged requests for LLM calls.
+
+Every node call goes through ``call_with_policy``, which applies the node's
+entry in config.CALL_POLICIES:
+
+    timeout        – seconds allowed for the upstream request itself (time
+                     spent queueing for the rate limiter does not count);
+                     0 disables the timeout.
+    max_retries    – further attempts after a timeout, connection error, 429
+                     or 5xx response. Other errors are raised immediately.
+    backoff_base   – the n-th retry waits a random time ("full jitter") of up
+    backoff_max      to min(backoff_max, backoff_base * 2**n) seconds.
+    hedge          – when the request has been in flight longer than the
+                     node's recent ``hedge_quantile`` latency, send a
+                     duplicate and use whichever response arrives first.
+
+Hedging only starts once HEDGE_MIN_SAMPLES latencies have been observed for
+the node. Every request that was sent adds one: its upstream time if it
+completed, or the time it had been in flight when it timed out or was
+abandoned for a faster hedge (a lower bound). The slow tail therefore stays
+in the window, and hedges that win do not pull the threshold down.
+
+Every attempt, hedges included, passes through ``throttled_call`` and
+therefore counts against the concurrency and rate limits. Retries and hedges
+are counted in the Prometheus metrics.
+"""
+
+import asyncio
+import random
+import time
+from collections import deque
+from typing import Awaitable, Callable, Optional
+
+import openai
+from langchain_core.messages import AIMessage
+
+from config import CALL_POLICIES, DEFAULT_CALL_POLICY
+from metrics import LLM_HEDGE_WINS, LLM_HEDGES, LLM_RETRIES
+from ratelimit import throttled_call
+
+# Latencies kept per node for the hedging threshold, and the number needed
+# before hedging starts.
+LATENCY_WINDOW = 200
+HEDGE_MIN_SAMPLES = 20
+
+_latencies: dict[str, deque[float]] = {}
+
+
+def _retry_reason(exc: BaseException) -> Optional[str]:
+    """Label for a retryable failure, or None if ``exc`` should be raised."""
+    if isinstance(exc, (asyncio.TimeoutError, openai.APITimeoutError)):
+        return "timeout"
+    if isinstance(exc, openai.APIConnectionError):
+        return "connection"
+    if isinstance(exc, openai.RateLimitError):
+        return "rate_limited"
+    if isinstance(exc, openai.APIStatusError) and exc.status_code >= 500:
+        return "server_error"
+    return None
+
+
+def _record_latency(node: str, seconds: float) -> None:
+    _latencies.setdefault(node, deque(maxlen=LATENCY_WINDOW)).append(seconds)
+
+
+def _backoff(policy: dict, retry: int) -> float:
+    return random.uniform(0, min(policy["backoff_max"], policy["backoff_base"] * 2**retry))
+
+
+def _hedge_delay(node: str, policy: dict) -> Optional[float]:
+    """Seconds after which a duplicate request is sent, or None for no hedging."""
+    samples = _latencies.get(node)
+    if not policy["hedge"] or samples is None or len(samples) < HEDGE_MIN_SAMPLES:
+        return None
+    ordered = sorted(samples)
+    return ordered[min(int(len(ordered) * policy["hedge_quantile"]), len(ordered) - 1)]
+
+
+async def _attempt(
+    node: str,
+    model: str,
+    estimated_tokens: int,
+    send: Callable[[], Awaitable[AIMessage]],
+    timeout: float,
+    sent: asyncio.Event,
+) -> tuple[AIMessage, float, float]:
+    """One throttled request; returns the response, queueing and upstream seconds."""
+    sent_at = 0.0
+
+    async def timed_send() -> AIMessage:
+        nonlocal sent_at
+        sent_at = time.perf_counter()
+        sent.set()
+        if timeout:
+            return await asyncio.wait_for(send(), timeout)
+        return await send()
+
+    queued_at = time.perf_counter()
+    try:
+        response = await throttled_call(model, estimated_tokens, timed_send)
+    except (asyncio.TimeoutError, asyncio.CancelledError, openai.APITimeoutError):
+        # Timed out, or cancelled after losing to a hedge: censored latency.
+        if sent_at:
+            _record_latency(node, time.perf_counter() - sent_at)
+        raise
+    llm_seconds = time.perf_counter() - sent_at
+    _record_latency(node, llm_seconds)
+    return response, sent_at - queued_at, llm_seconds
+
+
+async def _hedged_attempt(
+    node: str,
+    policy: dict,
+    model: str,
+    estimated_tokens: int,
+    send: Callable[[], Awaitable[AIMessage]],
+) -> tuple[AIMessage, float, float]:
+    sent = asyncio.Event()
+    delay = _hedge_delay(node, policy)
+    if delay is None:
+        return await _attempt(node, model, estimated_tokens, send, policy["timeout"], sent)
+
+    primary = asyncio.create_task(
+        _attempt(node, model, estimated_tokens, send, policy["timeout"], sent)
+    )
+    tasks = {primary}
+    try:
+        # The hedge timer starts once the primary request is actually sent.
+        sent_wait = asyncio.create_task(sent.wait())
+        await asyncio.wait({primary, sent_wait}, return_when=asyncio.FIRST_COMPLETED)
+        sent_wait.cancel()
+        if not primary.done():
+            await asyncio.wait({primary}, timeout=delay)
+        if primary.done():
+            return primary.result()
+
+        LLM_HEDGES.labels(node).inc()
+        hedge = asyncio.create_task(
+            _attempt(node, model, estimated_tokens, send, policy["timeout"], asyncio.Event())
+        )
+        tasks.add(hedge)
+        while tasks:
+            done, tasks = await asyncio.wait(tasks, return_when=asyncio.FIRST_COMPLETED)
+            for task in done:
+                if task.exception() is None:
+                    if task is hedge:
+                        LLM_HEDGE_WINS.labels(node).inc()
+                    return task.result()
+        # Both requests failed; surface the primary's error.
+        return primary.result()
+    finally:
+        for task in tasks:
+            task.cancel()
+
+
+async def call_with_policy(
+    node: str,
+    model: str,
+    estimated_tokens: int,
+    send: Callable[[], Awaitable[AIMessage]],
+) -> tuple[AIMessage, float, float]:
+    """
+    Call ``send`` under ``node``'s timeout, retry and hedging policy.
+
+    Returns the response with the queueing and upstream seconds of the
+    attempt that produced it.
+    """
+    policy = {**DEFAULT_CALL_POLICY, **CALL_POLICIES.get(node, {})}
+    retry = 0
+    while True:
+        try:
+            response, queue_seconds, llm_seconds = await _hedged_attempt(
+                node, policy, model, estimated_tokens, send
+            )
+        except Exception as exc:
+            reason = _retry_reason(exc)
+            if reason is None or retry >= policy["max_retries"]:
+                raise
+            LLM_RETRIES.labels(node, reason).inc()
+            await asyncio.sleep(_backoff(policy, retry))
+            retry += 1
+            continue
+        return response, queue_seconds, llm_seconds
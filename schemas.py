@@ -0,0 +1,127 @@
+"""
+Response schemas of the structured-output nodes, and their compact renderer.
+
+segment_extraction and context_retrieval return typed objects that are kept
+as parsed models in GraphState. Consumers do not re-serialise them with
+json.dumps (escaped quotes and newlines, every key in every call); they
+receive ``render()``'s plain-text form, restricted to the fields listed for
+them in config.RENDER_FIELDS. The rendering of an object is memoised per
+field selection, so integrator and summarizer share one serialisation.
+"""
+
+from typing import Sequence
+
+from pydantic import BaseModel, Field, PrivateAttr
+
+
+class _Rendered(BaseModel):
+    # Memo of render() output by field selection; not part of the schema.
+    _rendered: dict[tuple[str, ...], str] = PrivateAttr(default_factory=dict)
+
+
+# ---------------------------------------------------------------------------
+# segment_extraction
+# ---------------------------------------------------------------------------
+
+class SegmentFigures(BaseModel):
+    segment: str = Field(description="Segment name, as given in the segment data.")
+    metrics: list[str] = Field(
+        description="Figures reported for the segment, quoted as stated "
+        "(e.g. 'revenue $4.2bn, +6% y/y')."
+    )
+    commentary: str = Field(description="Management's commentary on the segment's results.")
+
+
+class SegmentExtraction(_Rendered):
+    segments: list[SegmentFigures] = Field(
+        description="One entry per segment discussed in the transcript, in order of discussion."
+    )
+
+
+# ---------------------------------------------------------------------------
+# context_retrieval
+# ---------------------------------------------------------------------------
+
+class SegmentContext(BaseModel):
+    segment: str = Field(description="Segment name, as given in the segment data.")
+    drivers: list[str] = Field(description="Reasons given for the segment's results.")
+    outlook: str = Field(description="Forward-looking statements about the segment, if any.")
+    quotes: list[str] = Field(description="Short verbatim supporting quotes from the transcript.")
+
+
+class ContextRetrieval(_Rendered):
+    segments: list[SegmentContext] = Field(
+        description="One entry per segment in the segment extraction output."
+    )
+
+
+def _segment_key(name: str) -> str:
+    return " ".join(name.split()).casefold()
+
+
+def merge(schema: type[BaseModel], parts: Sequence[BaseModel]) -> BaseModel:
+    """
+    Reduce chunk-level results of a segment schema into one entry per segment,
+    in order of first mention. Entries for the same segment (e.g. from
+    overlapping chunks) are combined field by field: list items and distinct
+    non-empty texts are kept once each, in chunk order.
+    """
+    merged: dict[str, dict] = {}
+    for part in parts:
+        for entry in part.segments:
+            fields = merged.setdefault(_segment_key(entry.segment), {"segment": entry.segment})
+            for name, value in entry:
+                if name == "segment":
+                    continue
+                if isinstance(value, list):
+                    kept = fields.setdefault(name, [])
+                    kept.extend(item for item in value if item not in kept)
+                else:
+                    kept = fields.setdefault(name, "")
+                    if value.strip() and value not in kept:
+                        fields[name] = f"{kept} {value}" if kept else value
+    return schema.model_validate({"segments": list(merged.values())})
+
+
+def render(value: BaseModel, fields: Sequence[str]) -> str:
+    """
+    Render a segment schema as compact text, one block per segment, keeping
+    only ``fields`` (the segment name is always included). Lists are joined
+    with "; " and empty fields are omitted.
+    """
+    key = tuple(fields)
+    memo = value._rendered
+    if key not in memo:
+        blocks = []
+        for entry in value.segments:
+            lines = [f"[{entry.segment}]"]
+            for name in fields:
+                item = getattr(entry, name)
+                text = "; ".join(item) if isinstance(item, list) else item
+                if name != "segment" and text:
+                    lines.append(f"{name}: {text}")
+            blocks.append("\n".join(lines))
+        memo[key] = "\n\n".join(blocks)
+    return memo[key]
+
+
+# ---------------------------------------------------------------------------
+# Fused branch 3 (graph.BRANCH3_MODE = "fused")
+# ---------------------------------------------------------------------------
+
+class IntegratorSummarizerOutput(BaseModel):
+    integrator_out: str = Field(
+        description="Integration of the context retrieval and segment extraction results."
+    )
+    summarizer_out: str = Field(
+        description="Summary of the context retrieval and segment extraction results."
+    )
+
+
+class KeyMessagesBriefingOutput(BaseModel):
+    key_messages_out: str = Field(
+        description="Key messages derived from the integrator output."
+    )
+    briefing_key_messages_out: str = Field(
+        description="Briefing key messages derived from the summarizer output."
+    )
@@ -0,0 +1,184 @@
+"""
+State shared by the worker processes of a multi-worker deployment.
+
+With several uvicorn workers, each process would otherwise keep its own
+response cache and its own rate-limit buckets, so every worker would spend
+the full upstream budget. SHARED_BACKEND selects where that state lives:
+
+    local  – (default) in-process only; right for a single worker.
+    sqlite – a SQLite file on the local disk (SHARED_SQLITE_PATH), for
+             workers on one host. The response cache's disk tier defaults to
+             the same file.
+    redis  – a Redis-compatible server (Redis, Valkey, ...) at REDIS_URL, for
+             workers on one or several hosts. Requires the ``redis`` package.
+             The store only uses GET/SET and a Lua script, so any client with
+             redis-py's ``get``/``set``/``register_script`` API works, e.g.
+             ``fakeredis.FakeRedis`` as a local stand-in in tests.
+
+Every backend implements the token-bucket operations of ratelimit.py
+atomically across processes (``take``/``adjust``); RedisStore also serves as
+the response cache's shared tier (``get``/``set``).
+
+Configuration is read from the .env file:
+    SHARED_BACKEND     – "local" (default), "sqlite" or "redis".
+    SHARED_SQLITE_PATH – SQLite file for the sqlite backend (default "shared.db").
+    REDIS_URL          – server URL for the redis backend
+                         (default "redis://localhost:6379/0").
+"""
+
+import os
+import sqlite3
+import threading
+import time
+from functools import lru_cache
+from typing import Any, Optional, Union
+
+# Token-bucket update run atomically inside the server. Mirrors
+# SqliteStore._update; the server clock is used so hosts need not agree.
+_BUCKET_SCRIPT = """
+local now_parts = redis.call('TIME')
+local now = tonumber(now_parts[1]) + tonumber(now_parts[2]) / 1000000
+local amount = tonumber(ARGV[1])
+local capacity = tonumber(ARGV[2])
+local rate = tonumber(ARGV[3])
+local state = redis.call('HMGET', KEYS[1], 'tokens', 'updated')
+local tokens = tonumber(state[1]) or capacity
+local updated = tonumber(state[2]) or now
+tokens = math.min(capacity, tokens + (now - updated) * rate)
+local wait = 0
+if ARGV[4] == 'take' then
+    local needed = math.min(amount, capacity)
+    if tokens >= needed then
+        tokens = tokens - amount
+    else
+        wait = (needed - tokens) / rate
+    end
+else
+    tokens = math.min(capacity, tokens - amount)
+end
+redis.call('HSET', KEYS[1], 'tokens', tostring(tokens), 'updated', tostring(now))
+redis.call('EXPIRE', KEYS[1], math.ceil(capacity / rate) + 60)
+return tostring(wait)
+"""
+
+
+class SqliteStore:
+    """Token buckets in a local SQLite file, shared by processes on one host."""
+
+    def __init__(self, path: str) -> None:
+        # Autocommit mode, so each update can open its own IMMEDIATE
+        # transaction and hold the write lock across read-modify-write.
+        self._db = sqlite3.connect(
+            path, timeout=30, isolation_level=None, check_same_thread=False
+        )
+        self._lock = threading.Lock()
+        with self._lock:
+            self._db.execute("PRAGMA journal_mode=WAL")
+            self._db.execute(
+                "CREATE TABLE IF NOT EXISTS buckets ("
+                " name TEXT PRIMARY KEY,"
+                " tokens REAL NOT NULL,"
+                " updated REAL NOT NULL)"
+            )
+
+    def _update(
+        self, name: str, amount: float, capacity: float, rate: float, take: bool
+    ) -> float:
+        with self._lock:
+            self._db.execute("BEGIN IMMEDIATE")
+            try:
+                row = self._db.execute(
+                    "SELECT tokens, updated FROM buckets WHERE name = ?", (name,)
+                ).fetchone()
+                now = time.time()
+                if row is None:
+                    tokens = capacity
+                else:
+                    tokens = min(capacity, row[0] + (now - row[1]) * rate)
+                wait = 0.0
+                if take:
+                    needed = min(amount, capacity)
+                    if tokens >= needed:
+                        tokens -= amount
+                    else:
+                        wait = (needed - tokens) / rate
+                else:
+                    tokens = min(capacity, tokens - amount)
+                self._db.execute(
+                    "INSERT OR REPLACE INTO buckets (name, tokens, updated) VALUES (?, ?, ?)",
+                    (name, tokens, now),
+                )
+                self._db.execute("COMMIT")
+            except BaseException:
+                self._db.execute("ROLLBACK")
+                raise
+        return wait
+
+    def take(self, name: str, amount: float, capacity: float, rate: float) -> float:
+        """
+        Take ``amount`` units from bucket ``name`` if available. Returns 0.0 on
+        success, otherwise the seconds to wait before trying again.
+        """
+        return self._update(name, amount, capacity, rate, take=True)
+
+    def adjust(self, name: str, amount: float, capacity: float, rate: float) -> None:
+        """Charge (positive) or refund (negative) ``amount`` units without waiting."""
+        self._update(name, amount, capacity, rate, take=False)
+
+    def close(self) -> None:
+        with self._lock:
+            self._db.close()
+
+
+class RedisStore:
+    """Token buckets and cache entries on a Redis-compatible server."""
+
+    def __init__(self, client: Any, prefix: str = "ects:") -> None:
+        self._client = client
+        self._prefix = prefix
+        self._bucket = client.register_script(_BUCKET_SCRIPT)
+
+    def take(self, name: str, amount: float, capacity: float, rate: float) -> float:
+        """See SqliteStore.take."""
+        wait = self._bucket(keys=[self._prefix + name], args=[amount, capacity, rate, "take"])
+        return float(wait)
+
+    def adjust(self, name: str, amount: float, capacity: float, rate: float) -> None:
+        """See SqliteStore.adjust."""
+        self._bucket(keys=[self._prefix + name], args=[amount, capacity, rate, "adjust"])
+
+    def get(self, key: str) -> Optional[str]:
+        value = self._client.get(self._prefix + key)
+        return value.decode("utf-8") if isinstance(value, bytes) else value
+
+    def set(self, key: str, value: str, ttl: float = 0) -> None:
+        self._client.set(self._prefix + key, value, ex=int(ttl) if ttl else None)
+
+    def close(self) -> None:
+        self._client.close()
+
+
+SharedStore = Union[SqliteStore, RedisStore]
+
+
+def shared_backend() -> str:
+    backend = os.getenv("SHARED_BACKEND", "local").lower()
+    if backend not in ("local", "sqlite", "redis"):
+        raise ValueError(f"unknown SHARED_BACKEND {backend!r}; expected local, sqlite or redis")
+    return backend
+
+
+@lru_cache(maxsize=1)
+def _get_shared_store() -> Optional[SharedStore]:
+    """Return the process's connection to the shared backend, or None for "local"."""
+    backend = shared_backend()
+    if backend == "sqlite":
+        return SqliteStore(os.getenv("SHARED_SQLITE_PATH", "shared.db"))
+    if backend == "redis":
+        try:
+            import redis
+        except ImportError as exc:
+            raise RuntimeError("SHARED_BACKEND=redis requires the redis package") from exc
+        url = os.getenv("REDIS_URL", "redis://localhost:6379/0")
+        return RedisStore(redis.Redis.from_url(url))
+    return None
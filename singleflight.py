@@ -0,0 +1,74 @@
+"""
+Single-flight coalescing of identical concurrent work.
+
+``SingleFlight.do(key, fn)`` runs ``fn()`` once per key at a time: callers
+that arrive while a call for the same key is in flight wait for it and share
+its result (or its exception) instead of starting their own. It is used at
+two levels:
+
+    run  – app.py: concurrent /run requests with identical payloads (duplicate
+           webhooks, client retries) share one workflow execution.
+    node – nodes.py: identical LLM calls (same node, prompt, model and inputs,
+           i.e. the same response-cache key) from different runs share one
+           upstream request.
+
+The shared call runs in its own task, so one caller being cancelled (a client
+disconnecting, a sibling node failing) does not cancel it for the others; it
+is cancelled only when every caller waiting for it has gone. Coalesced callers
+are counted in the ``ects_coalesced_total`` Prometheus counter.
+
+The shared call also runs in the context of the caller that started it, so
+whatever that context collects while it runs is that caller's alone: in
+particular, the tokens of a streamed LLM call reach only the leader's
+/run/stream stream (LangGraph's "messages" mode); the others receive the
+complete response at once.
+"""
+
+import asyncio
+from typing import Awaitable, Callable, Generic, Hashable, TypeVar
+
+from metrics import COALESCED
+
+T = TypeVar("T")
+
+
+class _Flight(Generic[T]):
+    def __init__(self, task: "asyncio.Task[T]") -> None:
+        self.task = task
+        self.waiters = 0
+
+
+class SingleFlight(Generic[T]):
+    """In-flight calls keyed by a hashable key, within one event loop."""
+
+    def __init__(self, scope: str) -> None:
+        self.scope = scope
+        self._flights: dict[Hashable, _Flight[T]] = {}
+
+    async def do(self, key: Hashable, fn: Callable[[], Awaitable[T]]) -> tuple[T, bool]:
+        """
+        Return ``fn()``'s result, or that of the identical call already in
+        flight, together with whether it was shared (this caller did not start
+        the call).
+        """
+        flight = self._flights.get(key)
+        shared = flight is not None
+        if flight is None:
+            flight = _Flight(asyncio.ensure_future(fn()))
+            self._flights[key] = flight
+            flight.task.add_done_callback(lambda _: self._forget(key, flight))
+        else:
+            COALESCED.labels(self.scope).inc()
+        flight.waiters += 1
+        try:
+            return await asyncio.shield(flight.task), shared
+        finally:
+            flight.waiters -= 1
+            if flight.waiters == 0 and not flight.task.done():
+                # Nobody is left to use the result.
+                self._forget(key, flight)
+                flight.task.cancel()
+
+    def _forget(self, key: Hashable, flight: _Flight[T]) -> None:
+        if self._flights.get(key) is flight:
+            del self._flights[key]
@@ -1,12 +1,106 @@
-from typing import TypedDict
+import hashlib
+import operator
+import weakref
+from dataclasses import dataclass
+from typing import Annotated, Callable, Hashable, Iterable, Optional, TypedDict, Union
+
+from schemas import ContextRetrieval, SegmentExtraction
+from transcript import TranscriptSlices
+
+
+@dataclass(frozen=True, eq=False)
+class Blob:
+    """
+    Handle to a large text input (transcript, segment data), held once per
+    process however many runs, state copies and prompts refer to it.
+
+    ``Blob.of`` interns by content, so concurrent runs sending the same text
+    share one handle, and wrapping the same string object twice costs nothing.
+    The SHA-256 ``digest`` is computed once and used for response-cache keys
+    instead of re-hashing the text on every call. Prompts resolve ``text`` only
+    when a message is rendered, and renderings of a prompt prefix are memoised
+    on the handle (see nodes._assemble) so every call of every run sharing
+    that prefix sends the same string object.
+    """
+
+    text: str
+    digest: str
+
+    def __post_init__(self) -> None:
+        # Not a field: left out of checkpoints and rebuilt empty on restore.
+        object.__setattr__(self, "_rendered", {})
+
+    @classmethod
+    def of(cls, value: "Union[str, Blob]") -> "Blob":
+        if isinstance(value, Blob):
+            return value
+        blob = _by_identity.get(id(value))
+        if blob is not None and blob.text is value:
+            return blob
+        digest = hashlib.sha256(value.encode("utf-8")).hexdigest()
+        blob = _by_digest.get(digest)
+        if blob is None:
+            blob = cls(value, digest)
+            _by_digest[digest] = blob
+        if blob.text is value:
+            _by_identity[id(value)] = blob
+        return blob
+
+    def memo(self, key: Hashable, build: Callable[[], str]) -> str:
+        """``build()``, computed once per ``key`` for this handle."""
+        rendered = self._rendered
+        if key not in rendered:
+            rendered[key] = build()
+        return rendered[key]
+
+
+# Live handles by content digest, and by the id() of the string they were made
+# from (valid while the handle, which holds that string, is alive).
+_by_digest: "weakref.WeakValueDictionary[str, Blob]" = weakref.WeakValueDictionary()
+_by_identity: "weakref.WeakValueDictionary[int, Blob]" = weakref.WeakValueDictionary()
+
+TextInput = Union[str, Blob]
+
+
+def text(value: TextInput) -> str:
+    """The text of a state field that may hold a Blob."""
+    return value.text if isinstance(value, Blob) else value
+
+
+# Report sections a request can ask for, in the order output_template receives
+# them, and the GraphState field each one is read from.
+REPORT_SECTIONS: dict[str, str] = {
+    "fa_highlights": "fa_highlights_out",
+    "guidance": "guid_validation_out",
+    "briefing_key_messages": "briefing_key_messages_out",
+    "key_messages": "key_messages_out",
+    "qa": "second_QA_out",
+}
+
+
+def requested_sections(sections: Optional[Iterable[str]]) -> list[str]:
+    """``sections`` in report order, or every section when None."""
+    if sections is None:
+        return list(REPORT_SECTIONS)
+    sections = set(sections)
+    unknown = sections - set(REPORT_SECTIONS)
+    if unknown:
+        raise ValueError(
+            f"unknown report sections {sorted(unknown)}; expected {list(REPORT_SECTIONS)}"
+        )
+    return [section for section in REPORT_SECTIONS if section in sections]
 
 
 class GraphState(TypedDict, total=False):
-    # Inputs
+    # Inputs (json_parser replaces transcript and segment_data with Blob handles)
     report_template: str
-    transcript: str
-    segment_data: str
+    transcript: TextInput
+    segment_data: TextInput
     segment_items: str
+    sections: Optional[list[str]]  # REPORT_SECTIONS to produce; None means all of them
+
+    # Preprocessed (json_parser)
+    transcript_sections: TranscriptSlices
 
     # Branch 1 Intermediate
     transcript_fa_extracted: str
@@ -17,8 +111,8 @@ class GraphState(TypedDict, total=False):
     guid_validation_out: str
 
     # Branch 3 Intermediate
-    segment_extraction_out: dict  # Structured Output
-    context_retrieval_out: dict   # Structured Output
+    segment_extraction_out: SegmentExtraction  # Structured Output (schemas.py)
+    context_retrieval_out: ContextRetrieval    # Structured Output (schemas.py)
     integrator_out: str
     key_messages_out: str
     summarizer_out: str
@@ -31,3 +125,7 @@ class GraphState(TypedDict, total=False):
     # Merged Output & Final Wrap
     ai_summary: str
     final_response: dict
+
+    # Run trace (metrics.instrument): one record per node execution / LLM call
+    node_timings: Annotated[list[dict], operator.add]
+    llm_usage: Annotated[list[dict], operator.add]
@@ -0,0 +1,61 @@
+"""The response cache's SQLite tier: one capacity shared by every process using the file."""
+
+import sqlite3
+
+from cache import ResponseCache
+
+
+def _rows(path):
+    with sqlite3.connect(path) as db:
+        return db.execute("SELECT COUNT(*) FROM responses").fetchone()[0]
+
+
+def test_capacity_is_shared_by_workers(tmp_path):
+    path = str(tmp_path / "cache.db")
+    # Separate connections, as separate worker processes would have.
+    workers = [ResponseCache(max_entries=4, path=path, max_disk_entries=100) for _ in range(4)]
+    for i in range(200):
+        for n, cache in enumerate(workers):
+            cache.set(f"{n}-{i}", "v")
+    assert _rows(path) <= 100
+    assert sum(cache.stats()["evictions"] for cache in workers) > 0
+
+
+def test_replacing_a_key_does_not_change_the_count(tmp_path):
+    path = str(tmp_path / "cache.db")
+    cache = ResponseCache(path=path, max_disk_entries=10)
+    for _ in range(50):
+        cache.set("same", "v")
+    with sqlite3.connect(path) as db:
+        assert db.execute("SELECT entries FROM responses_count").fetchone()[0] == 1
+    assert _rows(path) == 1
+
+
+def test_existing_rows_are_counted(tmp_path):
+    path = str(tmp_path / "cache.db")
+    with sqlite3.connect(path) as db:
+        db.execute(
+            "CREATE TABLE responses (key TEXT PRIMARY KEY, value TEXT NOT NULL,"
+            " created REAL NOT NULL, accessed REAL NOT NULL)"
+        )
+        db.executemany(
+            "INSERT INTO responses VALUES (?, 'v', ?, ?)", [(f"k{i}", i, i) for i in range(20)]
+        )
+    cache = ResponseCache(path=path, max_disk_entries=10)
+    cache.set("new", "v")
+    assert _rows(path) == 9
+    # Least recently used first: the oldest seeded rows went.
+    assert cache.get("k0") is None and cache.get("new") == "v"
+
+
+def test_recently_hit_entries_survive_eviction(tmp_path):
+    path = str(tmp_path / "cache.db")
+    cache = ResponseCache(max_entries=1, path=path, max_disk_entries=10)
+    for i in range(10):
+        cache.set(f"k{i}", "v")
+    cache._memory.clear()
+    assert cache.get("k0") == "v"
+    cache.set("k10", "v")
+    cache._memory.clear()
+    assert cache.get("k0") == "v"
+    assert cache.get("k1") is None
@@ -0,0 +1,146 @@
+"""Map-reduce chunking: splitting on turn boundaries, and reducing chunk outputs."""
+
+import asyncio
+from types import SimpleNamespace
+
+import chunking
+import nodes
+from chunking import merge_outputs, split_transcript
+from schemas import (
+    ContextRetrieval,
+    SegmentContext,
+    SegmentExtraction,
+    SegmentFigures,
+    merge,
+)
+from state import Blob
+from tokens import count_tokens
+
+
+def _turn(speaker, n):
+    return f"{speaker} -- CEO: " + " ".join(f"word{n}-{i}" for i in range(30))
+
+
+TRANSCRIPT = "\n".join(_turn(f"Speaker{chr(65 + n)} Name", n) for n in range(12))
+
+
+def test_short_transcript_is_one_chunk():
+    assert split_transcript("A -- CEO: hi", 100) == ["A -- CEO: hi"]
+
+
+def test_chunks_start_on_turn_boundaries_and_fit():
+    chunks = split_transcript(TRANSCRIPT, chunk_tokens=200)
+    assert len(chunks) > 1
+    for chunk in chunks:
+        assert count_tokens(chunk) <= 200
+        assert chunk.split("\n")[0].startswith("Speaker")
+    # Without overlap every turn appears exactly once, in order.
+    turns = [line for chunk in chunks for line in chunk.split("\n\n")]
+    assert turns == TRANSCRIPT.split("\n")
+
+
+def test_overlap_repeats_trailing_turns():
+    chunks = split_transcript(TRANSCRIPT, chunk_tokens=200, overlap_tokens=80)
+    for previous, chunk in zip(chunks, chunks[1:]):
+        assert chunk.split("\n\n")[0] == previous.split("\n\n")[-1]
+        assert count_tokens(chunk) <= 200
+
+
+def test_oversized_turn_is_cut_to_fit():
+    long_turn = "Speaker -- CEO: " + "\n".join("x" * 150 for _ in range(20)) + " " + "y" * 3000
+    text = f"{long_turn}\nOther Person -- CFO: short."
+    chunks = split_transcript(text, chunk_tokens=100)
+    assert all(count_tokens(chunk) <= 100 for chunk in chunks)
+    assert "".join(chunks).count("y") == 3000
+
+
+def test_counts_with_the_given_model(monkeypatch):
+    models = set()
+
+    def counting(text, model=None):
+        models.add(model)
+        return len(text) // 4 + 1
+
+    monkeypatch.setattr(chunking, "count_tokens", counting)
+    split_transcript(TRANSCRIPT, chunk_tokens=200, overlap_tokens=50, model="routed")
+    assert models == {"routed"}
+
+
+def test_transcript_nodes_chunk_with_their_routed_model(monkeypatch):
+    seen = {}
+
+    def split(text, chunk_tokens, overlap_tokens=0, model=None):
+        seen["model"] = model
+        return [text]
+
+    async def ainvoke(node, state, prompt, inputs=None, schema=None):
+        return "out"
+
+    monkeypatch.setattr(nodes, "split_transcript", split)
+    monkeypatch.setattr(nodes, "_ainvoke", ainvoke)
+    monkeypatch.setattr(nodes, "_get_llm", lambda node: SimpleNamespace(model_name="routed"))
+    monkeypatch.setitem(
+        nodes.CHUNKING,
+        "transcript_fa_extraction",
+        {"enabled": True, "chunk_tokens": 100, "overlap_tokens": 10},
+    )
+    state = {
+        "transcript": Blob.of(TRANSCRIPT),
+        "transcript_sections": {"prepared_remarks": TRANSCRIPT, "qa": ""},
+    }
+    assert asyncio.run(nodes._ainvoke_transcript("transcript_fa_extraction", state)) == "out"
+    assert seen["model"] == "routed"
+
+
+def test_merge_outputs_drops_lines_repeated_from_the_overlap():
+    parts = [
+        "Guidance:\n- Revenue up 5%\n- Margin 30%",
+        "Guidance:\n* revenue  up 5%\n- Capex $2bn",
+        "- Capex $2bn\n- Buyback $1bn",
+    ]
+    assert merge_outputs(parts) == (
+        "Guidance:\n- Revenue up 5%\n- Margin 30%\n\n- Capex $2bn\n\n- Buyback $1bn"
+    )
+
+
+def test_merge_outputs_only_compares_neighbours():
+    # The third chunk does not overlap the first; an item both report stays.
+    assert merge_outputs(["- A", "- B", "- A"]) == "- A\n\n- B\n\n- A"
+    assert merge_outputs(["", "  ", "- A"]) == "- A"
+
+
+def test_merge_combines_duplicate_segments():
+    first = SegmentExtraction(
+        segments=[
+            SegmentFigures(segment="Cloud", metrics=["revenue $4bn"], commentary="Strong."),
+            SegmentFigures(segment="Retail", metrics=[], commentary=""),
+        ]
+    )
+    second = SegmentExtraction(
+        segments=[
+            SegmentFigures(
+                segment=" cloud", metrics=["revenue $4bn", "margin 30%"], commentary="Strong."
+            ),
+            SegmentFigures(segment="Ads", metrics=["$1bn"], commentary="Weak."),
+        ]
+    )
+    merged = merge(SegmentExtraction, [first, second])
+    assert [entry.segment for entry in merged.segments] == ["Cloud", "Retail", "Ads"]
+    cloud = merged.segments[0]
+    assert cloud.metrics == ["revenue $4bn", "margin 30%"]
+    assert cloud.commentary == "Strong."
+
+
+def test_merge_joins_distinct_texts():
+    parts = [
+        ContextRetrieval(
+            segments=[SegmentContext(segment="Cloud", drivers=["d"], outlook="Up.", quotes=[])]
+        ),
+        ContextRetrieval(
+            segments=[
+                SegmentContext(segment="Cloud", drivers=["d", "e"], outlook="More.", quotes=["q"])
+            ]
+        ),
+    ]
+    cloud = merge(ContextRetrieval, parts).segments[0]
+    assert (cloud.drivers, cloud.outlook, cloud.quotes) == (["d", "e"], "Up. More.", ["q"])
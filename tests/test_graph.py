@@ -0,0 +1,344 @@
+"""Workflow construction and selective re-runs."""
+
+import asyncio
+import json
+import threading
+import time
+
+import pytest
+from pydantic import BaseModel
+
+import graph
+from schemas import ContextRetrieval, SegmentExtraction
+
+
+@pytest.fixture
+def fresh_workflow(monkeypatch):
+    monkeypatch.setenv("CHECKPOINTER", "none")
+    graph._build_workflow.cache_clear()
+    yield
+    graph._build_workflow.cache_clear()
+
+
+def test_aget_workflow_does_not_block_the_loop_during_warm_up(fresh_workflow, monkeypatch):
+    build_graph = graph.build_graph
+    building = threading.Event()
+
+    def slow_build(checkpointer):
+        building.set()
+        time.sleep(0.5)
+        return build_graph(checkpointer)
+
+    monkeypatch.setattr(graph, "build_graph", slow_build)
+    warm = threading.Thread(target=graph._get_workflow)
+    warm.start()
+    building.wait(5)
+
+    async def run():
+        ticks = 0
+
+        async def heartbeat():
+            nonlocal ticks
+            while True:
+                ticks += 1
+                await asyncio.sleep(0.01)
+
+        beat = asyncio.create_task(heartbeat())
+        workflow = await graph.aget_workflow()
+        beat.cancel()
+        return workflow, ticks
+
+    workflow, ticks = asyncio.run(run())
+    warm.join()
+    assert workflow is graph._get_workflow()
+    # The loop kept running while the warm-up thread held the lock.
+    assert ticks > 10
+
+
+# ---------------------------------------------------------------------------
+# Incremental re-runs
+# ---------------------------------------------------------------------------
+
+BODY = {
+    "report_template": "Report template",
+    "transcript": "Operator: Welcome.\nCEO: Revenue grew 10%.",
+    "segment_data": "Cloud",
+    "segment_items": "Revenue",
+}
+
+# State fields written by the nodes, in graph order.
+OUTPUTS = (
+    "transcript_sections",
+    "transcript_fa_extracted",
+    "fa_highlights_out",
+    "transcript_guidance_extracted",
+    "guid_validation_out",
+    "segment_extraction_out",
+    "context_retrieval_out",
+    "integrator_out",
+    "key_messages_out",
+    "summarizer_out",
+    "briefing_key_messages_out",
+    "transcript_QA_extracted",
+    "second_QA_out",
+    "ai_summary",
+)
+
+
+def _fake_output(schema, tag: str) -> str:
+    if schema is None:
+        return tag
+    if schema is SegmentExtraction:
+        segment = {"segment": "Cloud", "metrics": [tag], "commentary": tag}
+    elif schema is ContextRetrieval:
+        segment = {"segment": "Cloud", "drivers": [tag], "outlook": tag, "quotes": []}
+    else:
+        # The fused nodes' outputs are plain text fields.
+        return json.dumps({field: tag for field in schema.model_fields})
+    return json.dumps({"segments": [segment]})
+
+
+@pytest.fixture
+def llm_calls(monkeypatch):
+    """Nodes that called the LLM; every response is tagged with its call number."""
+    import nodes
+
+    # Prompts are still built, which needs each node's (never called) client.
+    monkeypatch.setenv("OPENAI_API_KEY", "test")
+    calls = []
+
+    async def fake_ainvoke(node, state, prompt, inputs=None, schema=None):
+        calls.append(node)
+        return _fake_output(schema, f"{node} #{len(calls)}")
+
+    monkeypatch.setattr(nodes, "_ainvoke", fake_ainvoke)
+    return calls
+
+
+def _clear_workflow() -> None:
+    for cache in (graph._build_workflow, graph.node_names, graph.graph_edges, graph._subgraph):
+        cache.cache_clear()
+    graph._kept_runs.clear()
+    graph._open_runs.clear()
+
+
+@pytest.fixture(params=["separate", "fused"])
+def kept_runs(request, monkeypatch):
+    """A workflow with an in-memory checkpointer keeping completed runs."""
+    monkeypatch.setenv("BRANCH3_MODE", request.param)
+    monkeypatch.setenv("CHECKPOINTER", "memory")
+    monkeypatch.setenv("CHECKPOINT_KEEP_COMPLETED", "1")
+    _clear_workflow()
+    yield request.param
+    _clear_workflow()
+
+
+def _executed(state: dict) -> list[str]:
+    return [timing["node"] for timing in state["node_timings"]]
+
+
+def _outputs(state: dict) -> dict:
+    return {
+        field: value.model_dump() if isinstance(value, BaseModel) else value
+        for field, value in state.items()
+        if field in OUTPUTS
+    }
+
+
+def _rerun(body: dict, changes: dict, llm_calls: list[str]) -> tuple[dict, dict, list[str]]:
+    """Run ``body`` and re-run it with ``changes``; also returns the re-run's LLM calls."""
+
+    async def run():
+        first = await graph.arun(body, "first")
+        calls = len(llm_calls)
+        return first, await graph.rerun("first", changes, "second"), llm_calls[calls:]
+
+    return asyncio.run(run())
+
+
+def test_dirty_nodes_follow_inputs_and_descendants(kept_runs):
+    if kept_runs == "fused":
+        branch3 = ["integrator_summarizer", "key_messages_briefing"]
+    else:
+        branch3 = ["integrator", "key_messages", "summarizer", "briefing_key_messages"]
+    assert graph.dirty_nodes(["segment_items"]) == [
+        node for node in graph.node_names() if node in {*branch3, "output_template", "wrapper"}
+    ]
+    assert graph.dirty_nodes(["transcript"]) == graph.node_names()
+    assert graph.dirty_nodes(["report_template"]) == [
+        "fa_highlights",
+        "output_template",
+        "wrapper",
+    ]
+    assert graph.dirty_nodes([]) == []
+
+
+def test_subgraph_turns_branches_into_edges_and_starts_at_cut_nodes(kept_runs):
+    if kept_runs == "fused":
+        nodes = frozenset(["integrator_summarizer", "key_messages_briefing", "output_template"])
+        edges = {(edge.source, edge.target) for edge in graph._subgraph(nodes).get_graph().edges}
+        assert edges == {
+            (graph.START, "integrator_summarizer"),
+            ("integrator_summarizer", "key_messages_briefing"),
+            ("key_messages_briefing", "output_template"),
+            ("output_template", graph.END),
+        }
+        return
+
+    nodes = frozenset(
+        ["context_retrieval", "integrator", "summarizer", "key_messages", "output_template"]
+    )
+    edges = {(edge.source, edge.target) for edge in graph._subgraph(nodes).get_graph().edges}
+    assert edges == {
+        # segment_extraction, its predecessor, is outside the subgraph.
+        (graph.START, "context_retrieval"),
+        # The conditional fan-out of context_retrieval, as plain edges.
+        ("context_retrieval", "integrator"),
+        ("context_retrieval", "summarizer"),
+        ("integrator", "key_messages"),
+        ("key_messages", "output_template"),
+        # Nodes without successors in the subgraph end it.
+        ("summarizer", graph.END),
+        ("output_template", graph.END),
+    }
+
+    edges = {
+        (edge.source, edge.target)
+        for edge in graph._subgraph(frozenset(["summarizer", "wrapper"])).get_graph().edges
+    }
+    assert edges == {
+        (graph.START, "summarizer"),
+        (graph.START, "wrapper"),
+        ("summarizer", graph.END),
+        ("wrapper", graph.END),
+    }
+
+
+def test_rerun_of_segment_items_reuses_the_other_outputs(kept_runs, llm_calls):
+    first, second, rerun_calls = _rerun(BODY, {"segment_items": "Revenue, margin"}, llm_calls)
+
+    if kept_runs == "fused":
+        branch3 = ["integrator_summarizer", "key_messages_briefing"]
+    else:
+        branch3 = ["integrator", "key_messages", "summarizer", "briefing_key_messages"]
+    assert sorted(rerun_calls) == sorted([*branch3, "output_template"])
+    assert sorted(_executed(second)) == sorted([*branch3, "output_template", "wrapper"])
+
+    changed = {
+        "integrator_out",
+        "key_messages_out",
+        "summarizer_out",
+        "briefing_key_messages_out",
+        "ai_summary",
+    }
+    before, after = _outputs(first), _outputs(second)
+    assert set(before) == set(after) == set(OUTPUTS)
+    for field in OUTPUTS:
+        if field in changed:
+            assert after[field] != before[field], field
+        else:
+            assert after[field] == before[field], field
+    assert second["segment_items"] == "Revenue, margin"
+    assert second["final_response"] != first["final_response"]
+
+
+def test_rerun_of_transcript_re_executes_only_the_requested_sections(kept_runs, llm_calls):
+    body = {**BODY, "sections": ["guidance", "qa"]}
+    first, second, rerun_calls = _rerun(body, {"transcript": "CEO: Revenue fell 5%."}, llm_calls)
+
+    executed = [
+        "json_parser",
+        "transcript_guidance_extraction",
+        "guid_validation",
+        "transcript_QA_extraction",
+        "second_QA",
+        "output_template",
+        "wrapper",
+    ]
+    assert sorted(_executed(first)) == sorted(executed)
+    assert sorted(_executed(second)) == sorted(executed)
+    # json_parser and wrapper do not call the LLM.
+    assert sorted(rerun_calls) == sorted(executed[1:-1])
+    for field in ("guid_validation_out", "second_QA_out", "ai_summary"):
+        assert second[field] != first[field], field
+    for field in ("fa_highlights_out", "key_messages_out", "briefing_key_messages_out"):
+        assert field not in second
+    assert second["sections"] == ["guidance", "qa"]
+
+
+def test_rerun_stores_the_result_as_a_completed_run(kept_runs, llm_calls):
+    async def run():
+        await graph.arun(BODY, "first")
+        second = await graph.rerun("first", {"segment_items": "Margin"}, "second")
+        calls = len(llm_calls)
+        third = await graph.rerun("second", {"segment_items": "Margin"}, "third")
+        return second, third, calls
+
+    second, third, calls = asyncio.run(run())
+    # Nothing changed against "second": no node runs, and its outputs carry over.
+    assert len(llm_calls) == calls
+    assert _executed(third) == []
+    assert _outputs(third) == _outputs(second)
+
+    with pytest.raises(LookupError):
+        asyncio.run(graph.rerun("unknown", {"segment_items": "Margin"}))
+    with pytest.raises(ValueError):
+        asyncio.run(graph.rerun("first", {"ai_summary": "edited"}))
+
+
+# ---------------------------------------------------------------------------
+# Retention of incomplete runs
+# ---------------------------------------------------------------------------
+
+
+@pytest.fixture(params=["memory", "sqlite"])
+def checkpointer(request, monkeypatch, tmp_path):
+    """A workflow with either checkpointer, keeping completed runs."""
+    monkeypatch.setenv("CHECKPOINTER", request.param)
+    monkeypatch.setenv("CHECKPOINT_DB_PATH", str(tmp_path / "checkpoints.db"))
+    monkeypatch.setenv("CHECKPOINT_KEEP_COMPLETED", "1")
+    _clear_workflow()
+    yield request.param
+    _clear_workflow()
+
+
+def test_starting_a_run_deletes_abandoned_runs(checkpointer, llm_calls, monkeypatch):
+    import nodes
+
+    fake_ainvoke = nodes._ainvoke
+
+    async def failing_ainvoke(node, state, *args, **kwargs):
+        if node == "output_template" and state["segment_items"] == "fail":
+            raise RuntimeError("upstream failed")
+        return await fake_ainvoke(node, state, *args, **kwargs)
+
+    monkeypatch.setattr(nodes, "_ainvoke", failing_ainvoke)
+
+    async def run():
+        await graph.arun(BODY, "completed")
+        for run_id in ("failed", "abandoned"):
+            with pytest.raises(RuntimeError):
+                await graph.arun({**BODY, "segment_items": "fail"}, run_id)
+        before = [await graph.pending_nodes(run_id) for run_id in ("failed", "abandoned")]
+
+        # "failed" is resumed (and fails again) after "abandoned" started.
+        monkeypatch.setenv("CHECKPOINT_INCOMPLETE_TTL", "0.2")
+        await asyncio.sleep(0.15)
+        with pytest.raises(RuntimeError):
+            await graph.resume_run("failed")
+        await asyncio.sleep(0.1)
+        await graph.arun(BODY, "next")
+
+        after = [await graph.pending_nodes(run_id) for run_id in ("failed", "abandoned")]
+        workflow = await graph.aget_workflow()
+        completed = await workflow.aget_state(graph.run_config("completed"))
+        abandoned = await workflow.aget_state(graph.run_config("abandoned"))
+        await graph.aclose_checkpointer()
+        return before, after, completed, abandoned
+
+    before, after, completed, abandoned = asyncio.run(run())
+    assert before == [("output_template",), ("output_template",)]
+    assert after == [("output_template",), ()]
+    assert abandoned.created_at is None
+    # Completed runs are left to CHECKPOINT_KEEP_MAX_RUNS.
+    assert "final_response" in completed.values
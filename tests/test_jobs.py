@@ -0,0 +1,89 @@
+"""JobStore ownership: orphaned jobs are re-queued, including after a restart with the same PID."""
+
+import asyncio
+import os
+
+import pytest
+
+import jobs
+from jobs import QUEUED, RUNNING, JobRunner, JobStore
+
+PAYLOAD = {"report_template": "t", "transcript": "x", "segment_data": "s", "segment_items": "i"}
+
+
+@pytest.fixture
+def store(tmp_path):
+    store = JobStore(str(tmp_path / "jobs.db"))
+    yield store
+    store.close()
+
+
+def _force_running(store, job_id, owner):
+    store._update(job_id, status=RUNNING, owner=owner)
+
+
+def test_own_running_job_is_not_orphaned(store):
+    job_id, _ = store.submit(PAYLOAD)
+    assert store.claim(job_id, [])
+    assert store.requeue_orphans() == []
+    assert store.get(job_id)["status"] == RUNNING
+
+
+def test_restart_with_same_pid_requeues(store):
+    job_id, _ = store.submit(PAYLOAD)
+    # Claimed by an earlier server process that had this process's PID.
+    _force_running(store, job_id, f"{os.getpid()}:previousboot")
+    assert store.requeue_orphans() == [job_id]
+    assert store.get(job_id)["status"] == QUEUED
+    assert store.submit(PAYLOAD) == (job_id, False)
+    assert store.queued() == [job_id]
+
+
+def test_legacy_bare_pid_owner(store):
+    job_id, _ = store.submit(PAYLOAD)
+    _force_running(store, job_id, str(os.getpid()))
+    assert store.requeue_orphans() == [job_id]
+
+
+def test_dead_owner_requeues_and_live_owner_does_not(store, monkeypatch):
+    dead, _ = store.submit(PAYLOAD)
+    live, _ = store.submit({**PAYLOAD, "transcript": "y"})
+    _force_running(store, dead, "999999:boot")
+    _force_running(store, live, "999998:boot")
+    monkeypatch.setattr(jobs, "_process_alive", lambda pid: pid == 999998)
+    assert store.requeue_orphans() == [dead]
+    assert store.get(live)["status"] == RUNNING
+
+
+def test_stop_requeues_jobs_in_progress(store, monkeypatch):
+    started = asyncio.Event()
+
+    class Workflow:
+        async def astream(self, state, config, stream_mode):
+            started.set()
+            await asyncio.Event().wait()
+            yield {}
+
+    async def no_pending(job_id):
+        return []
+
+    async def noop(job_id):
+        return None
+
+    monkeypatch.setattr(jobs, "pending_nodes", no_pending)
+    monkeypatch.setattr(jobs, "reset_run", noop)
+    monkeypatch.setattr(jobs, "start_run", noop)
+    monkeypatch.setattr(jobs, "aget_workflow", lambda: asyncio.sleep(0, Workflow()))
+
+    async def run():
+        runner = JobRunner(store, concurrency=1)
+        await runner.start()
+        job_id = runner.submit(PAYLOAD)
+        await asyncio.wait_for(started.wait(), 5)
+        assert store.get(job_id)["status"] == RUNNING
+        await runner.stop()
+        return job_id
+
+    job_id = asyncio.run(run())
+    assert store.get(job_id)["status"] == QUEUED
+    assert store.queued() == [job_id]
@@ -0,0 +1,168 @@
+"""Hedged requests and the token budget of abandoned attempts."""
+
+import asyncio
+import time
+from collections import deque
+
+import pytest
+from langchain_core.messages import AIMessage
+
+import ratelimit
+import resilience
+from config import DEFAULT_CALL_POLICY
+
+POLICY = {**DEFAULT_CALL_POLICY, "timeout": 0, "hedge": True, "hedge_quantile": 0.5}
+NODE = "second_QA"
+
+
+@pytest.fixture
+def limits(monkeypatch):
+    """Fresh latency windows, a semaphore set by each test and a token bucket."""
+    limiter = ratelimit.RateLimiter(tokens_per_minute=6000)
+    monkeypatch.setattr(resilience, "_latencies", {})
+    monkeypatch.setattr(ratelimit, "_get_rate_limiter", lambda model: limiter)
+    slots = {}
+    monkeypatch.setattr(ratelimit, "_get_semaphore", lambda: slots.setdefault("semaphore", None))
+    return limiter, slots
+
+
+def _warm(samples: list[float]) -> None:
+    resilience._latencies[NODE] = deque(samples, maxlen=resilience.LATENCY_WINDOW)
+
+
+def _response(content: str) -> AIMessage:
+    return AIMessage(
+        content, usage_metadata={"input_tokens": 20, "output_tokens": 10, "total_tokens": 30}
+    )
+
+
+class Upstream:
+    """``send`` for _hedged_attempt: the first request hangs, later ones answer."""
+
+    def __init__(self) -> None:
+        self.started: list[float] = []
+        self.cancelled = False
+
+    async def send(self) -> AIMessage:
+        self.started.append(time.perf_counter())
+        if len(self.started) > 1:
+            return _response("hedge")
+        try:
+            await asyncio.sleep(10)
+        except asyncio.CancelledError:
+            self.cancelled = True
+            raise
+        return _response("primary")
+
+
+def _hedged(upstream: Upstream, slots: dict):
+    async def run():
+        slots["semaphore"] = asyncio.Semaphore(2)
+        result = await resilience._hedged_attempt(NODE, POLICY, "model", 1000, upstream.send)
+        # Let the abandoned attempt run its cancellation handlers.
+        for _ in range(5):
+            await asyncio.sleep(0)
+        return result
+
+    return asyncio.run(run())
+
+
+def test_hedge_is_sent_after_the_quantile_delay_and_the_loser_is_cancelled(limits):
+    _, slots = limits
+    # Median of 0.00 .. 0.19 seconds.
+    _warm([i / 100 for i in range(resilience.HEDGE_MIN_SAMPLES)])
+    upstream = Upstream()
+
+    response, _, _ = _hedged(upstream, slots)
+
+    assert response.content == "hedge"
+    assert len(upstream.started) == 2
+    assert 0.1 <= upstream.started[1] - upstream.started[0] < 0.3
+    assert upstream.cancelled
+
+
+def test_the_loser_and_the_winner_both_record_a_latency(limits):
+    _, slots = limits
+    _warm([0.05] * resilience.HEDGE_MIN_SAMPLES)
+
+    _hedged(Upstream(), slots)
+
+    samples = list(resilience._latencies[NODE])
+    assert len(samples) == resilience.HEDGE_MIN_SAMPLES + 2
+    winner, loser = sorted(samples[-2:])
+    assert winner < 0.05
+    # The cancelled primary is recorded with its time in flight, a lower bound.
+    assert loser >= 0.05
+
+
+def test_no_hedge_before_enough_samples_or_when_the_primary_is_fast(limits):
+    _, slots = limits
+    _warm([0.05] * (resilience.HEDGE_MIN_SAMPLES - 1))
+    calls = 0
+
+    async def send():
+        nonlocal calls
+        calls += 1
+        await asyncio.sleep(0.1)
+        return _response("primary")
+
+    async def run(upstream):
+        slots["semaphore"] = asyncio.Semaphore(2)
+        return await resilience._hedged_attempt(NODE, POLICY, "model", 1000, upstream)
+
+    assert asyncio.run(run(send))[0].content == "primary"
+    assert calls == 1
+
+    _warm([0.5] * resilience.HEDGE_MIN_SAMPLES)
+    assert asyncio.run(run(send))[0].content == "primary"
+    assert calls == 2
+
+
+def test_a_timed_out_attempt_records_a_censored_latency(limits):
+    _, slots = limits
+
+    async def send():
+        await asyncio.sleep(10)
+
+    async def run():
+        slots["semaphore"] = asyncio.Semaphore(1)
+        policy = {**POLICY, "timeout": 0.05}
+        await resilience._hedged_attempt(NODE, policy, "model", 1000, send)
+
+    with pytest.raises(asyncio.TimeoutError):
+        asyncio.run(run())
+    (sample,) = resilience._latencies[NODE]
+    assert 0.05 <= sample < 0.5
+
+
+def test_a_hedge_cancelled_while_queued_is_refunded(limits):
+    limiter, slots = limits
+    _warm([0.05] * resilience.HEDGE_MIN_SAMPLES)
+    sent = 0
+
+    async def send():
+        nonlocal sent
+        sent += 1
+        await asyncio.sleep(0.2)
+        return _response("primary")
+
+    async def run():
+        semaphore = slots["semaphore"] = asyncio.Semaphore(2)
+        # Another call holds the second slot, and a third is queued ahead of
+        # the hedge: the primary's slot goes to it when the primary answers.
+        await semaphore.acquire()
+        attempt = asyncio.create_task(
+            resilience._hedged_attempt(NODE, POLICY, "model", 1000, send)
+        )
+        await asyncio.sleep(0.01)
+        queued = asyncio.create_task(semaphore.acquire())
+        response, _, _ = await attempt
+        for _ in range(5):
+            await asyncio.sleep(0)
+        await queued
+        return response
+
+    assert asyncio.run(run()).content == "primary"
+    assert sent == 1
+    # Only the primary's actual usage (30) stays charged, not the hedge's 1000.
+    assert limiter.tokens.tokens > 6000 - 100
@@ -0,0 +1,99 @@
+"""
+RedisStore against fakeredis, which runs the token-bucket Lua script through
+lupa. Skipped when fakeredis (with its ``lua`` extra) is not installed.
+"""
+
+import asyncio
+
+import pytest
+
+fakeredis = pytest.importorskip("fakeredis")
+pytest.importorskip("lupa")
+
+from cache import ResponseCache  # noqa: E402
+from ratelimit import SharedTokenBucket  # noqa: E402
+from shared import RedisStore  # noqa: E402
+
+
+@pytest.fixture
+def client():
+    return fakeredis.FakeRedis()
+
+
+@pytest.fixture
+def store(client):
+    return RedisStore(client, prefix="test:")
+
+
+def _tokens(client, name):
+    return float(client.hget("test:" + name, "tokens"))
+
+
+def test_take_starts_full_and_deducts(store, client):
+    assert store.take("b", 40, capacity=100, rate=1) == 0.0
+    assert _tokens(client, "b") == pytest.approx(60, abs=0.1)
+    assert 0 < client.ttl("test:b") <= 160
+
+
+def test_take_returns_wait_when_short(store, client):
+    assert store.take("b", 90, capacity=100, rate=10) == 0.0
+    wait = store.take("b", 50, capacity=100, rate=10)
+    # 10 tokens left, 40 short at 10 per second; nothing is taken.
+    assert wait == pytest.approx(4.0, abs=0.1)
+    assert _tokens(client, "b") == pytest.approx(10, abs=1)
+
+
+def test_take_larger_than_capacity_goes_negative(store, client):
+    assert store.take("b", 150, capacity=100, rate=1) == 0.0
+    assert _tokens(client, "b") == pytest.approx(-50, abs=0.1)
+    assert store.take("b", 1, capacity=100, rate=1) > 50
+
+
+def test_adjust_charges_and_refunds_up_to_capacity(store, client):
+    store.take("b", 50, capacity=100, rate=1)
+    store.adjust("b", 20, capacity=100, rate=1)
+    assert _tokens(client, "b") == pytest.approx(30, abs=0.1)
+    store.adjust("b", -500, capacity=100, rate=1)
+    assert _tokens(client, "b") == pytest.approx(100)
+
+
+def test_buckets_are_independent(store):
+    store.take("a", 100, capacity=100, rate=1)
+    assert store.take("b", 100, capacity=100, rate=1) == 0.0
+    assert store.take("a", 10, capacity=100, rate=1) > 0
+
+
+def test_get_set_round_trip_with_ttl(store, client):
+    assert store.get("k") is None
+    store.set("k", "välue", ttl=30)
+    assert store.get("k") == "välue"
+    assert 0 < client.ttl("test:k") <= 30
+    store.set("n", "v")
+    assert client.ttl("test:n") == -1
+
+
+def test_shared_token_bucket_waits_for_refill(store):
+    bucket = SharedTokenBucket(store, "rpm", per_minute=600)
+
+    async def run():
+        await bucket.acquire(600)
+        loop = asyncio.get_running_loop()
+        started = loop.time()
+        await bucket.acquire(2)
+        return loop.time() - started
+
+    # 2 units at 10 per second.
+    assert 0.15 < asyncio.run(run()) < 1.0
+
+
+def test_response_cache_shared_tier(store):
+    first = ResponseCache(max_entries=10, ttl=60, shared=store)
+    second = ResponseCache(max_entries=10, ttl=60, shared=store)
+
+    async def run():
+        await first.aset("key", "value")
+        return await second.aget("key"), await second.aget("missing")
+
+    assert asyncio.run(run()) == ("value", None)
+    assert second.stats()["shared_hits"] == 1
+    assert second.stats()["misses"] == 1
@@ -0,0 +1,162 @@
+"""SingleFlight coalescing, on its own and behind /run."""
+
+import asyncio
+
+import httpx
+import pytest
+
+import app
+from singleflight import SingleFlight
+
+
+def test_concurrent_identical_calls_share_one_execution():
+    flight = SingleFlight("test")
+    executions = 0
+
+    async def work():
+        nonlocal executions
+        executions += 1
+        await asyncio.sleep(0.05)
+        return executions
+
+    async def run():
+        results = await asyncio.gather(*(flight.do("key", work) for _ in range(3)))
+        other = await flight.do("other", work)
+        # The finished call is forgotten: the same key runs again.
+        again = await flight.do("key", work)
+        return results, other, again
+
+    results, other, again = asyncio.run(run())
+    assert results == [(1, False), (1, True), (1, True)]
+    assert other == (2, False)
+    assert again == (3, False)
+
+
+def test_an_exception_reaches_every_waiter():
+    flight = SingleFlight("test")
+    executions = 0
+
+    async def fail():
+        nonlocal executions
+        executions += 1
+        await asyncio.sleep(0.05)
+        raise ValueError("upstream failed")
+
+    async def run():
+        return await asyncio.gather(
+            *(flight.do("key", fail) for _ in range(3)), return_exceptions=True
+        )
+
+    errors = asyncio.run(run())
+    assert executions == 1
+    assert [type(error) for error in errors] == [ValueError] * 3
+    assert all(str(error) == "upstream failed" for error in errors)
+
+
+def test_cancelling_the_leader_does_not_cancel_the_followers():
+    flight = SingleFlight("test")
+    cancelled = False
+
+    async def work():
+        nonlocal cancelled
+        try:
+            await asyncio.sleep(0.1)
+        except asyncio.CancelledError:
+            cancelled = True
+            raise
+        return "done"
+
+    async def run():
+        leader = asyncio.create_task(flight.do("key", work))
+        await asyncio.sleep(0)
+        follower = asyncio.create_task(flight.do("key", work))
+        await asyncio.sleep(0.01)
+        leader.cancel()
+        with pytest.raises(asyncio.CancelledError):
+            await leader
+        return await follower
+
+    assert asyncio.run(run()) == ("done", True)
+    assert not cancelled
+
+
+def test_the_call_is_cancelled_once_every_caller_has_gone():
+    flight = SingleFlight("test")
+
+    async def run():
+        gone = asyncio.Event()
+
+        async def work():
+            try:
+                await asyncio.sleep(10)
+            finally:
+                gone.set()
+
+        callers = [asyncio.create_task(flight.do("key", work)) for _ in range(2)]
+        await asyncio.sleep(0.01)
+        for caller in callers:
+            caller.cancel()
+        await asyncio.wait_for(gone.wait(), 1)
+        return flight._flights
+
+    assert asyncio.run(run()) == {}
+
+
+BODY = {
+    "report_template": "Report template",
+    "transcript": "CEO: Revenue grew 10%.",
+    "segment_data": "Cloud",
+    "segment_items": "Revenue",
+}
+
+
+@pytest.fixture
+def fake_arun(monkeypatch):
+    """Replace the workflow behind /run; returns the run ids it was called with."""
+    run_ids = []
+
+    async def arun(state, run_id):
+        run_ids.append(run_id)
+        await asyncio.sleep(0.05)
+        if state["segment_items"] == "fail":
+            raise RuntimeError("node failed")
+        return {"final_response": {"run_id": run_id}}
+
+    monkeypatch.setattr(app, "arun", arun)
+    return run_ids
+
+
+def _post_concurrently(*requests: tuple[dict, dict]) -> list[httpx.Response]:
+    async def run():
+        transport = httpx.ASGITransport(app=app.app)
+        async with httpx.AsyncClient(transport=transport, base_url="http://test") as client:
+            return await asyncio.gather(
+                *(client.post("/run", json=body, params=params) for body, params in requests)
+            )
+
+    return asyncio.run(run())
+
+
+def test_identical_runs_are_coalesced(fake_arun):
+    other = {**BODY, "segment_items": "Margin"}
+    responses = _post_concurrently((BODY, {}), (BODY, {}), (other, {}))
+    assert [response.status_code for response in responses] == [200] * 3
+    assert len(fake_arun) == 2
+    run_ids = [response.headers["X-Run-Id"] for response in responses]
+    assert run_ids[0] == run_ids[1] != run_ids[2]
+    assert responses[0].json() == responses[1].json() == {"run_id": run_ids[0]}
+
+
+def test_runs_with_an_explicit_run_id_are_not_coalesced(fake_arun):
+    responses = _post_concurrently((BODY, {"run_id": "a"}), (BODY, {"run_id": "b"}))
+    assert sorted(fake_arun) == ["a", "b"]
+    assert [response.headers["X-Run-Id"] for response in responses] == ["a", "b"]
+
+
+def test_a_coalesced_failure_reaches_every_request(fake_arun):
+    body = {**BODY, "segment_items": "fail"}
+    responses = _post_concurrently((body, {}), (body, {}))
+    assert len(fake_arun) == 1
+    assert [response.status_code for response in responses] == [500, 500]
+    assert [response.headers["X-Run-Id"] for response in responses] == fake_arun * 2
+    assert all(response.json() == {"detail": "node failed"} for response in responses)
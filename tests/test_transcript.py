@@ -0,0 +1,41 @@
+"""Transcript section splitting and turn boundaries."""
+
+from transcript import is_boundary, split_sections
+
+TRANSCRIPT = """Prepared Remarks
+Jane Doe -- CEO: Revenue grew 6% to $4.2 billion.
+Questions and answers will follow the CFO remarks.
+John Roe -- CFO: Margin was 31%.
+Question-and-Answer Session:
+Operator: Our first question comes from Sam Lee.
+Sam Lee -- Analyst: What about guidance?
+Jane Doe -- CEO: We reaffirm it."""
+
+
+def test_split_at_the_qa_heading_line():
+    sections = split_sections(TRANSCRIPT)
+    assert sections["prepared_remarks"].endswith("Margin was 31%.")
+    # A sentence starting with the heading words stays in the remarks.
+    assert "Questions and answers will follow" in sections["prepared_remarks"]
+    assert sections["qa"].startswith("Question-and-Answer Session:")
+    assert sections["qa"].endswith("We reaffirm it.")
+
+
+def test_no_qa_heading_keeps_everything_in_remarks():
+    text = "Jane Doe -- CEO: Revenue grew.\nQ&A will be next week."
+    assert split_sections(text) == {"prepared_remarks": text, "qa": ""}
+
+
+def test_heading_variants():
+    for heading in ("Q&A", "Q & A session", "QUESTIONS AND ANSWERS.", "  question and answer  "):
+        assert split_sections(f"intro\n{heading}\nQ: hi")["qa"].startswith(heading)
+
+
+def test_boundaries():
+    assert is_boundary("Jane Doe -- CEO: Revenue grew.")
+    assert is_boundary("Operator")
+    assert is_boundary("Q: What about margins?")
+    assert is_boundary("Prepared Remarks")
+    assert is_boundary("Jane Doe")
+    assert not is_boundary("Revenue grew strongly this quarter.")
+    assert not is_boundary("and more.")
@@ -0,0 +1,154 @@
+"""
+Token counting and per-node prompt budgets.
+
+Counts use the tiktoken encoding of the model a node is routed to, loaded
+once per model. If tiktoken is not installed or an encoding cannot be loaded
+(its BPE file is fetched on first use, which fails offline unless
+TIKTOKEN_CACHE_DIR holds a copy), counts fall back to four characters per
+token. Counts of long texts are memoised by content digest, so a transcript
+sent by several nodes is tokenised once; a caller that already knows a
+digest of the text (e.g. from its Blob handles) passes it, and the text is
+not hashed again.
+
+``fit_sections`` enforces config.TOKEN_BUDGETS: when a call's prompt is over
+its node's budget, the node's lower-priority sections are cut down (at a line
+boundary) until it fits, and a call that still does not fit is rejected
+before it is sent.
+"""
+
+import hashlib
+import logging
+import threading
+from collections import OrderedDict
+from functools import lru_cache
+from typing import Any, Optional, Sequence, Union
+
+from langchain_core.messages import BaseMessage
+
+from config import DEFAULT_TOKEN_BUDGET, TOKEN_BUDGETS
+from metrics import record_trim
+
+logger = logging.getLogger(__name__)
+
+# Encoding used for models tiktoken does not know, and when no model is given.
+DEFAULT_ENCODING = "o200k_base"
+# Texts shorter than this are counted directly instead of through the memo.
+MEMO_MIN_CHARS = 1024
+MEMO_MAX_ENTRIES = 4096
+# Allowance per chat message for role and framing tokens.
+MESSAGE_OVERHEAD_TOKENS = 4
+TRUNCATION_MARKER = "\n[... truncated]"
+
+_memo: "OrderedDict[tuple[str, Union[bytes, str]], int]" = OrderedDict()
+_memo_lock = threading.Lock()
+
+
+@lru_cache(maxsize=None)
+def _get_encoding(model: Optional[str]) -> Any:
+    """Return the tiktoken encoding for ``model``, or None to approximate."""
+    try:
+        import tiktoken
+    except ImportError:
+        return None
+    try:
+        if model:
+            try:
+                return tiktoken.encoding_for_model(model)
+            except KeyError:
+                pass
+        return tiktoken.get_encoding(DEFAULT_ENCODING)
+    except Exception:
+        logger.warning(
+            "tiktoken encoding for %s could not be loaded; approximating 4 characters per token",
+            model or DEFAULT_ENCODING,
+        )
+        return None
+
+
+def count_tokens(text: str, model: Optional[str] = None, digest: Optional[str] = None) -> int:
+    """
+    Token count of ``text`` under ``model``'s tokenizer. ``digest``, if given,
+    must identify ``text``'s content and is used as its memo key.
+    """
+    encoding = _get_encoding(model)
+    if encoding is None:
+        return len(text) // 4 + 1
+    if len(text) < MEMO_MIN_CHARS:
+        return len(encoding.encode(text, disallowed_special=()))
+
+    if digest is None:
+        key = (encoding.name, hashlib.blake2b(text.encode("utf-8"), digest_size=16).digest())
+    else:
+        key = (encoding.name, digest)
+    with _memo_lock:
+        count = _memo.get(key)
+        if count is not None:
+            _memo.move_to_end(key)
+            return count
+    count = len(encoding.encode(text, disallowed_special=()))
+    with _memo_lock:
+        _memo[key] = count
+        if len(_memo) > MEMO_MAX_ENTRIES:
+            _memo.popitem(last=False)
+    return count
+
+
+def count_messages(messages: Sequence[BaseMessage], model: Optional[str] = None) -> int:
+    """Prompt token count of a chat request."""
+    return sum(
+        count_tokens(str(message.content), model) + MESSAGE_OVERHEAD_TOKENS
+        for message in messages
+    )
+
+
+def trim_text(text: str, max_tokens: int, model: Optional[str] = None) -> str:
+    """Cut ``text`` to at most ``max_tokens``, at the last line boundary, and mark the cut."""
+    budget = max(max_tokens - count_tokens(TRUNCATION_MARKER, model), 0)
+    encoding = _get_encoding(model)
+    if encoding is None:
+        head = text[: budget * 4]
+    else:
+        head = encoding.decode(encoding.encode(text, disallowed_special=())[:budget])
+    if len(head) >= len(text):
+        return text
+    cut = head.rfind("\n")
+    if cut > 0:
+        head = head[:cut]
+    return head + TRUNCATION_MARKER
+
+
+def token_budget(node: str) -> dict:
+    return {**DEFAULT_TOKEN_BUDGET, **TOKEN_BUDGETS.get(node, {})}
+
+
+def fit_sections(
+    node: str,
+    model: Optional[str],
+    sections: Sequence[tuple[str, str]],
+    excess_tokens: int,
+) -> list[tuple[str, str]]:
+    """
+    Shorten ``node``'s trimmable sections, in its configured order, by
+    ``excess_tokens`` in total. Raises ValueError when trimming every listed
+    section is not enough.
+    """
+    fitted = list(sections)
+    for label in token_budget(node)["trim"]:
+        for i, (name, text) in enumerate(fitted):
+            if excess_tokens <= 0:
+                return fitted
+            if name != label:
+                continue
+            size = count_tokens(text, model)
+            trimmed = trim_text(text, max(size - excess_tokens, 0), model)
+            removed = size - count_tokens(trimmed, model)
+            if removed > 0:
+                record_trim(node, label, removed)
+                fitted[i] = (name, trimmed)
+                excess_tokens -= removed
+    if excess_tokens > 0:
+        raise ValueError(
+            f"{node}: prompt exceeds its budget of {token_budget(node)['max_input_tokens']} "
+            f"tokens by {excess_tokens} after trimming {list(token_budget(node)['trim'])}"
+        )
+    return fitted
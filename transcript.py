@@ -0,0 +1,87 @@
+"""
+Rule-based transcript parsing.
+
+``split_sections`` is what the json_parser preprocessing stage runs once per
+run; it cuts the transcript at its Q&A heading into the slices nodes are sent
+(see config.TRANSCRIPT_SLICES):
+    prepared_remarks – text before the Q&A section heading.
+    qa               – text from the Q&A section heading onward.
+
+``is_boundary`` recognises the lines that open a speaker turn or a section,
+where chunking.py may cut the transcript.
+
+A section heading is a line holding nothing but the heading, so a sentence
+that merely starts with "Questions and answers ..." does not open the Q&A
+section. When no Q&A heading is found the whole transcript is treated as
+prepared remarks and ``qa`` is empty; consumers fall back to the full
+transcript for any empty slice.
+"""
+
+import re
+from typing import Optional, TypedDict
+
+# "Operator", "John Smith -- CEO", "Jane Doe - Analyst: Thanks", "Q: ...".
+SPEAKER_LINE = re.compile(
+    r"^\s*(?P<speaker>(?i:operator)|[QA]|[A-Z][\w.'\-]*(?:\s+[A-Z][\w.'\-]*){0,4})"
+    r"(?:\s+[-–—]{1,2}\s+(?P<title>[^:\n]+?))?"
+    r"\s*(?:(?P<colon>:)\s*(?P<rest>.*))?$",
+)
+# "Prepared Remarks", "Question-and-Answer Session", "Q&A:" ... on a line of
+# their own.
+SECTION_LINE = re.compile(
+    r"^\s*(?P<section>prepared remarks|presentation"
+    r"|(?:questions?[- ]and[- ]answers?|q\s*&\s*a)(?: session)?)"
+    r"\s*[:.\-–—]?\s*$",
+    re.IGNORECASE,
+)
+_QA_SECTION = re.compile(r"^(?:questions?[- ]and[- ]answers?|q\s*&\s*a)", re.IGNORECASE)
+
+
+class TranscriptSlices(TypedDict):
+    prepared_remarks: str
+    qa: str
+
+
+def match_speaker(line: str) -> Optional[re.Match]:
+    """Return the match if ``line`` opens a new speaker turn, else None."""
+    match = SPEAKER_LINE.match(line)
+    if match is None or SECTION_LINE.match(line):
+        return None
+    speaker = match.group("speaker")
+    if match.group("colon") or match.group("title") or speaker.lower() == "operator":
+        return match
+    # A bare line is only a speaker header if it looks like a name: two to
+    # five capitalised words with no sentence punctuation.
+    words = speaker.split()
+    if 2 <= len(words) <= 5 and not speaker.endswith((".", "!", "?")):
+        return match
+    return None
+
+
+def is_boundary(line: str) -> bool:
+    """True if ``line`` starts a new speaker turn or section."""
+    return SECTION_LINE.match(line) is not None or match_speaker(line) is not None
+
+
+def _qa_start(lines: list[str]) -> Optional[int]:
+    """Index of the Q&A heading line, or None."""
+    return next(
+        (
+            i
+            for i, line in enumerate(lines)
+            if (m := SECTION_LINE.match(line)) and _QA_SECTION.match(m.group("section"))
+        ),
+        None,
+    )
+
+
+def split_sections(transcript: str) -> TranscriptSlices:
+    """Cut ``transcript`` at its Q&A heading into prepared remarks and Q&A."""
+    lines = transcript.splitlines()
+    qa_start = _qa_start(lines)
+    if qa_start is None:
+        return {"prepared_remarks": transcript, "qa": ""}
+    return {
+        "prepared_remarks": "\n".join(lines[:qa_start]),
+        "qa": "\n".join(lines[qa_start:]),
+    }